@@ -0,0 +1,78 @@
+"""Compares the pruned and gzipped market extracts with the former plain json ones
+
+    python -m benchmarks.benchmark_extract_codec
+"""
+import gc
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from mpu.extract_store import DirectoryExtractStore
+from mpu.fake_api_server import FakeApiConfig, FakeCardMarketApi
+
+NB_PRODUCTS = 2000
+
+
+def save_legacy_market_extract(
+    market_extract_path: Path, product_id: int, market_extract: dict
+) -> None:
+    """The market extract saving before the codec, as plain json"""
+    with (market_extract_path / f"{product_id}.json").open("w") as product_file:
+        json.dump(obj=market_extract, fp=product_file)
+
+
+def get_folder_size(folder_path: Path) -> int:
+    return sum(file_path.stat().st_size for file_path in folder_path.iterdir())
+
+
+def get_duration(func: Callable, product_ids: List[int], repeat: int = 3) -> float:
+    """Best duration of reading all the extracts"""
+    durations = []
+    for _ in range(repeat):
+        gc.collect()
+        start_time = time.perf_counter()
+        for product_id in product_ids:
+            func(product_id=product_id)
+        durations.append(time.perf_counter() - start_time)
+
+    return min(durations)
+
+
+def main() -> None:
+    api = FakeCardMarketApi(config=FakeApiConfig())
+    product_ids = list(range(1, NB_PRODUCTS + 1))
+
+    with tempfile.TemporaryDirectory() as legacy_path, tempfile.TemporaryDirectory() as (
+        codec_path
+    ):
+        legacy_store = DirectoryExtractStore(market_extract_path=Path(legacy_path))
+        codec_store = DirectoryExtractStore(market_extract_path=Path(codec_path))
+        for product_id in product_ids:
+            market_extract = {
+                "articles": api.get_product_articles(product_id=product_id),
+                "info": {"idProduct": product_id},
+            }
+            save_legacy_market_extract(
+                market_extract_path=Path(legacy_path),
+                product_id=product_id,
+                market_extract=market_extract,
+            )
+            codec_store.save(product_id=product_id, market_extract=market_extract)
+
+        legacy_size = get_folder_size(folder_path=Path(legacy_path))
+        codec_size = get_folder_size(folder_path=Path(codec_path))
+        legacy_duration = get_duration(func=legacy_store.get, product_ids=product_ids)
+        codec_duration = get_duration(func=codec_store.get, product_ids=product_ids)
+
+    print(
+        f"{NB_PRODUCTS} extracts: json {legacy_size / 2**20:.1f}MB "
+        f"in {legacy_duration:.3f}s, pruned and gzipped {codec_size / 2**20:.1f}MB "
+        f"in {codec_duration:.3f}s, x{legacy_size / codec_size:.1f} smaller, "
+        f"x{legacy_duration / codec_duration:.1f} faster"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compares the stock export normalization with the former row by row one, and with
+the columns inferred by pandas as for the irregular articles
+
+    python -m benchmarks.benchmark_normalize_articles
+"""
+import gc
+import time
+from typing import Callable, List
+
+import pandas as pd
+
+from mpu.card_market_client import STOCK_FILE_COLUMNS, CardMarketClient
+from mpu.fake_api_server import FakeApiConfig, FakeCardMarketApi
+
+STOCK_SIZES = (10_000, 100_000, 1_000_000)
+
+
+def normalize_article_data_by_rows(articles: list) -> pd.DataFrame:
+    """The normalization before the columnar one, building a dict per article"""
+    normalized_articles = []
+    for article in articles:
+        normalized_article = {
+            "idArticle": article.get("idArticle", ""),
+            "idProduct": article.get("idProduct", ""),
+        }
+
+        if "product" in article and isinstance(article["product"], dict):
+            normalized_article["English Name"] = article["product"].get("enName", "")
+            normalized_article["Local Name"] = article["product"].get("locName", "")
+            normalized_article["Exp."] = article["product"].get("abbreviation", "")
+        else:
+            normalized_article["English Name"] = ""
+            normalized_article["Local Name"] = ""
+            normalized_article["Exp."] = ""
+
+        normalized_article["Price"] = article.get("price", "")
+        if "language" in article and isinstance(article["language"], dict):
+            normalized_article["Language"] = article["language"].get("idLanguage", "")
+        else:
+            normalized_article["Language"] = article.get("language", "")
+
+        normalized_article["Condition"] = article.get("condition", "")
+        normalized_article["Signed?"] = article.get("isSigned", "")
+        normalized_article["Foil?"] = article.get("isFoil", "")
+        normalized_article["Comments"] = article.get("comments", "")
+        normalized_article["Amount"] = article.get("count", "")
+        normalized_article["onSale"] = article.get("onSale", "")
+
+        normalized_articles.append(normalized_article)
+
+    df = pd.DataFrame(normalized_articles, columns=STOCK_FILE_COLUMNS)
+    for column in ("Foil?", "Signed?"):
+        df[column] = (
+            df[column].replace({"True": "X", "False": "", True: "X", False: ""})
+        ).astype(str)
+
+    return df.set_index("idArticle")
+
+
+def get_durations(funcs: List[Callable], articles: List[dict], repeat: int = 3):
+    """Best duration of each normalization, the runs being interleaved"""
+    durations = [[] for _ in funcs]
+    for _ in range(repeat):
+        for func, func_durations in zip(funcs, durations):
+            gc.collect()
+            start_time = time.perf_counter()
+            func(articles)
+            func_durations.append(time.perf_counter() - start_time)
+
+    return [min(func_durations) for func_durations in durations]
+
+
+def main() -> None:
+    # The client is not used to call the API, only its normalization is
+    client = CardMarketClient.__new__(CardMarketClient)
+
+    for stock_size in STOCK_SIZES:
+        articles = FakeCardMarketApi(
+            config=FakeApiConfig(stock_size=stock_size)
+        ).get_stock_file()["article"]
+
+        by_rows_df = normalize_article_data_by_rows(articles)
+        pd.testing.assert_frame_equal(
+            client._normalize_article_data(articles), by_rows_df
+        )
+        pd.testing.assert_frame_equal(
+            client._normalize_irregular_article_data(articles), by_rows_df
+        )
+
+        by_rows_duration, inferred_duration, typed_duration = get_durations(
+            funcs=[
+                normalize_article_data_by_rows,
+                client._normalize_irregular_article_data,
+                client._normalize_article_data,
+            ],
+            articles=articles,
+        )
+        print(
+            f"{stock_size:>9} articles: by rows {by_rows_duration:.3f}s, "
+            f"inferred columns {inferred_duration:.3f}s "
+            f"x{by_rows_duration / inferred_duration:.1f}, "
+            f"typed columns {typed_duration:.3f}s "
+            f"x{by_rows_duration / typed_duration:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,76 @@
+import io
 import logging
+import math
+import os
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from operator import itemgetter
+from typing import Dict, Iterator, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import requests
 from furl import furl
 
+from mpu.export_polling import ExportHistory, format_duration, get_poll_delay
+from mpu.stock_cache import StockExportCache, get_export_start_time
 from mpu.stock_io import convert_base64_gzipped_string_to_dataframe
+from mpu.utils.cassette import Cassette, CassetteMode, get_cassette_from_env
+from mpu.utils.json_stream import iter_json_array_batches
 from mpu.utils.oauth_client import OAuthAuthenticatedClient
+from mpu.utils.rate_limiter import RequestRateLimiter
 
 logger = logging.getLogger(__name__)
 
+# Env variable overriding the API url, e.g. to use a local fake API
+API_URL_ENV_VAR = "CARD_MARKET_API_URL"
+# Endpoint name of the download of the stock file, for its timeouts
+STOCK_FILE_ENDPOINT = "stock_file"
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+ARTICLES_BATCH_SIZE = 10_000
+# Number of articles of each page of the stock/{start} endpoint
+STOCK_PAGE_SIZE = 100
+# Number of articles of each page when more articles of a product are fetched
+ARTICLES_PAGE_SIZE = 100
+STOCK_FILE_COLUMNS = [
+    "idArticle", "idProduct", "English Name", "Local Name", "Exp.", "Price",
+    "Language", "Condition", "Foil?", "Signed?", "Comments", "Amount", "onSale"
+]
+# Keys of the export articles by stock file column, the product and language
+# objects being unpacked afterwards
+ARTICLE_COLUMN_KEYS = {
+    "idArticle": "idArticle",
+    "idProduct": "idProduct",
+    "Price": "price",
+    "Language": "language",
+    "Condition": "condition",
+    "Foil?": "isFoil",
+    "Signed?": "isSigned",
+    "Comments": "comments",
+    "Amount": "count",
+    "onSale": "onSale",
+    "product": "product",
+}
+PRODUCT_COLUMN_KEYS = {
+    "English Name": "enName",
+    "Local Name": "locName",
+    "Exp.": "abbreviation",
+}
+FLAG_VALUES = {"True": "X", "False": "", True: "X", False: ""}
+FLAG_COLUMNS = ("Foil?", "Signed?")
+# Expected kinds of the numeric columns of the export articles, the other columns
+# being objects
+ARTICLE_COLUMN_KINDS = {
+    "idArticle": "i",
+    "idProduct": "i",
+    "Price": "fi",
+    "Language": "i",
+    "Amount": "i",
+    "onSale": "b",
+}
 MAX_WAIT_TIME = 60 * 90
-POLL_INTERVAL = 30
 DEFAULT_LANGUAGE = "French"
 LANGUAGES = (
     "English",
@@ -31,6 +88,45 @@ LANGUAGES = (
 CONDITIONS = ("MT", "NM", "EX", "GD", "LP", "PL", "PO")
 
 
+def _get_column(items: list, key: str) -> list:
+    """Gets the values of `key` in the items, the missing ones being empty"""
+    return [item.get(key, "") if isinstance(item, dict) else "" for item in items]
+
+
+def _get_typed_columns(articles: list) -> Dict[str, np.ndarray]:
+    """Gets the columns of the articles as typed arrays, for the usual articles having
+    all their keys with the expected types
+
+    The arrays are built at once, so that pandas neither copies nor infers their types.
+    Raises a KeyError, TypeError or ValueError for any other article.
+    """
+    columns = {
+        column: list(map(itemgetter(key), articles))
+        for column, key in ARTICLE_COLUMN_KEYS.items()
+    }
+    products = columns.pop("product")
+    for column, key in PRODUCT_COLUMN_KEYS.items():
+        columns[column] = list(map(itemgetter(key), products))
+    columns["Language"] = list(map(itemgetter("idLanguage"), columns["Language"]))
+    for column in FLAG_COLUMNS:
+        columns[column] = [FLAG_VALUES[flag] for flag in columns[column]]
+
+    typed_columns = {}
+    for column, values in columns.items():
+        if column in ARTICLE_COLUMN_KINDS:
+            typed_columns[column] = np.array(values)
+            if typed_columns[column].dtype.kind not in ARTICLE_COLUMN_KINDS[column]:
+                raise TypeError(
+                    f"Unexpected {column} of type {typed_columns[column].dtype}"
+                )
+        else:
+            # Filled in place, numpy would otherwise convert the strings
+            typed_columns[column] = np.empty(len(values), dtype=object)
+            typed_columns[column][:] = values
+
+    return typed_columns
+
+
 class CardMarketApiError(requests.HTTPError):
     """Error when requesting the API"""
 
@@ -89,28 +185,135 @@ def get_conditions(min_condition: str):
 class CardMarketClient(OAuthAuthenticatedClient):
     CARD_MARKET_API_URL = furl("https://api.cardmarket.com/ws/v2.0/output.json")
 
+    def __init__(
+        self,
+        api_url: Optional[str] = None,
+        cassette: Optional[Cassette] = None,
+        stock_cache: Optional[StockExportCache] = None,
+        export_history: Optional[ExportHistory] = None,
+        **kwargs,
+    ) -> None:
+        cassette = cassette if cassette is not None else get_cassette_from_env()
+        if cassette is not None and cassette.mode == CassetteMode.replay:
+            # The replayed calls use neither the real budget nor its pacing
+            kwargs["rate_limiter"] = RequestRateLimiter(
+                ledger_path=None, spread_budget_until_reset=False
+            )
+
+        super().__init__(**kwargs)
+        self.stock_cache = stock_cache
+        # Only used to wait for the stock exports
+        self.export_history = export_history
+
+        if cassette is not None:
+            logger.info(f"Using the cassette at {cassette.path} ({cassette.mode.value}).")
+            cassette.install(session=self.session)
+
+        api_url = api_url or os.environ.get(API_URL_ENV_VAR)
+        if api_url:
+            logger.info(f"Using the API at {api_url}.")
+            self.api_url = furl(api_url)
+        else:
+            self.api_url = self.CARD_MARKET_API_URL.copy()
+
     def get_stock_df(self) -> pd.DataFrame:
-        """Get stock data using the new exports/stock endpoint."""
+        """Get stock data using the new exports/stock endpoint.
+
+        With a stock cache, the stock of a recent export already downloaded is reused
+        without any call.
+        """
+        if self.stock_cache is not None:
+            stock_df = self.stock_cache.get_latest()
+            if stock_df is not None:
+                return stock_df
+
         logger.info("Getting stock data from Card Market...")
-        
-        download_url = self._get_download_url()
-        
-        return self._download_and_process_stock_file(download_url)
 
-    def _get_download_url(self) -> str:
-        """Get download URL by finding or creating an export and waiting for it to finish."""
+        export, export_duration = self._get_finished_export()
+
+        if self.stock_cache is not None:
+            stock_df = self.stock_cache.get(export=export)
+            if stock_df is not None:
+                return stock_df
+
+        stock_df = self._download_and_process_stock_file(export["url"])
+        if export_duration is not None and self.export_history is not None:
+            self.export_history.record(
+                export_id=export["idRequest"],
+                stock_size=len(stock_df),
+                duration=export_duration,
+            )
+
+        if self.stock_cache is not None:
+            self.stock_cache.save(export=export, stock_df=stock_df)
+
+        return stock_df
+
+    def get_stock_page(self, start: int) -> list:
+        """Get the page of the stock articles beginning at the `start`-th one (from 1)."""
+        try:
+            response = self.get_api_call(url=self.api_url / f"stock/{start}")
+        except requests.HTTPError as error:
+            raise CardMarketApiError.from_card_market_error(error=error)
+
+        if response.status_code == 204:
+            return []
+
+        return response.json()["article"]
+
+    def get_stock_df_by_pages(
+        self, nb_workers: int, expected_size: int = 0
+    ) -> pd.DataFrame:
+        """Get stock data from the paginated stock endpoint, without any export.
+
+        The pages are fetched concurrently by waves, the first one covering the
+        `expected_size` articles, until a page isn't full.
+        """
+        logger.info("Getting stock data from Card Market by pages...")
+
+        pages = []
+        last_page_found = False
+        wave_size = max(math.ceil(expected_size / STOCK_PAGE_SIZE) + 1, nb_workers)
+        with ThreadPoolExecutor(max_workers=nb_workers) as executor:
+            while not last_page_found:
+                starts = [
+                    (len(pages) + page_index) * STOCK_PAGE_SIZE + 1
+                    for page_index in range(wave_size)
+                ]
+                for page in executor.map(self.get_stock_page, starts):
+                    # The pages after the last one are empty
+                    if not last_page_found:
+                        pages.append(page)
+                        last_page_found = len(page) < STOCK_PAGE_SIZE
+                wave_size = nb_workers
+
+        articles = [article for page in pages for article in page]
+        result = self._normalize_article_data(articles)
+        # An article moved to another page while they were fetched would be twice
+        result = result[~result.index.duplicated(keep="last")]
+
+        logger.info(
+            f"Stock retrieved from {len(pages)} pages and processed. Shape: {result.shape}"
+        )
+        return result
+
+    def _get_finished_export(self) -> Tuple[dict, Optional[float]]:
+        """Get a finished export by finding or creating one and waiting for it to finish.
+
+        Also returns how long the export took when it was waited for.
+        """
         exports_data = self._get_exports()
         export = self._find_or_create_export(exports_data=exports_data)
         
         if export.get("status") == "finished":
             logger.info(f"Export {export.get('idRequest')} is ready.")
-            return export["url"]
+            return export, None
         
-        return self._wait_for_export_url(export_id=export.get("idRequest"))
+        return self._wait_for_export(export=export)
 
     def _get_exports(self) -> dict:
         """Get current exports from API."""
-        response = self.get_api_call(url=self.CARD_MARKET_API_URL / "exports/stock")
+        response = self.get_api_call(url=self.api_url / "exports/stock")
         return response.json()
 
     def _find_or_create_export(self, exports_data: dict) -> dict:
@@ -143,17 +346,10 @@ class CardMarketClient(OAuthAuthenticatedClient):
         one_hour = timedelta(hours=2)
         
         for export in exports:
-            started_at = export.get("startedAt")
-            if not started_at:
-                continue
-            
-            try:
-                export_time = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-                # Ensure export_time is timezone-aware
-                if export_time.tzinfo is None:
-                    export_time = export_time.replace(tzinfo=timezone.utc)
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Could not parse timestamp for export {export.get('idRequest')}: {started_at} - {e}")
+            export_time = get_export_start_time(export=export)
+            if export_time is None:
+                if export.get("startedAt"):
+                    logger.warning(f"Could not parse timestamp for export {export.get('idRequest')}: {export['startedAt']}")
                 continue
             
             age = current_time - export_time
@@ -167,7 +363,7 @@ class CardMarketClient(OAuthAuthenticatedClient):
         """Trigger a new export and return its ID."""
         logger.info("Triggering new stock export...")
         
-        export_url = self.CARD_MARKET_API_URL / "exports/stock"
+        export_url = self.api_url / "exports/stock"
         export_url.add(args={"idGame": 1})
         
         try:
@@ -180,12 +376,43 @@ class CardMarketClient(OAuthAuthenticatedClient):
         logger.info(f"New export {export_id} triggered")
         return result
 
-    def _wait_for_export_url(self, export_id: str) -> str:
-        """Wait for an export to finish and return the download URL."""
+    def _wait_for_export(self, export: dict) -> Tuple[dict, float]:
+        """Wait for an export to finish and return it, with how long it took.
+
+        The polls are spaced according to the expected duration of the export, from
+        the history of the past ones.
+        """
+        export_id = export.get("idRequest")
         logger.info(f"Waiting for export {export_id} to finish...")
         start_time = time.time()
-        
+        export_start_time = get_export_start_time(export=export)
+        export_start_timestamp = (
+            export_start_time.timestamp() if export_start_time else start_time
+        )
+
+        expected_duration = (
+            self.export_history.get_expected_duration()
+            if self.export_history is not None
+            else None
+        )
+        if expected_duration is not None:
+            logger.info(f"Export expected to take {format_duration(expected_duration)}.")
+
         while time.time() - start_time < MAX_WAIT_TIME:
+            elapsed = max(time.time() - export_start_timestamp, 0)
+            poll_delay = get_poll_delay(
+                elapsed=elapsed, expected_duration=expected_duration
+            )
+            if expected_duration is not None:
+                eta = max(expected_duration - elapsed, 0)
+                logger.info(
+                    f"Export still processing (ETA {format_duration(eta)}), "
+                    f"waiting {poll_delay:.0f}s..."
+                )
+            else:
+                logger.info(f"Export still processing, waiting {poll_delay:.0f}s...")
+            time.sleep(poll_delay)
+
             exports_data = self._get_exports()
             
             for export in exports_data.get("stockExports", []):
@@ -196,106 +423,116 @@ class CardMarketClient(OAuthAuthenticatedClient):
                 
                 if export.get("status") == "finished":
                     logger.info(f"Export {current_id} finished")
-                    return export["url"]
-            
-            logger.info(f"Export still processing, waiting {POLL_INTERVAL}s...")
-            time.sleep(POLL_INTERVAL)
+                    return export, time.time() - export_start_timestamp
         
         raise TimeoutError(f"Export did not complete within {MAX_WAIT_TIME} seconds")
 
     def _download_and_process_stock_file(self, download_url: str) -> pd.DataFrame:
-        """Download and process the stock file from the provided URL."""
+        """Download and process the stock file from the provided URL.
+
+        The file is streamed to a temporary file and its articles are normalized by
+        batches, so neither the whole response nor all the article dicts are in memory.
+        """
         logger.info("Downloading stock file...")
-        
-        try:
-            response = requests.get(download_url)
-            response.raise_for_status()
-        except requests.HTTPError as error:
-            logger.error(f"Failed to download stock file: {error}")
-            raise CardMarketApiError.from_card_market_error(error=error)
-        
-        try:
-            stock_data = response.json()
-        except ValueError as error:
-            logger.error(f"Failed to parse JSON response: {error}")
-            raise
-        
-        logger.info(f"Downloaded data keys: {list(stock_data.keys())}")
-        
-        logger.info("Processing article data directly")
-        result = self._normalize_article_data(stock_data["article"])
-      
+
+        with tempfile.TemporaryFile() as stock_file:
+            try:
+                with self.session.get(
+                    download_url,
+                    stream=True,
+                    timeout=self.timeout_policy.get_timeout(endpoint=STOCK_FILE_ENDPOINT),
+                ) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(
+                        chunk_size=DOWNLOAD_CHUNK_SIZE
+                    ):
+                        stock_file.write(chunk)
+            except requests.HTTPError as error:
+                logger.error(f"Failed to download stock file: {error}")
+                raise CardMarketApiError.from_card_market_error(error=error)
+
+            logger.info(f"Downloaded {stock_file.tell() / 2 ** 20:.1f} MB.")
+            stock_file.seek(0)
+
+            try:
+                with io.TextIOWrapper(stock_file, encoding="utf-8") as text_file:
+                    stock_batches = [
+                        self._normalize_article_data(articles)
+                        for articles in iter_json_array_batches(
+                            text_file=text_file,
+                            key="article",
+                            batch_size=ARTICLES_BATCH_SIZE,
+                        )
+                    ]
+            except ValueError as error:
+                logger.error(f"Failed to parse JSON response: {error}")
+                raise
+
+        result = (
+            pd.concat(stock_batches)
+            if stock_batches
+            else self._normalize_article_data([])
+        )
+
         logger.info(f"Stock retrieved and processed. Shape: {result.shape}")
         return result
 
     def _normalize_article_data(self, articles: list) -> pd.DataFrame:
-        """Normalize article data to match expected CSV format with exact columns."""
-        # Define the exact columns we want in the exact order
-        expected_columns = [
-            "idArticle", "idProduct", "English Name", "Local Name", "Exp.", "Price", 
-            "Language", "Condition", "Foil?", "Signed?", "Comments", "Amount", "onSale"
+        """Normalize article data to match expected CSV format with exact columns.
+
+        The columns are filled directly from the articles, without building a row
+        dict per article, as typed arrays for the usual articles.
+        """
+        if not articles:
+            return pd.DataFrame(columns=STOCK_FILE_COLUMNS).set_index("idArticle")
+
+        try:
+            columns = _get_typed_columns(articles=articles)
+        except (KeyError, TypeError, ValueError):
+            # Some articles lack keys or have other types, the columns are inferred
+            return self._normalize_irregular_article_data(articles=articles)
+
+        index = pd.Index(columns.pop("idArticle"), name="idArticle")
+        return pd.DataFrame(
+            columns, index=index, columns=STOCK_FILE_COLUMNS[1:], copy=False
+        )
+
+    def _normalize_irregular_article_data(self, articles: list) -> pd.DataFrame:
+        """Normalizes articles with missing keys, the missing values being empty"""
+        columns = {
+            column: _get_column(items=articles, key=key)
+            for column, key in ARTICLE_COLUMN_KEYS.items()
+        }
+
+        # Extract names and expansion from product object
+        products = columns.pop("product")
+        for column, key in PRODUCT_COLUMN_KEYS.items():
+            columns[column] = _get_column(items=products, key=key)
+
+        # Extract Language ID from language object
+        columns["Language"] = [
+            language.get("idLanguage", "") if isinstance(language, dict) else language
+            for language in columns["Language"]
         ]
-        
-        normalized_articles = []
-        
-        for article in articles:
-            normalized_article = {}
-            
-            normalized_article["idArticle"] = article.get("idArticle", "")
-            normalized_article["idProduct"] = article.get("idProduct", "")
-            
-            # Extract names and expansion from product object
-            if "product" in article and isinstance(article["product"], dict):
-                normalized_article["English Name"] = article["product"].get("enName", "")
-                normalized_article["Local Name"] = article["product"].get("locName", "")
-                normalized_article["Exp."] = article["product"].get("abbreviation", "")
-            else:
-                normalized_article["English Name"] = ""
-                normalized_article["Local Name"] = ""
-                normalized_article["Exp."] = ""
-            
-            normalized_article["Price"] = article.get("price", "")
-            
-            # Extract Language ID from language object
-            if "language" in article and isinstance(article["language"], dict):
-                normalized_article["Language"] = article["language"].get("idLanguage", "")
-            else:
-                normalized_article["Language"] = article.get("language", "")
-            
-            normalized_article["Condition"] = article.get("condition", "")
-            normalized_article["Signed?"] = article.get("isSigned", "")
-            normalized_article["Foil?"] = article.get("isFoil", "")
-            normalized_article["Comments"] = article.get("comments", "")
-            normalized_article["Amount"] = article.get("count", "")
-            normalized_article["onSale"] = article.get("onSale", "")            
-            
-            normalized_articles.append(normalized_article)
-        
+
         # Create DataFrame with exact columns in exact order
-        df = pd.DataFrame(normalized_articles)
-
-        df["Foil?"] = df["Foil?"].replace(
-            {"True": "X", "False": "", True: "X", False: ""}
-        ).astype(str)
-        df["Signed?"] = df["Signed?"].replace(
-            {"True": "X", "False": "", True: "X", False: ""}
-        ).astype(str)
-        
-        # Ensure all expected columns exist and are in the right order
-        for col in expected_columns:
-            if col not in df.columns:
-                df[col] = ""
-        
-        return df[expected_columns].set_index("idArticle")
+        df = pd.DataFrame(columns, columns=STOCK_FILE_COLUMNS)
+        for column in FLAG_COLUMNS:
+            df[column] = df[column].replace(FLAG_VALUES).astype(str)
+
+        return df.set_index("idArticle")
 
     def get_product_info(self, product_id: int) -> dict:
-        call_url = self.CARD_MARKET_API_URL / f"/products/{product_id}"
-        response = self.get_api_call(url=call_url)
+        call_url = self.api_url / f"/products/{product_id}"
+        try:
+            response = self.get_api_call(url=call_url)
+        except requests.HTTPError as error:
+            raise CardMarketApiError.from_card_market_error(error=error)
 
         return response.json()
 
     def get_article_info(self, article_id: int) -> dict:
-        call_url = self.CARD_MARKET_API_URL / f"/stock/article/{article_id}"
+        call_url = self.api_url / f"/stock/article/{article_id}"
         response = self.get_api_call(url=call_url)
 
         return response.json()
@@ -307,10 +544,11 @@ class CardMarketClient(OAuthAuthenticatedClient):
         max_results: int = 100,
         language_id: Optional[int] = None,
         foil: Optional[bool] = None,
+        start: int = 0,
     ) -> list:
-        call_url = self.CARD_MARKET_API_URL / f"/articles/{product_id}"
+        call_url = self.api_url / f"/articles/{product_id}"
         if max_results is not None:
-            call_url.add(args={"start": 0, "maxResults": max_results})
+            call_url.add(args={"start": start, "maxResults": max_results})
         if min_condition is not None:
             call_url.add(args={"minCondition": min_condition})
         if foil is not None:
@@ -330,8 +568,40 @@ class CardMarketClient(OAuthAuthenticatedClient):
 
         return response.json()["article"]
 
+    def iter_product_articles(
+        self,
+        product_id: int,
+        min_condition: Optional[str] = None,
+        language_id: Optional[int] = None,
+        foil: Optional[bool] = None,
+        start: int = 0,
+        page_size: int = ARTICLES_PAGE_SIZE,
+        max_results: Optional[int] = None,
+    ) -> Iterator[list]:
+        """Yields the articles of a product page by page from `start`, each page being
+        requested only when the previous one is consumed, until there are no more or
+        `max_results` articles were yielded
+        """
+        nb_results = 0
+        while max_results is None or nb_results < max_results:
+            if max_results is not None:
+                page_size = min(page_size, max_results - nb_results)
+            articles = self.get_product_articles(
+                product_id=product_id,
+                min_condition=min_condition,
+                max_results=page_size,
+                language_id=language_id,
+                foil=foil,
+                start=start + nb_results,
+            )
+            if articles:
+                yield articles
+            if len(articles) < page_size:
+                return
+            nb_results += len(articles)
+
     def update_articles_prices(self, articles_data):
-        call_url = self.CARD_MARKET_API_URL / "stock"
+        call_url = self.api_url / "stock"
         response = self.put_api_call(data=articles_data, url=call_url)
 
         return response.json()
@@ -1,13 +1,17 @@
 from pathlib import Path
+from typing import Optional
 
 import typer
 
 from mpu.commands.calculate import main as main_calculate
+from mpu.commands.getdata import DEFAULT_NB_WORKERS
 from mpu.commands.getdata import main as main_getdata
+from mpu.commands.getstock import DEFAULT_STOCK_NB_WORKERS, GetStockMode
 from mpu.commands.getstock import main as main_getstock
 from mpu.commands.stats import get_stats_file_path
 from mpu.commands.stats import main as main_stats
 from mpu.commands.update import main as main_update
+from mpu.stock_cache import DEFAULT_STOCK_CACHE_MAX_AGE_MINUTES
 from mpu.stock_io import get_stock_file_path
 from mpu.utils.strategies_utils import CurrentPriceStrat, PriceUpdaterStrat
 
@@ -31,9 +35,32 @@ def getstock(
         resolve_path=True,
         help="Path where to save the output. Default is the current directory",
     ),
+    stock_cache_max_age: int = typer.Option(
+        DEFAULT_STOCK_CACHE_MAX_AGE_MINUTES,
+        "--stock-cache-max-age",
+        "-sca",
+        min=0,
+        help="Minutes during which a downloaded stock export is reused, 0 to disable.",
+    ),
+    mode: GetStockMode = typer.Option(
+        GetStockMode.full,
+        "--mode",
+        "-mo",
+        help="How to get the stock: a full export, or the stock pages merged into the existing stock file.",
+    ),
+    nb_workers: int = typer.Option(
+        DEFAULT_STOCK_NB_WORKERS,
+        "--nb-workers",
+        "-w",
+        min=1,
+        help="Number of stock pages fetched at the same time in incremental mode.",
+    ),
 ):
     main_getstock(
         output_path=output_path,
+        stock_cache_max_age=stock_cache_max_age,
+        mode=mode,
+        nb_workers=nb_workers,
     )
 
 
@@ -81,12 +108,37 @@ def getdata(
     force_download: bool = typer.Option(
         False, "--force-download", "-f", help="Force download the market extract."
     ),
+    only_changed: bool = typer.Option(
+        False,
+        "--only-changed",
+        "-oc",
+        help="Only download again the market extract of the products changed since the last complete getdata.",
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        "-r",
+        help="Skip the products already fetched by the previous run, from its journal.",
+    ),
+    dry_run: bool = typer.Option(
+        False,
+        "--dry-run",
+        "-dr",
+        help="Only estimate the calls of the run and their duration, without any call.",
+    ),
     no_parallel_execution: bool = typer.Option(
         False,
         "--no-parallel-execution",
         "-np",
         help="Don't parallelize the calls to the card market API.",
     ),
+    nb_workers: int = typer.Option(
+        DEFAULT_NB_WORKERS,
+        "--nb-workers",
+        "-w",
+        min=1,
+        help="Number of threads fetching the products.",
+    ),
 ):
     main_getdata(
         input_path=input_path,
@@ -94,7 +146,11 @@ def getdata(
         market_extract_path=market_extract_path,
         minimum_price=minimum_price,
         force_update=force_download,
+        only_changed=only_changed,
+        resume=resume,
+        dry_run=dry_run,
         parallel_execution=not no_parallel_execution,
+        nb_workers=nb_workers,
     )
 
 
@@ -185,9 +241,18 @@ def update(
         "-y",
         help="Prevents confirmation prompt from appearing.",
     ),
+    nb_workers: int = typer.Option(
+        1,
+        "--nb-workers",
+        "-w",
+        min=1,
+        help="Number of update requests sent at the same time.",
+    ),
 ) -> None:
     main_update(
-        stock_file_path=stock_file_path, yes_to_confirmation=yes_to_confirmation
+        stock_file_path=stock_file_path,
+        yes_to_confirmation=yes_to_confirmation,
+        nb_workers=nb_workers,
     )
 
 
@@ -205,8 +270,30 @@ def stats(
         resolve_path=True,
         help="Path where to get the stats df. Default is the current directory's 'stockStats.csv'",
     ),
+    from_stock_file: Optional[Path] = typer.Option(
+        None,
+        "--from-stock-file",
+        "-fsf",
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+        readable=True,
+        resolve_path=True,
+        help="Stock file (csv or excel) to compute the stats from, instead of the API.",
+    ),
+    stock_cache_max_age: int = typer.Option(
+        DEFAULT_STOCK_CACHE_MAX_AGE_MINUTES,
+        "--stock-cache-max-age",
+        "-sca",
+        min=0,
+        help="Minutes during which a downloaded stock export is reused, 0 to disable.",
+    ),
 ) -> None:
-    main_stats(stats_file_path=stats_file_path)
+    main_stats(
+        stats_file_path=stats_file_path,
+        from_stock_file=from_stock_file,
+        stock_cache_max_age=stock_cache_max_age,
+    )
 
 
 def version_callback(value: bool):
@@ -6,14 +6,20 @@ import pandas as pd
 
 from mpu.card_market_client import CardMarketClient
 from mpu.config_handling import load_config_file
-from mpu.market_extract import get_market_extract_path
+from mpu.extract_store import (PreloadedExtractStore,
+                               get_extract_store_from_config)
 from mpu.product_price import get_product_price
 from mpu.stock_handling import get_basic_stats, prepare_stock_df
 from mpu.stock_io import (get_stock_file_path,
                           save_stock_df_as_excel_formatted_file)
+from mpu.utils.freshness_policy import get_freshness_policy_from_config
 from mpu.utils.pyopenxl_utils import EXCEL_ENGINE
+from mpu.utils.rate_limiter import get_rate_limiter_from_config
+from mpu.utils.retry_policy import get_retry_policy_from_config
 from mpu.utils.strategies_utils import (CurrentPriceComputer, PriceUpdater,
                                         get_strategies_options)
+from mpu.utils.timeout_policy import (get_hedging_policy_from_config,
+                                      get_timeout_policy_from_config)
 
 
 def main(
@@ -28,13 +34,15 @@ def main(
     logger = logging.getLogger(__name__)
     logger.info("Starting calculate...")
 
-    market_extract_path = get_market_extract_path(
-        market_extract_parent_path=market_extract_path
-    )
-    logger.info(f"Market extract at {market_extract_path}.")
-
     stock_output_path = get_stock_file_path(folder_path=output_path)
     config = load_config_file(config_file_path=config_path)
+
+    extract_store = get_extract_store_from_config(
+        config=config, market_extract_parent_path=market_extract_path
+    )
+    logger.info(f"Market extract at {extract_store}.")
+    freshness_policy = get_freshness_policy_from_config(config=config)
+
     strategies_options = get_strategies_options(config=config)
 
     logger.info(
@@ -42,7 +50,14 @@ def main(
     )
     logger.info(f"With the following input options: {strategies_options}")
     logger.info(f"Setting up the client and the strategies...")
-    client = CardMarketClient()
+    client = CardMarketClient(
+        rate_limiter=get_rate_limiter_from_config(
+            config=config, folder_path=config_path.parent
+        ),
+        retry_policy=get_retry_policy_from_config(config=config),
+        timeout_policy=get_timeout_policy_from_config(config=config),
+        hedging_policy=get_hedging_policy_from_config(config=config),
+    )
     current_price_computer = CurrentPriceComputer(
         strategy_name=current_price_strategy, **strategies_options.current_price
     )
@@ -51,15 +66,6 @@ def main(
     )
     logger.info(f"Client and strategies initialized.")
 
-    get_product_price_with_args = partial(
-        get_product_price,
-        current_price_computer=current_price_computer,
-        market_extract_path=market_extract_path,
-        card_market_client=client,
-        config=config["request_options"],
-        force_update=False,
-    )
-
     stock_input_file_path = get_stock_file_path(folder_path=input_path, csv=True)
 
     logger.info(f"Loading stock excel from {stock_input_file_path}...")
@@ -72,6 +78,22 @@ def main(
         logger.info(f"Removed articles whose price is under {minimum_price}.")
 
     stock_df_for_strategies = stock_df.fillna("")
+
+    # All the market extracts of the stock are read at once
+    extract_store = PreloadedExtractStore(
+        extract_store=extract_store,
+        product_ids=stock_df_for_strategies["idProduct"].unique(),
+    )
+    get_product_price_with_args = partial(
+        get_product_price,
+        current_price_computer=current_price_computer,
+        extract_store=extract_store,
+        card_market_client=client,
+        config=config["request_options"],
+        freshness_policy=freshness_policy,
+        force_update=False,
+    )
+
     logger.info("Computing the new prices...")
     # Put the product prices in the df
     try:
@@ -86,6 +108,11 @@ def main(
         stock_df["SuggestedPrice"] = product_price
     finally:
         logger.info("Prices computing ended.")
+        client.rate_limiter.flush()
+        client.retry_policy.log_summary()
+        client.hedging_policy.log_summary()
+        freshness_policy.log_summary()
+        extract_store.close()
 
     logger.info("Computing the new columns...")
     stock_df = prepare_stock_df(_stock_df=stock_df)
@@ -1,16 +1,87 @@
 import logging
-from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 from pathlib import Path
+from typing import Callable, Optional, Set
 
 import pandas as pd
 
 from mpu.card_market_client import CardMarketClient
 from mpu.config_handling import load_config_file
-from mpu.market_extract import get_market_extract_path
-from mpu.product_price import get_single_product_market_extract
-from mpu.stock_io import get_stock_file_path
+from mpu.extract_store import get_extract_store_from_config
+from mpu.fetch_budget import estimate_fetch_budget, get_fetch_budget_file_path
+from mpu.fetch_journal import FetchJournal, get_fetch_journal_path
+from mpu.fetch_pipeline import (
+    FetchReport,
+    fetch_products,
+    fetch_products_in_threads,
+    get_fetch_failures_file_path,
+)
+from mpu.fetch_plan import plan_product_fetches
+from mpu.fetch_priority import get_fetch_priority_from_config
+from mpu.market_extract import ProductMarketExtract, get_product_market_extract
+from mpu.request_plan import (
+    CARD_LANGUAGE,
+    format_articles_queries,
+    get_articles_queries,
+)
+from mpu.stock_delta import read_former_stock_df, read_stock_delta
+from mpu.stock_io import (
+    get_previous_stock_file_path,
+    get_stock_file_path,
+    save_previous_stock_file,
+)
+from mpu.utils.freshness_policy import get_freshness_policy_from_config
 from mpu.utils.pyopenxl_utils import EXCEL_ENGINE
+from mpu.utils.rate_limiter import get_rate_limiter_from_config
+from mpu.utils.retry_policy import get_retry_policy_from_config
+from mpu.utils.single_flight import SingleFlight
+from mpu.utils.timeout_policy import (
+    get_hedging_policy_from_config,
+    get_timeout_policy_from_config,
+)
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_NB_WORKERS = 16
+
+
+def _read_changed_product_ids(
+    input_path: Path, stock_input_file_path: Path
+) -> Optional[Set[int]]:
+    """The products changed since the last complete getdata, None without previous stock"""
+    stock_delta = read_stock_delta(
+        stock_file_path=stock_input_file_path,
+        previous_stock_file_path=get_previous_stock_file_path(folder_path=input_path),
+    )
+    if stock_delta is None:
+        logger.info("No previous stock to compare to, the market extracts are reused.")
+        return None
+
+    logger.info(
+        f"Stock changes since the last complete getdata: {stock_delta.get_summary()}."
+    )
+    logger.info(
+        f"Updating the market extract of {len(stock_delta.changed_products)} changed products."
+    )
+    return set(stock_delta.changed_products)
+
+
+def _get_changed_products_extractor(
+    changed_product_ids: Set[int],
+    get_market_extract: Callable[..., ProductMarketExtract],
+) -> Callable[..., ProductMarketExtract]:
+    """Forces the update of the market extract of the changed products only, the
+    others using their existing market extract
+    """
+
+    def get_changed_product_market_extract(stock_info) -> ProductMarketExtract:
+        return get_market_extract(
+            stock_info=stock_info,
+            force_update=stock_info["idProduct"] in changed_product_ids,
+        )
+
+    return get_changed_product_market_extract
 
 
 def main(
@@ -20,63 +91,183 @@ def main(
     minimum_price: float,
     force_update: bool,
     parallel_execution: bool,
+    nb_workers: int = DEFAULT_NB_WORKERS,
+    only_changed: bool = False,
+    resume: bool = False,
+    dry_run: bool = False,
 ):
-    logger = logging.getLogger(__name__)
     logger.info("Starting getstockdata...")
 
     stock_input_file_path = get_stock_file_path(folder_path=input_path, csv=True)
 
     if parallel_execution:
-        executor = ProcessPoolExecutor()
-        logger.info(f"Parallel execution on {executor._max_workers} workers.")
-
-    market_extract_path = get_market_extract_path(
-        market_extract_parent_path=market_extract_path
-    )
-    logger.info(f"Market extract at {market_extract_path}.")
+        logger.info(f"Parallel execution on {nb_workers} threads.")
 
     config = load_config_file(config_file_path=config_path)
 
-    logger.info(f"Setting up the client...")
-    client = CardMarketClient()
-    logger.info(f"Client initialized.")
-
-    get_single_product_market_extract_with_args = partial(
-        get_single_product_market_extract,
-        market_extract_path=market_extract_path,
-        card_market_client=client,
-        config=config["request_options"],
-        force_update=force_update,
+    extract_store = get_extract_store_from_config(
+        config=config, market_extract_parent_path=market_extract_path
     )
+    logger.info(f"Market extract at {extract_store}.")
+    freshness_policy = get_freshness_policy_from_config(config=config)
+    # The rows of the same product are handled one at a time, and fetched only once
+    single_flight = SingleFlight()
+
+    changed_product_ids = None
+    if only_changed and not force_update:
+        changed_product_ids = _read_changed_product_ids(
+            input_path=input_path, stock_input_file_path=stock_input_file_path
+        )
 
     logger.info(f"Loading stock excel from {stock_input_file_path}...")
     stock_df = pd.read_csv(stock_input_file_path)
     stock_df = stock_df.fillna("")
     logger.info("Stock loaded.")
 
+    nb_stock_rows = len(stock_df)
     if minimum_price:
         stock_df = stock_df[stock_df["Price"] >= minimum_price]
         logger.info(f"Removed articles whose price is under {minimum_price}.")
 
     stock_df_for_strategies = stock_df.fillna("")
 
+    # The rows of the same product share its market extract, fetched once
+    fetch_plan = plan_product_fetches(
+        stock_df=stock_df_for_strategies, config=config["request_options"]
+    )
+    fetch_plan.log_summary()
+    articles_queries = get_articles_queries(
+        config=config["request_options"], card_language_ids=[CARD_LANGUAGE]
+    )
+    logger.info(
+        f"Articles calls of each product: {format_articles_queries(articles_queries)}."
+    )
+
+    # The most valuable products first, in case the request budget runs out
+    stock_infos = get_fetch_priority_from_config(config=config).order(
+        stock_infos=fetch_plan.stock_infos,
+        stock_df=stock_df_for_strategies,
+        extract_store=extract_store,
+        former_stock_df=read_former_stock_df(
+            file_path=get_previous_stock_file_path(folder_path=input_path)
+        ),
+    )
+    fetch_journal = FetchJournal(
+        journal_path=get_fetch_journal_path(folder_path=input_path)
+    )
+    if resume:
+        done_product_ids = fetch_journal.get_done_product_ids()
+        stock_infos = [
+            stock_info
+            for stock_info in stock_infos
+            if stock_info["idProduct"] not in done_product_ids
+        ]
+        logger.info(
+            f"Resuming the previous run: {len(fetch_plan.stock_infos) - len(stock_infos)} "
+            f"products already done, {len(stock_infos)} left."
+        )
+
+    if dry_run:
+        fetch_budget = estimate_fetch_budget(
+            stock_infos=stock_infos,
+            extract_store=extract_store,
+            config=config["request_options"],
+            force_update=force_update,
+            forced_product_ids=changed_product_ids,
+            freshness_policy=freshness_policy,
+        )
+        fetch_budget.log_summary(
+            rate_limiter=get_rate_limiter_from_config(
+                config=config, folder_path=config_path.parent
+            )
+        )
+        fetch_budget.save(file_path=get_fetch_budget_file_path(folder_path=input_path))
+        extract_store.close()
+        logger.info("getstockdata dry run complete, no call was sent.")
+        return
+
+    logger.info(f"Setting up the client...")
+    # The client is shared by all the workers, with one kept-alive connection each
+    client = CardMarketClient(
+        pool_size=nb_workers if parallel_execution else 1,
+        rate_limiter=get_rate_limiter_from_config(
+            config=config, folder_path=config_path.parent
+        ),
+        retry_policy=get_retry_policy_from_config(config=config),
+        timeout_policy=get_timeout_policy_from_config(config=config),
+        hedging_policy=get_hedging_policy_from_config(config=config),
+    )
+    logger.info(f"Client initialized.")
+
+    get_product_market_extract_with_args = partial(
+        get_product_market_extract,
+        extract_store=extract_store,
+        card_market_client=client,
+        config=config["request_options"],
+        freshness_policy=freshness_policy,
+        force_update=force_update,
+        single_flight=single_flight,
+    )
+
+    if changed_product_ids is not None:
+        get_product_market_extract_with_args = _get_changed_products_extractor(
+            changed_product_ids=changed_product_ids,
+            get_market_extract=get_product_market_extract_with_args,
+        )
+
     logger.info("Extracting market data...")
+    fetch_journal.open(resume=resume)
+    fetch_report = FetchReport(journal=fetch_journal)
     try:
         if parallel_execution:
-            rows = [row for _, row in stock_df_for_strategies.iterrows()]
-            executor.map(
-                get_single_product_market_extract_with_args, rows, chunksize=10
+            fetch_products_in_threads(
+                stock_infos=stock_infos,
+                get_market_extract=get_product_market_extract_with_args,
+                fetch_report=fetch_report,
+                nb_workers=nb_workers,
+                card_market_client=client,
             )
-            executor.shutdown()
         else:
-            stock_df_for_strategies.apply(
-                get_single_product_market_extract_with_args, axis="columns"
+            fetch_products(
+                stock_infos=stock_infos,
+                get_market_extract=get_product_market_extract_with_args,
+                fetch_report=fetch_report,
+                card_market_client=client,
             )
+        if fetch_report.is_cancelled:
+            raise fetch_report.cancel_error
     except Exception as error:
         logger.error("An error happened while extracting market data.")
         logger.error(error)
         raise
     finally:
         logger.info("Market data extraction ended.")
+        fetch_journal.close()
+        fetch_report.log_summary()
+        client.rate_limiter.flush()
+        fetch_report.save_failures(
+            file_path=get_fetch_failures_file_path(folder_path=input_path)
+        )
+        client.retry_policy.log_summary()
+        client.hedging_policy.log_summary()
+        freshness_policy.log_summary()
+        single_flight.log_summary()
+        extract_store.close()
+
+    # The products filtered out or done by a former run did not get this run's changes
+    is_complete = (
+        len(stock_df) == nb_stock_rows
+        and {stock_info["idProduct"] for stock_info in fetch_plan.stock_infos}
+        <= fetch_report.get_done_product_ids()
+    )
+    if is_complete:
+        # The changes are handled, the next run only gets the ones made from now on
+        previous_stock_path = save_previous_stock_file(folder_path=input_path)
+        logger.info(f"Stock kept at {previous_stock_path} for the next run.")
+    else:
+        logger.info(
+            "Not every product of the stock was fetched or cached by this run, the "
+            "previous stock is kept."
+        )
 
     logger.info("getstockdata complete.")
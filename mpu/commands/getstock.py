@@ -1,12 +1,30 @@
+import enum
 import logging
 from pathlib import Path
 
+import pandas as pd
+
 from mpu.card_market_client import CardMarketClient
-from mpu.stock_io import get_stock_file_path
+from mpu.export_polling import ExportHistory, get_export_history_file_path
+from mpu.stock_cache import get_stock_cache
+from mpu.stock_delta import (get_stock_delta, get_stock_df_as_saved,
+                             merge_stock_dfs)
+from mpu.stock_io import (get_previous_stock_file_path, get_stock_file_path,
+                          save_previous_stock_file)
+
+DEFAULT_STOCK_NB_WORKERS = 8
+
+
+class GetStockMode(str, enum.Enum):
+    full = "full"
+    incremental = "incremental"
 
 
 def main(
     output_path: Path,
+    stock_cache_max_age: int = 0,
+    mode: GetStockMode = GetStockMode.full,
+    nb_workers: int = DEFAULT_STOCK_NB_WORKERS,
 ):
     logger = logging.getLogger(__name__)
     logger.info("Starting getstock...")
@@ -14,10 +32,53 @@ def main(
     stock_output_path = get_stock_file_path(folder_path=output_path, csv=True)
 
     logger.info(f"Setting up the client...")
-    client = CardMarketClient()
+    client = CardMarketClient(
+        stock_cache=get_stock_cache(
+            max_age_minutes=stock_cache_max_age, folder_path=output_path
+        ),
+        export_history=ExportHistory(
+            history_path=get_export_history_file_path(folder_path=output_path)
+        ),
+    )
     logger.info(f"Client initialized.")
 
-    stock_df = client.get_stock_df()
+    former_stock_df = (
+        pd.read_csv(stock_output_path, index_col="idArticle")
+        if stock_output_path.exists()
+        else None
+    )
+
+    if mode == GetStockMode.incremental and former_stock_df is not None:
+        stock_df = client.get_stock_df_by_pages(
+            nb_workers=nb_workers, expected_size=len(former_stock_df)
+        )
+        stock_df, changes = merge_stock_dfs(
+            former_stock_df=former_stock_df, stock_df=stock_df
+        )
+        logger.info(f"Stock synced: {changes.get_summary()}.")
+    elif mode == GetStockMode.incremental:
+        logger.info(f"No stock at {stock_output_path} yet, all the articles are new.")
+        stock_df = client.get_stock_df_by_pages(nb_workers=nb_workers)
+    else:
+        stock_df = client.get_stock_df()
+
+    if former_stock_df is not None:
+        # The former stock is kept for getdata to know what changed, until a complete
+        # getdata run replaces it with the stock it used
+        if not get_previous_stock_file_path(folder_path=output_path).exists():
+            previous_stock_path = save_previous_stock_file(folder_path=output_path)
+            logger.info(f"Previous stock kept at {previous_stock_path}.")
+
+        stock_delta = get_stock_delta(
+            former_stock_df=former_stock_df,
+            stock_df=get_stock_df_as_saved(stock_df=stock_df),
+        )
+        logger.info(f"Stock changes: {stock_delta.get_summary()}.")
+
+        if mode == GetStockMode.incremental and not stock_delta.changes.nb_changes:
+            logger.info(f"Stock at {stock_output_path} is up to date.")
+            logger.info("getstock complete.")
+            return
 
     # Saves the result
     logger.info("Saving the stock...")
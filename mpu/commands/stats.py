@@ -1,13 +1,17 @@
 import logging
 from pathlib import Path
+from typing import Optional
 
 import pandas as pd
 
 from mpu.card_market_client import CardMarketClient
 from mpu.excel_formats import (INDEX_NAME, LARGE_STATS_COLUMNS_FORMAT,
                                SHORT_STATS_COLUMNS_FORMAT)
+from mpu.export_polling import ExportHistory, get_export_history_file_path
 from mpu.stats_calculations import aggregate_data
+from mpu.stock_cache import get_stock_cache
 from mpu.stock_handling import prep_stock_df_for_stats
+from mpu.stock_io import read_stock_file
 from mpu.utils.pyopenxl_utils import EXCEL_ENGINE, format_excel_df
 
 logger = logging.getLogger(__name__)
@@ -54,11 +58,31 @@ def create_short_stats_df(
     return short_stats_df
 
 
-def main(stats_file_path: Path):
+def main(
+    stats_file_path: Path,
+    from_stock_file: Optional[Path] = None,
+    stock_cache_max_age: int = 0,
+):
     logger.info("Starting stats...")
 
-    client = CardMarketClient()
-    stock_df = client.get_stock_df()
+    if from_stock_file is not None:
+        logger.info(f"Loading the stock from {from_stock_file}...")
+        stock_df = read_stock_file(file_path=from_stock_file)
+        logger.info("Stock loaded.")
+    else:
+        # The stock exports cache and history are next to the stats file
+        client = CardMarketClient(
+            stock_cache=get_stock_cache(
+                max_age_minutes=stock_cache_max_age,
+                folder_path=stats_file_path.parent,
+            ),
+            export_history=ExportHistory(
+                history_path=get_export_history_file_path(
+                    folder_path=stats_file_path.parent
+                )
+            ),
+        )
+        stock_df = client.get_stock_df()
 
     logger.info("Loading the existing stats...")
     try:
@@ -1,5 +1,6 @@
 import logging
 import math
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pandas as pd
@@ -15,7 +16,7 @@ MAX_UPDATES_PER_REQUEST = 75
 logger = logging.getLogger(__name__)
 
 
-def main(stock_file_path: Path, yes_to_confirmation: bool):
+def main(stock_file_path: Path, yes_to_confirmation: bool, nb_workers: int = 1):
     logger.info("Update starts...")
 
     stock_parent_path = stock_file_path.parent
@@ -29,7 +30,7 @@ def main(stock_file_path: Path, yes_to_confirmation: bool):
     stock_df = stock_df.fillna("")
     logger.info("Stock loaded.")
 
-    client = CardMarketClient()
+    client = CardMarketClient(pool_size=nb_workers)
 
     # Handling the 'manual prices'
     # If the price is manual, it overrides the suggested price and goes directly approved
@@ -76,17 +77,20 @@ def main(stock_file_path: Path, yes_to_confirmation: bool):
 
     logger.info("Updating the article prices...")
     nb_chunks = math.ceil(len(to_update_data) / MAX_UPDATES_PER_REQUEST)
-    for i in range(nb_chunks):
-        request_start = i * MAX_UPDATES_PER_REQUEST
-        request_response = client.update_articles_prices(
-            articles_data=to_update_data[
-                request_start : request_start + MAX_UPDATES_PER_REQUEST
-            ]
-        )
-        logger.info(
-            f"The non-update articles are: {request_response['notUpdatedArticles']}"
-        )
+    chunks = [
+        to_update_data[i * MAX_UPDATES_PER_REQUEST : (i + 1) * MAX_UPDATES_PER_REQUEST]
+        for i in range(nb_chunks)
+    ]
+    # The client can be shared by the threads, the chunks are sent concurrently
+    with ThreadPoolExecutor(max_workers=nb_workers) as executor:
+        for request_response in executor.map(
+            lambda chunk: client.update_articles_prices(articles_data=chunk), chunks
+        ):
+            logger.info(
+                f"The non-update articles are: {request_response['notUpdatedArticles']}"
+            )
     logger.info("Article prices updated.")
+    client.retry_policy.log_summary()
 
     logger.info("Saving the not updated articles...")
     stock_df[~approved_articles_mask].to_excel(
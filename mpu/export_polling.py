@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import statistics
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXPORT_HISTORY_FILE_NAME = "export_history.json"
+MAX_HISTORY_ENTRIES = 20
+POLL_INTERVAL = 30
+FAST_POLL_INTERVAL = 5
+# Share of the remaining expected time slept before polling again
+REMAINING_TIME_SLEPT = 0.9
+# Share of the delay of a late export waited before polling again
+LATE_POLL_DELAY_FACTOR = 0.25
+
+
+def get_export_history_file_path(folder_path: Path) -> Path:
+    """Constructs the path of the export history of the commands writing in a folder"""
+    return folder_path / EXPORT_HISTORY_FILE_NAME
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}m{seconds:02d}s"
+
+
+class ExportHistory:
+    """Durations of the past stock exports, with the size of their stock
+
+    The history is saved as json at `history_path`, keeping the last entries only,
+    and only kept in memory without it.
+    The duration of the next export is expected from the median time per article of
+    those exports, applied to the last known stock size.
+    """
+
+    def __init__(
+        self,
+        history_path: Optional[Path] = None,
+        max_entries: int = MAX_HISTORY_ENTRIES,
+    ) -> None:
+        self.history_path = Path(history_path) if history_path is not None else None
+        self.max_entries = max_entries
+        self.entries: List[dict] = self._load()
+
+    def _load(self) -> List[dict]:
+        if self.history_path is None:
+            return []
+
+        try:
+            return json.loads(self.history_path.read_text())["exports"]
+        except FileNotFoundError:
+            return []
+        except (ValueError, KeyError):
+            logger.warning(f"Could not read the export history at {self.history_path}.")
+            return []
+
+    def _save(self) -> None:
+        if self.history_path is None:
+            return
+
+        tmp_history_path = self.history_path.with_name(
+            f"{self.history_path.name}.{os.getpid()}.tmp"
+        )
+        tmp_history_path.write_text(json.dumps({"exports": self.entries}, indent=2))
+        os.replace(tmp_history_path, self.history_path)
+
+    def record(self, export_id: int, stock_size: int, duration: float) -> None:
+        self.entries.append(
+            {"idRequest": export_id, "stock_size": stock_size, "duration": duration}
+        )
+        self.entries = self.entries[-self.max_entries :]
+        self._save()
+
+        logger.info(
+            f"Export {export_id} of {stock_size} articles took "
+            f"{format_duration(duration)}."
+        )
+
+    def get_expected_duration(self) -> Optional[float]:
+        """Expected duration of an export, None without any past export"""
+        entries = [entry for entry in self.entries if entry["stock_size"] > 0]
+        if not entries:
+            return None
+
+        seconds_per_article = statistics.median(
+            entry["duration"] / entry["stock_size"] for entry in entries
+        )
+        return seconds_per_article * entries[-1]["stock_size"]
+
+
+def get_poll_delay(elapsed: float, expected_duration: Optional[float]) -> float:
+    """How long to wait before polling an export again
+
+    Without expected duration, the export is polled every POLL_INTERVAL. Otherwise
+    most of the remaining expected time is slept at once, and the export is polled
+    every FAST_POLL_INTERVAL around its expected end, then less and less often the
+    longer it is late.
+    """
+    if expected_duration is None:
+        return POLL_INTERVAL
+
+    remaining = expected_duration - elapsed
+    if remaining > FAST_POLL_INTERVAL:
+        return max(remaining * REMAINING_TIME_SLEPT, FAST_POLL_INTERVAL)
+
+    return min(
+        max(-remaining * LATE_POLL_DELAY_FACTOR, FAST_POLL_INTERVAL), POLL_INTERVAL
+    )
@@ -0,0 +1,71 @@
+import gzip
+import json
+import zlib
+
+# The article fields used to price a product, the others being dropped before saving
+ARTICLE_FIELDS = (
+    "idArticle",
+    "price",
+    "count",
+    "condition",
+    "isFoil",
+    "isSigned",
+    "isAltered",
+    "isPlayset",
+)
+ARTICLE_NESTED_FIELDS = {
+    "language": ("idLanguage", "languageName"),
+    "seller": ("country", "reputation", "isCommercial"),
+}
+ARTICLES_KEYS = ("articles", "articles_foil")
+GZIP_MAGIC_NUMBER = b"\x1f\x8b"
+COMPRESS_LEVEL = 6
+# The errors of decoding a truncated or corrupted market extract
+DECODE_ERRORS = (ValueError, EOFError, OSError, zlib.error)
+
+
+def prune_article(article: dict) -> dict:
+    pruned_article = {
+        field: article[field] for field in ARTICLE_FIELDS if field in article
+    }
+    for key, fields in ARTICLE_NESTED_FIELDS.items():
+        nested = article.get(key)
+        if isinstance(nested, dict):
+            pruned_article[key] = {
+                field: nested[field] for field in fields if field in nested
+            }
+
+    return pruned_article
+
+
+def prune_market_extract(market_extract: dict) -> dict:
+    """The market extract with only the article fields used by the strategies"""
+    pruned_market_extract = dict(market_extract)
+    for key in ARTICLES_KEYS:
+        articles = market_extract.get(key)
+        if isinstance(articles, list):
+            pruned_market_extract[key] = [
+                prune_article(article) if isinstance(article, dict) else article
+                for article in articles
+            ]
+
+    return pruned_market_extract
+
+
+def encode_market_extract(market_extract: dict) -> bytes:
+    """The pruned market extract as gzipped compact json"""
+    market_extract_json = json.dumps(
+        prune_market_extract(market_extract=market_extract), separators=(",", ":")
+    )
+    return gzip.compress(market_extract_json.encode(), compresslevel=COMPRESS_LEVEL)
+
+
+def decode_market_extract(data: bytes) -> dict:
+    """Reads a market extract saved as gzipped, zlib compressed or plain json"""
+    if data[:2] == GZIP_MAGIC_NUMBER:
+        data = gzip.decompress(data)
+    elif data[:1] == b"x":
+        # The zlib header, json never starting with an "x"
+        data = zlib.decompress(data)
+
+    return json.loads(data)
@@ -0,0 +1,343 @@
+import abc
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from mpu.extract_codec import (DECODE_ERRORS, decode_market_extract,
+                               encode_market_extract)
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_BACKEND = "directory"
+SQLITE_BACKEND = "sqlite"
+MARKET_EXTRACT_FOLDER_NAME = "market_extract"
+DEFAULT_SQLITE_FILE_NAME = "market_extract.sqlite"
+EXTRACT_FILE_SUFFIX = ".json.gz"
+LEGACY_EXTRACT_FILE_SUFFIX = ".json"
+
+
+def get_market_extract_path(market_extract_parent_path: Path) -> Path:
+    _market_extract_path = market_extract_parent_path / MARKET_EXTRACT_FOLDER_NAME
+    _market_extract_path.mkdir(exist_ok=True)
+
+    return _market_extract_path
+
+
+def get_config_fingerprint(config: dict) -> str:
+    """Short hash of the request options the market extracts are fetched with"""
+    config_json = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(config_json.encode()).hexdigest()[:16]
+
+
+class StoredExtract(NamedTuple):
+    market_extract: dict
+    fetched_at: datetime
+
+
+class ExtractStore(abc.ABC):
+    """Where the market extracts are saved and read, by product id"""
+
+    @abc.abstractmethod
+    def get(self, product_id: int) -> Optional[StoredExtract]:
+        """The market extract of a product and its fetch time, None if it isn't stored"""
+
+    def get_many(self, product_ids: Iterable[int]) -> Dict[int, StoredExtract]:
+        """The stored market extracts of the products, by product id"""
+        stored_extracts = {}
+        for product_id in product_ids:
+            stored_extract = self.get(product_id=product_id)
+            if stored_extract is not None:
+                stored_extracts[product_id] = stored_extract
+
+        return stored_extracts
+
+    def get_fetched_at_many(self, product_ids: Iterable[int]) -> Dict[int, datetime]:
+        """The fetch time of the stored market extracts of the products, by product id"""
+        return {
+            product_id: stored_extract.fetched_at
+            for product_id, stored_extract in self.get_many(
+                product_ids=product_ids
+            ).items()
+        }
+
+    @abc.abstractmethod
+    def save(
+        self,
+        product_id: int,
+        market_extract: dict,
+        fetched_at: Optional[datetime] = None,
+    ) -> None:
+        """Saves the market extract of a product, fetched now unless `fetched_at` is
+        given, e.g. the fetch time of the extract it only adds articles to
+        """
+
+    def close(self) -> None:
+        pass
+
+
+class DirectoryExtractStore(ExtractStore):
+    """One `<product_id>.json.gz` file per product in `market_extract_path`
+
+    The extracts are saved pruned and gzipped, the `<product_id>.json` files of the
+    former versions still being read. Each file is written atomically. The fetch time
+    of an extract is the modification time of its file.
+    """
+
+    def __init__(self, market_extract_path: Path) -> None:
+        self.market_extract_path = Path(market_extract_path)
+
+    def get_file_path(self, product_id: int, legacy: bool = False) -> Path:
+        suffix = LEGACY_EXTRACT_FILE_SUFFIX if legacy else EXTRACT_FILE_SUFFIX
+        return self.market_extract_path / f"{product_id}{suffix}"
+
+    def get(self, product_id: int) -> Optional[StoredExtract]:
+        for legacy in (False, True):
+            file_path = self.get_file_path(product_id=product_id, legacy=legacy)
+            try:
+                with file_path.open("rb") as product_file:
+                    modification_time = os.fstat(product_file.fileno()).st_mtime
+                    data = product_file.read()
+            except FileNotFoundError:
+                continue
+
+            try:
+                market_extract = decode_market_extract(data=data)
+            except DECODE_ERRORS as error:
+                # e.g. a file truncated by a former version, fetched again
+                logger.warning(f"Could not read {file_path}: {error.__repr__()}")
+                return None
+
+            return StoredExtract(
+                market_extract=market_extract,
+                fetched_at=datetime.fromtimestamp(modification_time, timezone.utc),
+            )
+
+        return None
+
+    def get_fetched_at_many(self, product_ids: Iterable[int]) -> Dict[int, datetime]:
+        # From the files metadata only, without reading them
+        fetched_at_per_product = {}
+        for product_id in product_ids:
+            for legacy in (False, True):
+                file_path = self.get_file_path(product_id=product_id, legacy=legacy)
+                try:
+                    modification_time = file_path.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                fetched_at_per_product[product_id] = datetime.fromtimestamp(
+                    modification_time, timezone.utc
+                )
+                break
+
+        return fetched_at_per_product
+
+    def save(
+        self,
+        product_id: int,
+        market_extract: dict,
+        fetched_at: Optional[datetime] = None,
+    ) -> None:
+        # Written aside then renamed, a reader never sees a partially written file
+        file_path = self.get_file_path(product_id=product_id)
+        temp_file_path = file_path.with_name(
+            f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        try:
+            temp_file_path.write_bytes(
+                encode_market_extract(market_extract=market_extract)
+            )
+            if fetched_at is not None:
+                # The fetch time is the modification time, kept by the rename
+                fetched_at_timestamp = fetched_at.timestamp()
+                os.utime(temp_file_path, (fetched_at_timestamp, fetched_at_timestamp))
+            os.replace(temp_file_path, file_path)
+        finally:
+            temp_file_path.unlink(missing_ok=True)
+        self.get_file_path(product_id=product_id, legacy=True).unlink(missing_ok=True)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.market_extract_path})"
+
+
+class SqliteExtractStore(ExtractStore):
+    """All the market extracts in a single SQLite file, one compressed row each
+
+    Each row keeps the time the extract was fetched at and the fingerprint of the
+    request options it was fetched with. The extracts fetched with other request
+    options are considered missing, so that they are fetched again. The connection is
+    used under a lock, so that the workers can read and write through the same one.
+    """
+
+    def __init__(self, db_path: Path, config_fingerprint: str) -> None:
+        self.db_path = Path(db_path)
+        self.config_fingerprint = config_fingerprint
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS market_extracts ("
+                "product_id INTEGER PRIMARY KEY, "
+                "fetched_at REAL NOT NULL, "
+                "config_fingerprint TEXT NOT NULL, "
+                "payload BLOB NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS market_extracts_fetched_at "
+                "ON market_extracts (fetched_at)"
+            )
+
+    @staticmethod
+    def _decode(payload: bytes, fetched_at: float) -> StoredExtract:
+        return StoredExtract(
+            market_extract=decode_market_extract(data=payload),
+            fetched_at=datetime.fromtimestamp(fetched_at, timezone.utc),
+        )
+
+    def get(self, product_id: int) -> Optional[StoredExtract]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT payload, fetched_at FROM market_extracts "
+                "WHERE product_id = ? AND config_fingerprint = ?",
+                (int(product_id), self.config_fingerprint),
+            ).fetchone()
+
+        return self._decode(*row) if row is not None else None
+
+    def get_many(self, product_ids: Iterable[int]) -> Dict[int, StoredExtract]:
+        # A single query whatever the number of products, their ids being one json
+        product_ids_json = json.dumps([int(product_id) for product_id in product_ids])
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT product_id, payload, fetched_at FROM market_extracts "
+                "WHERE config_fingerprint = ? "
+                "AND product_id IN (SELECT value FROM json_each(?))",
+                (self.config_fingerprint, product_ids_json),
+            ).fetchall()
+
+        return {
+            product_id: self._decode(payload=payload, fetched_at=fetched_at)
+            for product_id, payload, fetched_at in rows
+        }
+
+    def get_fetched_at_many(self, product_ids: Iterable[int]) -> Dict[int, datetime]:
+        # Without reading the payloads
+        product_ids_json = json.dumps([int(product_id) for product_id in product_ids])
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT product_id, fetched_at FROM market_extracts "
+                "WHERE config_fingerprint = ? "
+                "AND product_id IN (SELECT value FROM json_each(?))",
+                (self.config_fingerprint, product_ids_json),
+            ).fetchall()
+
+        return {
+            product_id: datetime.fromtimestamp(fetched_at, timezone.utc)
+            for product_id, fetched_at in rows
+        }
+
+    def save(
+        self,
+        product_id: int,
+        market_extract: dict,
+        fetched_at: Optional[datetime] = None,
+    ) -> None:
+        payload = encode_market_extract(market_extract=market_extract)
+        fetched_at = (
+            fetched_at if fetched_at is not None else datetime.now(timezone.utc)
+        )
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO market_extracts "
+                "(product_id, fetched_at, config_fingerprint, payload) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    int(product_id),
+                    fetched_at.timestamp(),
+                    self.config_fingerprint,
+                    payload,
+                ),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.db_path})"
+
+
+class PreloadedExtractStore(ExtractStore):
+    """Market extracts loaded at once from another store, which is still used for the
+    missing ones and the saves
+    """
+
+    def __init__(self, extract_store: ExtractStore, product_ids: Iterable[int]) -> None:
+        self.extract_store = extract_store
+        self.stored_extracts = extract_store.get_many(product_ids=product_ids)
+        logger.info(
+            f"{len(self.stored_extracts)} market extracts loaded from {extract_store}."
+        )
+
+    def get(self, product_id: int) -> Optional[StoredExtract]:
+        stored_extract = self.stored_extracts.get(product_id)
+        if stored_extract is not None:
+            return stored_extract
+
+        return self.extract_store.get(product_id=product_id)
+
+    def save(
+        self,
+        product_id: int,
+        market_extract: dict,
+        fetched_at: Optional[datetime] = None,
+    ) -> None:
+        fetched_at = (
+            fetched_at if fetched_at is not None else datetime.now(timezone.utc)
+        )
+        self.extract_store.save(
+            product_id=product_id, market_extract=market_extract, fetched_at=fetched_at
+        )
+        self.stored_extracts[product_id] = StoredExtract(
+            market_extract=market_extract, fetched_at=fetched_at
+        )
+
+    def close(self) -> None:
+        self.extract_store.close()
+
+    def __repr__(self) -> str:
+        return repr(self.extract_store)
+
+
+def get_extract_store_from_config(
+    config: dict, market_extract_parent_path: Path
+) -> ExtractStore:
+    """Creates the market extract store from the `market_extract` options of the config"""
+    market_extract_options = config.get("market_extract") or {}
+    backend = market_extract_options.get("backend", DIRECTORY_BACKEND)
+
+    if backend == DIRECTORY_BACKEND:
+        return DirectoryExtractStore(
+            market_extract_path=get_market_extract_path(
+                market_extract_parent_path=market_extract_parent_path
+            )
+        )
+    if backend == SQLITE_BACKEND:
+        return SqliteExtractStore(
+            db_path=market_extract_parent_path
+            / market_extract_options.get("sqlite_file_name", DEFAULT_SQLITE_FILE_NAME),
+            config_fingerprint=get_config_fingerprint(
+                config=config.get("request_options") or {}
+            ),
+        )
+
+    raise ValueError(
+        f"Unknown market extract backend {backend}, "
+        f"expected {DIRECTORY_BACKEND} or {SQLITE_BACKEND}"
+    )
@@ -0,0 +1,432 @@
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import typer
+
+from mpu.card_market_client import CONDITIONS, LANGUAGES, STOCK_PAGE_SIZE
+from mpu.utils.rate_limiter import (REQUEST_LIMIT_COUNT_HEADER,
+                                    REQUEST_LIMIT_MAX_HEADER)
+
+logger = logging.getLogger(__name__)
+
+API_PATH = "/ws/v2.0/output.json"
+FILES_PATH = "/files"
+EXPANSIONS = ("10E", "M10", "ZEN", "ROE", "MH2", "DMU", "ONE", "MOM", "WOE", "LCI")
+COUNTRIES = ("FR", "DE", "IT", "ES", "GB", "BE", "NL", "AT", "PT", "PL")
+# Env variable allowing the OAuth signing of the calls over http, as to the fake API
+INSECURE_TRANSPORT_ENV_VAR = "AUTHLIB_INSECURE_TRANSPORT"
+
+
+class FakeApiConfig(NamedTuple):
+    stock_size: int = 1000
+    # Number of distinct products in the stock, the rest are copies
+    nb_products: Optional[int] = None
+    articles_per_product: int = 300
+    # Log-normal latency of each call, in seconds
+    latency_median: float = 0.0
+    latency_sigma: float = 0.5
+    # Share of the calls answered by a transient 503
+    error_rate: float = 0.0
+    request_limit_max: int = 5000
+    # Time taken by an export to be finished, in seconds
+    export_delay: float = 5.0
+    seed: int = 0
+
+
+class FakeCardMarketApi:
+    """Local stand-in of the Card Market API, serving synthetic data
+
+    It implements the endpoints used by the CardMarketClient, so that the commands can
+    be load-tested against it through `CARD_MARKET_API_URL` without using the real
+    request budget. It holds the synthetic data, the exports and the request count.
+    """
+
+    def __init__(self, config: FakeApiConfig = FakeApiConfig()) -> None:
+        self.config = config
+        self.request_count = 0
+        self.exports: Dict[int, dict] = {}
+        self.updated_articles: List[dict] = []
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._stock_articles = self._create_stock_articles()
+
+    def _create_stock_articles(self) -> List[dict]:
+        rng = random.Random(self.config.seed)
+        nb_products = self.config.nb_products or max(self.config.stock_size // 3, 1)
+
+        articles = []
+        for index in range(self.config.stock_size):
+            product_id = 100000 + rng.randrange(nb_products)
+            articles.append(
+                {
+                    "idArticle": 1000000000 + index,
+                    "idProduct": product_id,
+                    "product": {
+                        "enName": f"Card {product_id}",
+                        "locName": f"Carte {product_id}",
+                        "abbreviation": EXPANSIONS[product_id % len(EXPANSIONS)],
+                    },
+                    "price": round(rng.lognormvariate(0, 1.5), 2),
+                    "language": {"idLanguage": rng.choice((1, 1, 2, 3))},
+                    "condition": rng.choice(CONDITIONS[:4]),
+                    "isFoil": rng.random() < 0.1,
+                    "isSigned": rng.random() < 0.01,
+                    "comments": "",
+                    "count": rng.randint(1, 4),
+                    "onSale": True,
+                }
+            )
+
+        return articles
+
+    def get_product_articles(self, product_id: int) -> List[dict]:
+        """The articles on sale for a product, the same ones for each call"""
+        rng = random.Random(self.config.seed * 1000003 + product_id)
+        base_price = rng.lognormvariate(0, 1.5)
+
+        articles = []
+        for index in range(self.config.articles_per_product):
+            language_id = rng.choice((1, 1, 1, 2, 2, 3, 4, 5, 7))
+            articles.append(
+                {
+                    "idArticle": product_id * 10000 + index,
+                    "idProduct": product_id,
+                    "language": {
+                        "idLanguage": language_id,
+                        "languageName": LANGUAGES[language_id - 1],
+                    },
+                    "comments": "",
+                    "price": round(base_price * rng.uniform(0.8, 2.5), 2),
+                    "count": rng.randint(1, 8),
+                    "inShoppingCart": False,
+                    "seller": {
+                        "idUser": rng.randint(1, 10**6),
+                        "username": f"seller{rng.randint(1, 10**6)}",
+                        "country": rng.choice(COUNTRIES),
+                        "isCommercial": rng.choice((0, 0, 1)),
+                        "reputation": rng.randint(0, 4),
+                        "sellCount": rng.randint(0, 10**5),
+                    },
+                    "condition": rng.choice(CONDITIONS),
+                    "isFoil": rng.random() < 0.15,
+                    "isSigned": False,
+                    "isAltered": False,
+                    "isPlayset": False,
+                }
+            )
+
+        return sorted(articles, key=lambda article: article["price"])
+
+    def count_request(self) -> Tuple[int, bool]:
+        """Counts a call, returns the count and whether it is over the limit"""
+        with self._lock:
+            self.request_count += 1
+            return (
+                self.request_count,
+                self.request_count > self.config.request_limit_max,
+            )
+
+    def get_latency(self) -> float:
+        if self.config.latency_median <= 0:
+            return 0.0
+
+        with self._lock:
+            return self._random.lognormvariate(
+                math.log(self.config.latency_median), self.config.latency_sigma
+            )
+
+    def is_transient_error(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.config.error_rate
+
+    def create_export(self, base_url: str) -> dict:
+        with self._lock:
+            export_id = len(self.exports) + 1
+            self.exports[export_id] = {
+                "idRequest": export_id,
+                "started": time.time(),
+                "url": f"{base_url}{FILES_PATH}/stock-{export_id}.json",
+            }
+
+        return self.get_export(export_id=export_id)
+
+    def get_export(self, export_id: int) -> dict:
+        export = self.exports[export_id]
+        finished = time.time() - export["started"] >= self.config.export_delay
+
+        return {
+            "idRequest": export_id,
+            "status": "finished" if finished else "pending",
+            "startedAt": datetime.fromtimestamp(export["started"], timezone.utc)
+            .isoformat()
+            .replace("+00:00", "Z"),
+            "url": export["url"] if finished else None,
+        }
+
+    def get_stock_file(self) -> dict:
+        return {"article": self._stock_articles}
+
+
+def filter_articles(articles: List[dict], query: Dict[str, List[str]]) -> List[dict]:
+    """Applies the filters of the articles endpoint query"""
+    min_condition = query.get("minCondition", [None])[0]
+    if min_condition is not None:
+        allowed_conditions = CONDITIONS[: CONDITIONS.index(min_condition) + 1]
+        articles = [a for a in articles if a["condition"] in allowed_conditions]
+
+    language_id = query.get("idLanguage", [None])[0]
+    if language_id is not None:
+        articles = [
+            a for a in articles if a["language"]["idLanguage"] == int(language_id)
+        ]
+
+    is_foil = query.get("isFoil", [None])[0]
+    if is_foil is not None:
+        articles = [a for a in articles if a["isFoil"] == (is_foil == "True")]
+
+    return articles
+
+
+class FakeApiRequestHandler(BaseHTTPRequestHandler):
+    server: "FakeApiServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format, *args)
+
+    def _send_json(
+        self,
+        status: HTTPStatus,
+        data: Optional[dict] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        body = json.dumps(data).encode("utf-8") if data is not None else b""
+
+        self.send_response(status)
+        for header_name, header_value in (headers or {}).items():
+            self.send_header(header_name, header_value)
+        if data is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str) -> None:
+        api = self.server.api
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        time.sleep(api.get_latency())
+
+        if url.path.startswith(FILES_PATH):
+            self._send_json(HTTPStatus.OK, api.get_stock_file())
+            return
+
+        if not url.path.startswith(API_PATH):
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Unknown path"})
+            return
+
+        request_count, over_limit = api.count_request()
+        limit_headers = {
+            REQUEST_LIMIT_COUNT_HEADER: str(
+                min(request_count, api.config.request_limit_max)
+            ),
+            REQUEST_LIMIT_MAX_HEADER: str(api.config.request_limit_max),
+        }
+        if over_limit:
+            self._send_json(
+                HTTPStatus.TOO_MANY_REQUESTS,
+                {"error": "Request limit reached"},
+                headers=limit_headers,
+            )
+            return
+        if api.is_transient_error():
+            self._send_json(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                {"error": "Transient error"},
+                headers={**limit_headers, "Retry-After": "1"},
+            )
+            return
+
+        status, data = self._route(
+            method=method, path=url.path[len(API_PATH) :], query=query, body=body
+        )
+        self._send_json(status, data, headers=limit_headers)
+
+    def _route(
+        self, method: str, path: str, query: Dict[str, List[str]], body: bytes
+    ) -> Tuple[HTTPStatus, Optional[dict]]:
+        api = self.server.api
+
+        if path == "/exports/stock" and method == "GET":
+            return HTTPStatus.OK, {
+                "stockExports": [api.get_export(export_id) for export_id in api.exports]
+            }
+        if path == "/exports/stock" and method == "POST":
+            return HTTPStatus.ACCEPTED, api.create_export(base_url=self.server.base_url)
+
+        if path == "/stock" and method == "PUT":
+            articles = [
+                {child.tag: child.text for child in article}
+                for article in ElementTree.fromstring(body).iter("article")
+            ]
+            api.updated_articles.extend(articles)
+            return HTTPStatus.OK, {
+                "updatedArticles": articles,
+                "notUpdatedArticles": [],
+            }
+
+        if method != "GET":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Method not allowed"}
+
+        match = re.fullmatch(r"/products/(\d+)", path)
+        if match:
+            product_id = int(match.group(1))
+            return HTTPStatus.OK, {
+                "product": {
+                    "idProduct": product_id,
+                    "enName": f"Card {product_id}",
+                    "locName": f"Carte {product_id}",
+                    "expansionName": EXPANSIONS[product_id % len(EXPANSIONS)],
+                }
+            }
+
+        match = re.fullmatch(r"/articles/(\d+)", path)
+        if match:
+            articles = filter_articles(
+                articles=api.get_product_articles(product_id=int(match.group(1))),
+                query=query,
+            )
+            start = int(query.get("start", [0])[0])
+            max_results = int(query.get("maxResults", [len(articles)])[0])
+            page = articles[start : start + max_results]
+            if not page:
+                return HTTPStatus.NO_CONTENT, None
+            if start + max_results < len(articles):
+                return HTTPStatus.PARTIAL_CONTENT, {"article": page}
+            return HTTPStatus.OK, {"article": page}
+
+        match = re.fullmatch(r"/stock/(\d+)", path)
+        if match:
+            start = int(match.group(1)) - 1
+            articles = api.get_stock_file()["article"]
+            page = articles[start : start + STOCK_PAGE_SIZE]
+            if not page:
+                return HTTPStatus.NO_CONTENT, None
+            if start + STOCK_PAGE_SIZE < len(articles):
+                return HTTPStatus.PARTIAL_CONTENT, {"article": page}
+            return HTTPStatus.OK, {"article": page}
+
+        match = re.fullmatch(r"/stock/article/(\d+)", path)
+        if match:
+            article_id = int(match.group(1))
+            for article in api.get_stock_file()["article"]:
+                if article["idArticle"] == article_id:
+                    return HTTPStatus.OK, {"article": article}
+
+        return HTTPStatus.NOT_FOUND, {"error": "Not found"}
+
+    def do_GET(self) -> None:
+        self._handle(method="GET")
+
+    def do_POST(self) -> None:
+        self._handle(method="POST")
+
+    def do_PUT(self) -> None:
+        self._handle(method="PUT")
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, api: FakeCardMarketApi, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), FakeApiRequestHandler)
+        self.api = api
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        """The url to use as `CARD_MARKET_API_URL`"""
+        return f"{self.base_url}{API_PATH}"
+
+
+def start_fake_api_server(
+    config: FakeApiConfig = FakeApiConfig(), host: str = "127.0.0.1", port: int = 0
+) -> FakeApiServer:
+    """Starts the fake API in a background thread, port 0 meaning any free port"""
+    server = FakeApiServer(api=FakeCardMarketApi(config=config), host=host, port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def main(
+    host: str = typer.Option("127.0.0.1", help="Host to listen on."),
+    port: int = typer.Option(8765, help="Port to listen on."),
+    stock_size: int = typer.Option(1000, help="Number of articles in the stock."),
+    nb_products: Optional[int] = typer.Option(
+        None, help="Number of distinct products in the stock, a third by default."
+    ),
+    articles_per_product: int = typer.Option(
+        300, help="Number of articles on sale per product."
+    ),
+    latency_median: float = typer.Option(
+        0.0, help="Median latency of the calls, in seconds."
+    ),
+    latency_sigma: float = typer.Option(
+        0.5, help="Sigma of the log-normal latency of the calls."
+    ),
+    error_rate: float = typer.Option(
+        0.0, help="Share of the calls answered by a transient 503."
+    ),
+    request_limit_max: int = typer.Option(
+        5000, help="Number of calls before the API answers with 429."
+    ),
+    export_delay: float = typer.Option(
+        5.0, help="Time taken by a stock export to be finished, in seconds."
+    ),
+    seed: int = typer.Option(0, help="Seed of the synthetic data."),
+) -> None:
+    config = FakeApiConfig(
+        stock_size=stock_size,
+        nb_products=nb_products,
+        articles_per_product=articles_per_product,
+        latency_median=latency_median,
+        latency_sigma=latency_sigma,
+        error_rate=error_rate,
+        request_limit_max=request_limit_max,
+        export_delay=export_delay,
+        seed=seed,
+    )
+    server = FakeApiServer(api=FakeCardMarketApi(config=config), host=host, port=port)
+    # The OAuth signing over http has to be allowed on the side of the commands
+    typer.echo(
+        f"Fake API listening, use CARD_MARKET_API_URL={server.api_url} "
+        f"{INSECURE_TRANSPORT_ENV_VAR}=1"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,180 @@
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+import pandas as pd
+
+from mpu.export_polling import format_duration
+from mpu.extract_store import ExtractStore
+from mpu.request_plan import (get_foil_articles_queries,
+                              get_market_extract_queries)
+from mpu.utils.freshness_policy import FreshnessPolicy
+from mpu.utils.rate_limiter import RequestRateLimiter
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_ENDPOINT = "products"
+ARTICLES_ENDPOINT = "articles"
+
+
+def get_fetch_budget_file_path(folder_path: Path) -> Path:
+    """Constructs the path of the products a getdata dry run would fetch or reuse"""
+    return folder_path / "getdata_dry_run.csv"
+
+
+class ProductFetchEstimate(NamedTuple):
+    product_id: int
+    # Whether its stored market extract would be used
+    cached: bool
+    nb_calls_per_endpoint: Dict[str, int]
+
+
+class FetchBudget(NamedTuple):
+    """The calls a getdata run would send, estimated without any call"""
+
+    estimates: List[ProductFetchEstimate]
+
+    @property
+    def nb_calls_per_endpoint(self) -> Counter:
+        nb_calls_per_endpoint = Counter()
+        for estimate in self.estimates:
+            nb_calls_per_endpoint.update(estimate.nb_calls_per_endpoint)
+
+        return nb_calls_per_endpoint
+
+    @property
+    def nb_calls(self) -> int:
+        return sum(self.nb_calls_per_endpoint.values())
+
+    def log_summary(self, rate_limiter: RequestRateLimiter) -> None:
+        nb_cached = sum(estimate.cached for estimate in self.estimates)
+        logger.info(
+            f"Dry run: {len(self.estimates) - nb_cached} products to fetch, "
+            f"{nb_cached} using their stored market extract."
+        )
+        nb_calls_per_endpoint = self.nb_calls_per_endpoint
+        logger.info(
+            f"Dry run: {self.nb_calls} calls, "
+            + ", ".join(
+                f"{nb_calls_per_endpoint[endpoint]} to {endpoint}"
+                for endpoint in (PRODUCTS_ENDPOINT, ARTICLES_ENDPOINT)
+            )
+            + "."
+        )
+
+        remaining = rate_limiter.remaining
+        if remaining is not None:
+            logger.info(f"Dry run: {remaining} calls left in today's budget.")
+            if self.nb_calls > remaining:
+                logger.warning(
+                    f"Dry run: {self.nb_calls - remaining} calls over today's budget, "
+                    f"the run would stop on the request limit and need a --resume."
+                )
+
+        rate = rate_limiter.get_rate()
+        if rate is None:
+            logger.info("Dry run: the calls are not paced, the duration is unknown.")
+        else:
+            logger.info(
+                f"Dry run: expected duration of "
+                f"{format_duration(self.nb_calls / rate)} at {rate:.2f} calls/s."
+            )
+
+    def save(self, file_path: Path) -> None:
+        pd.DataFrame(
+            [
+                {
+                    "idProduct": estimate.product_id,
+                    "cached": estimate.cached,
+                    **{
+                        f"{endpoint}_calls": estimate.nb_calls_per_endpoint.get(
+                            endpoint, 0
+                        )
+                        for endpoint in (PRODUCTS_ENDPOINT, ARTICLES_ENDPOINT)
+                    },
+                }
+                for estimate in self.estimates
+            ],
+            columns=["idProduct", "cached", "products_calls", "articles_calls"],
+        ).to_csv(file_path, index=False)
+        logger.info(f"Dry run: the products saved at {file_path}.")
+
+
+def estimate_fetch_budget(
+    stock_infos: Iterable[dict],
+    extract_store: ExtractStore,
+    config: dict,
+    force_update: bool = False,
+    forced_product_ids: Optional[Set[int]] = None,
+    freshness_policy: Optional[FreshnessPolicy] = None,
+) -> FetchBudget:
+    """The calls getdata would send for the products, from the extract store only
+
+    A product is fetched when forced, missing from the store or expired, as getdata
+    would do. A stored extract of a foil product without its foil articles only gets
+    the calls of the foil add-on. The retries are not counted.
+    """
+    stock_infos = list(stock_infos)
+    forced_product_ids = forced_product_ids or set()
+    fetched_at_per_product = extract_store.get_fetched_at_many(
+        product_ids=[stock_info["idProduct"] for stock_info in stock_infos]
+    )
+
+    def is_cached(stock_info: dict) -> bool:
+        product_id = stock_info["idProduct"]
+        if force_update or product_id in forced_product_ids:
+            return False
+        if product_id not in fetched_at_per_product:
+            return False
+
+        return freshness_policy is None or not freshness_policy.is_expired(
+            fetched_at=fetched_at_per_product[product_id],
+            price=float(stock_info["Price"]),
+        )
+
+    cached_stock_infos = [
+        stock_info for stock_info in stock_infos if is_cached(stock_info=stock_info)
+    ]
+    # The foil articles are only looked for in the extracts that could lack them
+    cached_foil_extracts = extract_store.get_many(
+        product_ids=[
+            stock_info["idProduct"]
+            for stock_info in cached_stock_infos
+            if stock_info["Foil?"] != ""
+        ]
+    )
+
+    estimates = []
+    cached_product_ids = {stock_info["idProduct"] for stock_info in cached_stock_infos}
+    for stock_info in stock_infos:
+        product_id = stock_info["idProduct"]
+        if product_id not in cached_product_ids:
+            nb_calls_per_endpoint = {
+                PRODUCTS_ENDPOINT: 1,
+                ARTICLES_ENDPOINT: len(
+                    get_market_extract_queries(config=config, stock_info=stock_info)
+                ),
+            }
+        elif (
+            product_id in cached_foil_extracts
+            and cached_foil_extracts[product_id].market_extract.get("articles_foil")
+            is None
+        ):
+            nb_calls_per_endpoint = {
+                ARTICLES_ENDPOINT: len(
+                    get_foil_articles_queries(config=config, stock_info=stock_info)
+                )
+            }
+        else:
+            nb_calls_per_endpoint = {}
+
+        estimates.append(
+            ProductFetchEstimate(
+                product_id=product_id,
+                cached=product_id in cached_product_ids,
+                nb_calls_per_endpoint=nb_calls_per_endpoint,
+            )
+        )
+
+    return FetchBudget(estimates=estimates)
@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Set
+
+logger = logging.getLogger(__name__)
+
+# The outcomes of the products that do not need to be fetched again on resume
+DONE_STATUSES = ("fetched", "cached")
+
+
+def get_fetch_journal_path(folder_path: Path) -> Path:
+    """Constructs the path of the journal of the getdata runs"""
+    return folder_path / "getdata_journal.jsonl"
+
+
+class FetchJournal:
+    """Journal of the products handled by getdata, written as each one completes
+
+    Each line is a json entry with the product, its outcome, its time and the number
+    of calls it used, flushed right away so that an interrupted run can be resumed
+    from it. The workers write to the same file, one whole line at a time.
+    """
+
+    def __init__(self, journal_path: Path) -> None:
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+        self._journal_file = None
+
+    def read_statuses(self) -> Dict[int, str]:
+        """The last outcome of each product in the journal"""
+        statuses = {}
+        try:
+            with self.journal_path.open() as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line of an interrupted run can be partial
+                        logger.warning(f"Skipping an unreadable journal line: {line}")
+                        continue
+                    statuses[entry["idProduct"]] = entry["status"]
+        except FileNotFoundError:
+            pass
+
+        return statuses
+
+    def get_done_product_ids(self) -> Set[int]:
+        return {
+            product_id
+            for product_id, status in self.read_statuses().items()
+            if status in DONE_STATUSES
+        }
+
+    def open(self, resume: bool) -> None:
+        """Opens the journal to record the run, emptied unless it is resumed"""
+        self._journal_file = self.journal_path.open("a" if resume else "w")
+        # The partial last line of an interrupted run is ended first
+        if self._journal_file.tell() > 0:
+            with self.journal_path.open("rb") as journal_file:
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read() != b"\n":
+                    self._journal_file.write("\n")
+
+    def close(self) -> None:
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+
+    def record(self, product_id: int, status: str, nb_calls: int) -> None:
+        entry = {
+            "idProduct": int(product_id),
+            "status": status,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "nb_calls": nb_calls,
+        }
+        with self._lock:
+            self._journal_file.write(json.dumps(entry) + "\n")
+            self._journal_file.flush()
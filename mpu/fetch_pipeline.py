@@ -0,0 +1,217 @@
+import enum
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Iterable, List, NamedTuple, Optional, Set
+
+import pandas as pd
+
+from mpu.card_market_client import CardMarketApiError, CardMarketClient
+from mpu.fetch_journal import FetchJournal
+from mpu.market_extract import ProductMarketExtract
+
+logger = logging.getLogger(__name__)
+
+# Number of products submitted to the thread pool ahead of each worker
+IN_FLIGHT_PER_WORKER = 2
+
+
+class FetchStatus(str, enum.Enum):
+    fetched = "fetched"
+    cached = "cached"
+    failed = "failed"
+    # Not tried, the run being cancelled
+    skipped = "skipped"
+
+
+class ProductFetchOutcome(NamedTuple):
+    product_id: int
+    status: FetchStatus
+    error: str = ""
+    nb_calls: int = 0
+
+
+def get_fetch_failures_file_path(folder_path: Path) -> Path:
+    """Constructs the path of the products getdata failed to fetch"""
+    return folder_path / "getdata_failures.csv"
+
+
+class FetchReport:
+    """Collects the outcome of each product of a getdata run
+
+    The run is cancelled by the first error exceeding the request limit, the products
+    not tried yet being skipped. With a `journal`, the outcome of each product tried is
+    also recorded there as it completes.
+    """
+
+    def __init__(self, journal: Optional[FetchJournal] = None) -> None:
+        self._lock = threading.Lock()
+        self.journal = journal
+        self.outcomes: List[ProductFetchOutcome] = []
+        self.cancel_error: Optional[CardMarketApiError] = None
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.cancel_error is not None
+
+    def add(self, outcome: ProductFetchOutcome) -> None:
+        with self._lock:
+            self.outcomes.append(outcome)
+        if self.journal is not None and outcome.status != FetchStatus.skipped:
+            self.journal.record(
+                product_id=outcome.product_id,
+                status=outcome.status.value,
+                nb_calls=outcome.nb_calls,
+            )
+
+    def cancel(self, error: CardMarketApiError) -> None:
+        with self._lock:
+            if self.cancel_error is None:
+                logger.error("Rate limit exceeded for today, stopping")
+                self.cancel_error = error
+
+    def get_failures(self) -> List[ProductFetchOutcome]:
+        return [
+            outcome
+            for outcome in self.outcomes
+            if outcome.status in (FetchStatus.failed, FetchStatus.skipped)
+        ]
+
+    def get_done_product_ids(self) -> Set[int]:
+        """The products fetched or cached by the run"""
+        return {
+            outcome.product_id
+            for outcome in self.outcomes
+            if outcome.status in (FetchStatus.fetched, FetchStatus.cached)
+        }
+
+    def save_failures(self, file_path: Path) -> None:
+        """Saves the failed and skipped products to retry them, if any"""
+        failures = self.get_failures()
+        if not failures:
+            file_path.unlink(missing_ok=True)
+            return
+
+        pd.DataFrame(
+            [
+                {
+                    "idProduct": outcome.product_id,
+                    "status": outcome.status.value,
+                    "error": outcome.error,
+                }
+                for outcome in failures
+            ]
+        ).to_csv(file_path, index=False)
+        logger.info(f"{len(failures)} products to retry saved at {file_path}.")
+
+    def log_summary(self) -> None:
+        nb_outcomes_per_status = Counter(outcome.status for outcome in self.outcomes)
+        logger.info(
+            "Products: "
+            + ", ".join(
+                f"{nb_outcomes_per_status[status]} {status.value}"
+                for status in FetchStatus
+            )
+            + f", {sum(outcome.nb_calls for outcome in self.outcomes)} calls."
+        )
+
+
+def fetch_product(
+    stock_info: dict,
+    get_market_extract: Callable[..., ProductMarketExtract],
+    fetch_report: FetchReport,
+    card_market_client: Optional[CardMarketClient] = None,
+) -> None:
+    """Gets the market extract of a product, recording its outcome in the report
+
+    The calls of the product are counted on the `card_market_client`, the product being
+    fetched by a single thread.
+    """
+    product_id = stock_info["idProduct"]
+    if fetch_report.is_cancelled:
+        fetch_report.add(ProductFetchOutcome(product_id, FetchStatus.skipped))
+        return
+
+    def get_nb_thread_calls() -> int:
+        return card_market_client.nb_thread_calls if card_market_client else 0
+
+    nb_calls_before = get_nb_thread_calls()
+    try:
+        product_market_extract = get_market_extract(stock_info=stock_info)
+    except Exception as error:
+        logger.error(
+            f"Error when trying to extract data for product {product_id}: {error.__repr__()}"
+        )
+        fetch_report.add(
+            ProductFetchOutcome(
+                product_id=product_id,
+                status=FetchStatus.failed,
+                error=error.__repr__(),
+                nb_calls=get_nb_thread_calls() - nb_calls_before,
+            )
+        )
+        if isinstance(error, CardMarketApiError) and error.exceeded_request_limit:
+            fetch_report.cancel(error=error)
+        return
+
+    fetch_report.add(
+        ProductFetchOutcome(
+            product_id=product_id,
+            status=(
+                FetchStatus.fetched
+                if product_market_extract.fetched
+                else FetchStatus.cached
+            ),
+            nb_calls=get_nb_thread_calls() - nb_calls_before,
+        )
+    )
+
+
+def fetch_products(
+    stock_infos: Iterable[dict],
+    get_market_extract: Callable[..., ProductMarketExtract],
+    fetch_report: FetchReport,
+    card_market_client: Optional[CardMarketClient] = None,
+) -> None:
+    for stock_info in stock_infos:
+        fetch_product(
+            stock_info=stock_info,
+            get_market_extract=get_market_extract,
+            fetch_report=fetch_report,
+            card_market_client=card_market_client,
+        )
+
+
+def fetch_products_in_threads(
+    stock_infos: Iterable[dict],
+    get_market_extract: Callable[..., ProductMarketExtract],
+    fetch_report: FetchReport,
+    nb_workers: int,
+    card_market_client: Optional[CardMarketClient] = None,
+) -> None:
+    """Fetches the products on `nb_workers` threads
+
+    Only a few products per worker are submitted at a time, so that a cancelled run
+    does not have the whole stock queued.
+    """
+    max_in_flight = nb_workers * IN_FLIGHT_PER_WORKER
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=nb_workers) as executor:
+        for stock_info in stock_infos:
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            in_flight.add(
+                executor.submit(
+                    fetch_product,
+                    stock_info=stock_info,
+                    get_market_extract=get_market_extract,
+                    fetch_report=fetch_report,
+                    card_market_client=card_market_client,
+                )
+            )
+        for future in in_flight:
+            future.result()
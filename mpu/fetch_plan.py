@@ -0,0 +1,92 @@
+import logging
+from typing import Iterable, List, NamedTuple
+
+import pandas as pd
+
+from mpu.request_plan import (CARD_LANGUAGE, CARD_LANGUAGES_KEY,
+                              get_card_language_ids,
+                              get_market_extract_queries)
+
+logger = logging.getLogger(__name__)
+
+NO_FOIL = ""
+
+
+class ProductFetchPlan(NamedTuple):
+    # One stock info per product, the market extract being shared by its rows
+    stock_infos: List[dict]
+    nb_rows: int
+    nb_calls_saved: int
+
+    def log_summary(self) -> None:
+        logger.info(
+            f"{self.nb_rows} stock rows planned as {len(self.stock_infos)} product "
+            f"fetches, saving up to {self.nb_calls_saved} calls."
+        )
+
+
+def get_nb_calls_per_extract(config: dict, stock_info: dict) -> int:
+    """The number of calls to fetch the market extract of a stock row"""
+    # The product info, and the articles
+    return 1 + len(get_market_extract_queries(config=config, stock_info=stock_info))
+
+
+def _get_nb_calls(config: dict, stock_infos: Iterable[dict]) -> int:
+    nb_calls_per_key = {}
+    nb_calls = 0
+    for stock_info in stock_infos:
+        key = (
+            tuple(get_card_language_ids(stock_info=stock_info)),
+            stock_info["Foil?"] != NO_FOIL,
+        )
+        if key not in nb_calls_per_key:
+            nb_calls_per_key[key] = get_nb_calls_per_extract(
+                config=config, stock_info=stock_info
+            )
+        nb_calls += nb_calls_per_key[key]
+
+    return nb_calls
+
+
+def plan_product_fetches(stock_df: pd.DataFrame, config: dict) -> ProductFetchPlan:
+    """Groups the stock rows by product, to fetch each market extract only once
+
+    The stock info of a product is the one of its most expensive row, so that its
+    market extract is refreshed according to that price, and is foil if any row is
+    so that the foil articles are fetched along. With the `CARD` language in the
+    request options, the articles of the languages of all its rows are fetched.
+    """
+    is_foil = stock_df["Foil?"] != NO_FOIL
+    products_df = (
+        stock_df.sort_values("Price", ascending=False, kind="stable")
+        .drop_duplicates(subset="idProduct")
+        .copy()
+    )
+    foil_product_ids = stock_df.loc[is_foil, "idProduct"].unique()
+    products_df.loc[
+        products_df["idProduct"].isin(foil_product_ids)
+        & (products_df["Foil?"] == NO_FOIL),
+        "Foil?",
+    ] = "X"
+
+    if CARD_LANGUAGE in (config.get("languages") or []):
+        card_language_ids = stock_df.groupby("idProduct", sort=False)[
+            "Language"
+        ].unique()
+        products_df[CARD_LANGUAGES_KEY] = [
+            card_language_ids[product_id].tolist()
+            for product_id in products_df["idProduct"]
+        ]
+
+    stock_infos = products_df.to_dict(orient="records")
+    row_columns = [column for column in ("Foil?", "Language") if column in stock_df]
+    nb_rows_calls = _get_nb_calls(
+        config=config, stock_infos=stock_df[row_columns].to_dict(orient="records")
+    )
+
+    return ProductFetchPlan(
+        stock_infos=stock_infos,
+        nb_rows=len(stock_df),
+        nb_calls_saved=nb_rows_calls
+        - _get_nb_calls(config=config, stock_infos=stock_infos),
+    )
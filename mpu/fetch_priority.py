@@ -0,0 +1,160 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from mpu.extract_store import ExtractStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VALUE_WEIGHT = 1.0
+DEFAULT_MAX_STALENESS_DAYS = 30
+
+
+def get_price_changes(
+    stock_df: pd.DataFrame, former_stock_df: Optional[pd.DataFrame]
+) -> pd.Series:
+    """The largest relative price change of the articles of each product since the
+    previous stock, by product id
+    """
+    if former_stock_df is None:
+        return pd.Series(dtype=float)
+
+    prices = stock_df.set_index("idArticle")["Price"]
+    former_prices = former_stock_df["Price"].reindex(prices.index)
+    price_changes = ((prices - former_prices) / former_prices).abs()
+
+    return (
+        price_changes.groupby(stock_df.set_index("idArticle")["idProduct"])
+        .max()
+        .dropna()
+    )
+
+
+class FetchPriority:
+    """Orders the product fetches of getdata, the most valuable first
+
+    The score of a product is the sum of:
+    - `value_weight` × its stock value, the Price × Amount of its rows in €,
+    - `staleness_weight` × the age of its market extract in days, up to
+    `max_staleness_days` which is also the age of a missing extract,
+    - `volatility_weight` × the largest relative price change of its rows since the
+    previous stock, e.g. 0.5 for a 2€ article repriced at 3€.
+
+    The products are fetched by decreasing score, in the stock order for the same
+    score, so that the most valuable part of the stock is refreshed first when the
+    request budget runs out.
+    """
+
+    def __init__(
+        self,
+        value_weight: float = DEFAULT_VALUE_WEIGHT,
+        staleness_weight: float = 0.0,
+        volatility_weight: float = 0.0,
+        max_staleness_days: float = DEFAULT_MAX_STALENESS_DAYS,
+    ) -> None:
+        self.value_weight = value_weight
+        self.staleness_weight = staleness_weight
+        self.volatility_weight = volatility_weight
+        self.max_staleness_days = max_staleness_days
+
+    @property
+    def enabled(self) -> bool:
+        return any((self.value_weight, self.staleness_weight, self.volatility_weight))
+
+    def get_staleness_days(
+        self, product_ids: pd.Index, fetched_at_per_product: Dict[int, datetime]
+    ) -> pd.Series:
+        now = datetime.now(timezone.utc)
+        staleness_days = pd.Series(
+            [
+                (now - fetched_at_per_product[product_id]).total_seconds() / 86400
+                if product_id in fetched_at_per_product
+                else self.max_staleness_days
+                for product_id in product_ids
+            ],
+            index=product_ids,
+            dtype=float,
+        )
+
+        return staleness_days.clip(upper=self.max_staleness_days)
+
+    def get_scores(
+        self,
+        stock_df: pd.DataFrame,
+        extract_store: ExtractStore,
+        former_stock_df: Optional[pd.DataFrame] = None,
+    ) -> pd.Series:
+        """The score of each product of the stock, by product id"""
+        product_ids = pd.Index(stock_df["idProduct"].unique())
+        scores = pd.Series(0.0, index=product_ids)
+
+        if self.value_weight:
+            values = (
+                (stock_df["Price"] * stock_df["Amount"])
+                .groupby(stock_df["idProduct"])
+                .sum()
+            )
+            scores += self.value_weight * values.reindex(product_ids)
+
+        if self.staleness_weight:
+            staleness_days = self.get_staleness_days(
+                product_ids=product_ids,
+                fetched_at_per_product=extract_store.get_fetched_at_many(
+                    product_ids=product_ids
+                ),
+            )
+            scores += self.staleness_weight * staleness_days
+
+        if self.volatility_weight:
+            price_changes = get_price_changes(
+                stock_df=stock_df, former_stock_df=former_stock_df
+            )
+            scores += self.volatility_weight * price_changes.reindex(
+                product_ids, fill_value=0.0
+            )
+
+        return scores
+
+    def order(
+        self,
+        stock_infos: List[dict],
+        stock_df: pd.DataFrame,
+        extract_store: ExtractStore,
+        former_stock_df: Optional[pd.DataFrame] = None,
+    ) -> List[dict]:
+        """The stock infos of the products, from the highest score"""
+        if not self.enabled:
+            return stock_infos
+
+        scores = self.get_scores(
+            stock_df=stock_df,
+            extract_store=extract_store,
+            former_stock_df=former_stock_df,
+        )
+        logger.info(
+            f"Fetching the products by decreasing score, from {scores.max():.2f} "
+            f"to {scores.min():.2f}."
+        )
+
+        # sorted is stable, the products of the same score keep the stock order
+        return sorted(
+            stock_infos,
+            key=lambda stock_info: scores[stock_info["idProduct"]],
+            reverse=True,
+        )
+
+
+def get_fetch_priority_from_config(config: dict) -> FetchPriority:
+    """Creates the fetch priority from the `fetch_priority` options of the config"""
+    fetch_priority_options = config.get("fetch_priority") or {}
+
+    return FetchPriority(
+        value_weight=fetch_priority_options.get("value_weight", DEFAULT_VALUE_WEIGHT),
+        staleness_weight=fetch_priority_options.get("staleness_weight", 0.0),
+        volatility_weight=fetch_priority_options.get("volatility_weight", 0.0),
+        max_staleness_days=fetch_priority_options.get(
+            "max_staleness_days", DEFAULT_MAX_STALENESS_DAYS
+        ),
+    )
@@ -1,32 +1,43 @@
-import json
 import logging
-import os
+from datetime import datetime
 from functools import partial
-from pathlib import Path
-from typing import Optional
+from typing import Iterator, NamedTuple, Optional
 
-from mpu.card_market_client import (CardMarketClient, get_conditions,
-                                    get_language_id)
+from mpu.card_market_client import CardMarketClient
+from mpu.extract_codec import prune_market_extract
+from mpu.extract_store import ExtractStore
+from mpu.request_plan import (FOIL_MAX_RESULTS, ArticlesQuery,
+                              get_articles_queries, get_card_language_ids,
+                              get_foil_articles_config)
+from mpu.utils.freshness_policy import FreshnessPolicy
+from mpu.utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# The max number of articles per query when a market extract is extended
+EXTENDED_MAX_RESULTS = 500
+# The start of the next page of each articles query of an extended market extract
+NEXT_STARTS_KEY = "next_starts"
 
-def get_market_extract_path(market_extract_parent_path: Path) -> Path:
-    _market_extract_path = market_extract_parent_path / "market_extract"
-    try:
-        os.mkdir(str(_market_extract_path))
-    except FileExistsError:
-        pass
 
-    return _market_extract_path
+class ProductMarketExtract(NamedTuple):
+    market_extract: dict
+    # Whether it was fetched from the API rather than read from the extract store
+    fetched: bool
 
 
 def save_market_extract(
-    product_market_extract: dict, market_extract_path: Path, product_id: int
+    product_market_extract: dict,
+    extract_store: ExtractStore,
+    product_id: int,
+    fetched_at: Optional[datetime] = None,
 ) -> None:
     logger.info(f"Saving market extract for {product_id}.")
-    with (market_extract_path / f"{product_id}.json").open("w") as product_file:
-        json.dump(obj=product_market_extract, fp=product_file)
+    extract_store.save(
+        product_id=product_id,
+        market_extract=product_market_extract,
+        fetched_at=fetched_at,
+    )
 
 
 def add_foil_articles_if_needed(
@@ -34,71 +45,26 @@ def add_foil_articles_if_needed(
     stock_info: dict,
     card_market_client: CardMarketClient,
     config: dict,
-    max_results: int = 50,
+    max_results: int = FOIL_MAX_RESULTS,
 ):
     if market_extract.get("articles_foil") is not None or stock_info["Foil?"] == "":
         return market_extract
 
-    _config = config.copy()
-    _config["max_results"] = {k: max_results for k, v in _config["max_results"].items()}
-    _config["default_max_results"] = max_results
-
-    return {
-        **market_extract,
-        **{
-            "articles_foil": get_product_articles_language_and_conditions(
-                card_market_client=card_market_client,
-                stock_info=stock_info,
-                config=_config,
-                foil=True,
-            )
-        },
-    }
-
-
-def get_product_articles_from_card_market_with_languages(
-    stock_info: dict,
-    card_market_client: CardMarketClient,
-    config: dict,
-    min_condition: str,
-    foil: Optional[bool] = None,
-):
-    product_id = stock_info["idProduct"]
-
-    languages_names = config.get("languages")
-    if languages_names is None:
-        return card_market_client.get_product_articles(
-            product_id=product_id,
-            min_condition=min_condition,
-            max_results=config.get("default_max_results"),
-            foil=foil,
-        )
-
-    # Case of multiple requests per language
-    articles = []
-
-    language_ids = [
-        get_language_id(language) if language != "CARD" else stock_info["Language"]
-        for language in languages_names
-    ]
-    # Removing duplicated languages
-    language_ids = list(set(language_ids))
-
-    for language_name, language_id in zip(languages_names, language_ids):
-        max_results = config.get("max_results").get(
-            language_name, config.get("default_max_results")
-        )
-        articles.extend(
-            card_market_client.get_product_articles(
-                product_id=product_id,
-                min_condition=min_condition,
-                max_results=max_results,
-                language_id=language_id,
-                foil=foil,
-            )
-        )
-
-    return articles
+    return prune_market_extract(
+        market_extract={
+            **market_extract,
+            **{
+                "articles_foil": get_product_articles_language_and_conditions(
+                    card_market_client=card_market_client,
+                    stock_info=stock_info,
+                    config=get_foil_articles_config(
+                        config=config, max_results=max_results
+                    ),
+                    foil=True,
+                )
+            },
+        }
+    )
 
 
 def get_product_articles_language_and_conditions(
@@ -107,26 +73,21 @@ def get_product_articles_language_and_conditions(
     config: dict,
     foil: Optional[bool] = None,
 ):
-    if not config.get("one_request_per_condition", False):
-        return get_product_articles_from_card_market_with_languages(
-            stock_info=stock_info,
-            card_market_client=card_market_client,
-            config=config,
-            min_condition=config["min_condition"],
-            foil=foil,
-        )
+    queries = get_articles_queries(
+        config=config,
+        card_language_ids=get_card_language_ids(stock_info=stock_info),
+        foil=foil,
+    )
 
-    # Case of multiple requests per condition
     product_articles = []
-
-    for condition in get_conditions(config["min_condition"]):
+    for query in queries:
         product_articles.extend(
-            get_product_articles_from_card_market_with_languages(
-                stock_info=stock_info,
-                card_market_client=card_market_client,
-                config=config,
-                min_condition=condition,
-                foil=foil,
+            card_market_client.get_product_articles(
+                product_id=stock_info["idProduct"],
+                min_condition=query.min_condition,
+                max_results=query.max_results,
+                language_id=query.language_id,
+                foil=query.foil,
             )
         )
 
@@ -136,74 +97,249 @@ def get_product_articles_language_and_conditions(
 def get_market_extract_from_card_market(
     stock_info: dict,
     card_market_client: CardMarketClient,
-    market_extract_path: Path,
+    extract_store: ExtractStore,
     config: dict,
 ):
     product_id = stock_info["idProduct"]
 
-    product_market_extract = {
-        "articles": get_product_articles_language_and_conditions(
-            stock_info=stock_info, card_market_client=card_market_client, config=config
-        ),
-        "info": card_market_client.get_product_info(product_id=product_id),
-    }
-    add_foil_articles_if_needed(
+    # The extract is used as it is saved, with the article fields of the strategies only
+    product_market_extract = prune_market_extract(
+        market_extract={
+            "articles": get_product_articles_language_and_conditions(
+                stock_info=stock_info,
+                card_market_client=card_market_client,
+                config=config,
+            ),
+            "info": card_market_client.get_product_info(product_id=product_id),
+        }
+    )
+    product_market_extract = add_foil_articles_if_needed(
         card_market_client=card_market_client,
         stock_info=stock_info,
         market_extract=product_market_extract,
         config=config,
-        max_results=50,
     )
 
     save_market_extract(
         product_market_extract=product_market_extract,
         product_id=product_id,
-        market_extract_path=market_extract_path,
+        extract_store=extract_store,
     )
 
     return product_market_extract
 
 
-def get_single_product_market_extract(
+def _get_query_key(query: ArticlesQuery) -> str:
+    return f"{query.language_id}|{query.min_condition}|{query.foil}"
+
+
+def _add_articles(
+    market_extract: dict, articles: list, query_key: str, next_start: Optional[int]
+) -> dict:
+    known_article_ids = {
+        article.get("idArticle") for article in market_extract["articles"]
+    }
+    new_articles = [
+        article
+        for article in articles
+        if article.get("idArticle") not in known_article_ids
+    ]
+
+    return prune_market_extract(
+        market_extract={
+            **market_extract,
+            "articles": market_extract["articles"] + new_articles,
+            NEXT_STARTS_KEY: {
+                **market_extract.get(NEXT_STARTS_KEY, {}),
+                query_key: next_start,
+            },
+        }
+    )
+
+
+def iter_extended_market_extracts(
     stock_info: dict,
-    market_extract_path: Path,
+    market_extract: dict,
+    card_market_client: CardMarketClient,
+    extract_store: ExtractStore,
+    config: dict,
+    max_results: int = EXTENDED_MAX_RESULTS,
+) -> Iterator[dict]:
+    """Yields the market extract extended with one more page of articles at a time
+
+    Each articles query goes on where it stopped, up to `max_results` articles. The
+    next page is only requested once the previous extract is consumed, e.g. when the
+    strategy still lacks suitable examples. Each extended extract is saved, with the
+    next start of its queries so that a later extension goes on from there, and with
+    the fetch time of the stored extract so that it expires as it would have.
+    """
+    product_id = stock_info["idProduct"]
+    fetched_at = extract_store.get_fetched_at_many(product_ids=[product_id]).get(
+        product_id
+    )
+    queries = get_articles_queries(
+        config=config, card_language_ids=get_card_language_ids(stock_info=stock_info)
+    )
+
+    for query in queries:
+        query_key = _get_query_key(query=query)
+        # Without max results, all the articles were already fetched
+        start = market_extract.get(NEXT_STARTS_KEY, {}).get(
+            query_key, query.max_results
+        )
+        if start is None or start >= max_results:
+            continue
+
+        for articles in card_market_client.iter_product_articles(
+            product_id=product_id,
+            min_condition=query.min_condition,
+            language_id=query.language_id,
+            foil=query.foil,
+            start=start,
+            max_results=max_results - start,
+        ):
+            start += len(articles)
+            market_extract = _add_articles(
+                market_extract=market_extract,
+                articles=articles,
+                query_key=query_key,
+                next_start=start,
+            )
+            save_market_extract(
+                product_market_extract=market_extract,
+                product_id=product_id,
+                extract_store=extract_store,
+                fetched_at=fetched_at,
+            )
+            yield market_extract
+
+        # No more articles to fetch for that query
+        market_extract = _add_articles(
+            market_extract=market_extract,
+            articles=[],
+            query_key=query_key,
+            next_start=None,
+        )
+        save_market_extract(
+            product_market_extract=market_extract,
+            product_id=product_id,
+            extract_store=extract_store,
+            fetched_at=fetched_at,
+        )
+
+
+def _get_single_product_market_extract(
+    stock_info: dict,
+    extract_store: ExtractStore,
     card_market_client: CardMarketClient,
     config: dict,
     force_update: bool = False,
-) -> dict:
-    """Get a product price from the local file if possible, otherwise from the API"""
+    freshness_policy: Optional[FreshnessPolicy] = None,
+) -> ProductMarketExtract:
     product_id = stock_info["idProduct"]
 
-    single_product_market_extract_path = market_extract_path / f"{product_id}.json"
     _get_market_extract_from_card_market = partial(
         get_market_extract_from_card_market,
         stock_info=stock_info,
-        market_extract_path=market_extract_path,
+        extract_store=extract_store,
         card_market_client=card_market_client,
         config=config,
     )
 
     if force_update:
-        return _get_market_extract_from_card_market()
+        return ProductMarketExtract(
+            market_extract=_get_market_extract_from_card_market(), fetched=True
+        )
+
+    stored_extract = extract_store.get(product_id=product_id)
+    if stored_extract is None:
+        return ProductMarketExtract(
+            market_extract=_get_market_extract_from_card_market(), fetched=True
+        )
 
-    try:
-        with single_product_market_extract_path.open("r") as product_prices_file:
-            product_market_extract = json.load(fp=product_prices_file)
-    except FileNotFoundError:
-        return _get_market_extract_from_card_market()
+    if freshness_policy is not None and freshness_policy.is_expired(
+        fetched_at=stored_extract.fetched_at, price=float(stock_info["Price"])
+    ):
+        logger.info(f"Market extract of {product_id} expired.")
+        return ProductMarketExtract(
+            market_extract=_get_market_extract_from_card_market(), fetched=True
+        )
+
+    product_market_extract = stored_extract.market_extract
 
     new_product_market_extract = add_foil_articles_if_needed(
         card_market_client=card_market_client,
         stock_info=stock_info,
         market_extract=product_market_extract,
         config=config,
-        max_results=50,
     )
     if new_product_market_extract != product_market_extract:
+        # Only the foil articles are new, the extract keeps the age of the others
         save_market_extract(
             product_market_extract=new_product_market_extract,
             product_id=product_id,
-            market_extract_path=market_extract_path,
+            extract_store=extract_store,
+            fetched_at=stored_extract.fetched_at,
         )
 
-    return product_market_extract
+    return ProductMarketExtract(
+        market_extract=new_product_market_extract, fetched=False
+    )
+
+
+def get_product_market_extract(
+    stock_info: dict,
+    extract_store: ExtractStore,
+    card_market_client: CardMarketClient,
+    config: dict,
+    force_update: bool = False,
+    freshness_policy: Optional[FreshnessPolicy] = None,
+    single_flight: Optional[SingleFlight] = None,
+) -> ProductMarketExtract:
+    """Get a product price from the extract store if possible, otherwise from the API
+
+    A stored extract expired according to the `freshness_policy` is fetched again, the
+    result telling whether the extract was fetched. With a `single_flight`, the rows of
+    the same product are handled one at a time, and the ones after the first use its
+    saved extract instead of fetching it again.
+    """
+    _get_market_extract = partial(
+        _get_single_product_market_extract,
+        stock_info=stock_info,
+        extract_store=extract_store,
+        card_market_client=card_market_client,
+        config=config,
+    )
+    if single_flight is None:
+        return _get_market_extract(
+            force_update=force_update, freshness_policy=freshness_policy
+        )
+
+    with single_flight.acquire(key=stock_info["idProduct"]) as already_handled:
+        if already_handled:
+            return _get_market_extract()
+
+        return _get_market_extract(
+            force_update=force_update, freshness_policy=freshness_policy
+        )
+
+
+def get_single_product_market_extract(
+    stock_info: dict,
+    extract_store: ExtractStore,
+    card_market_client: CardMarketClient,
+    config: dict,
+    force_update: bool = False,
+    freshness_policy: Optional[FreshnessPolicy] = None,
+    single_flight: Optional[SingleFlight] = None,
+) -> dict:
+    """The market extract only, see `get_product_market_extract`"""
+    return get_product_market_extract(
+        stock_info=stock_info,
+        extract_store=extract_store,
+        card_market_client=card_market_client,
+        config=config,
+        force_update=force_update,
+        freshness_policy=freshness_policy,
+        single_flight=single_flight,
+    ).market_extract
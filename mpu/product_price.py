@@ -1,11 +1,14 @@
 import logging
 from functools import partial
-from pathlib import Path
+from typing import Optional
 
 import pandas as pd
 
 from mpu.card_market_client import CardMarketApiError, CardMarketClient
-from mpu.market_extract import get_single_product_market_extract
+from mpu.extract_store import ExtractStore
+from mpu.market_extract import (get_single_product_market_extract,
+                                iter_extended_market_extracts)
+from mpu.utils.freshness_policy import FreshnessPolicy
 from mpu.utils.strategies_utils import (CurrentPriceComputer,
                                         SuitableExamplesShortage)
 
@@ -14,20 +17,22 @@ logger = logging.getLogger(__name__)
 
 def get_product_price(
     row: pd.Series,
-    market_extract_path: Path,
+    extract_store: ExtractStore,
     current_price_computer: CurrentPriceComputer,
     card_market_client: CardMarketClient,
     force_update: bool,
     config: dict,
+    freshness_policy: Optional[FreshnessPolicy] = None,
 ) -> float:
     stock_info: dict = row.to_dict()
     product_id = stock_info["idProduct"]
     _get_single_product_market_extract = partial(
         get_single_product_market_extract,
         stock_info=stock_info,
-        market_extract_path=market_extract_path,
+        extract_store=extract_store,
         card_market_client=card_market_client,
         force_update=force_update,
+        freshness_policy=freshness_policy,
         config=config,
     )
 
@@ -40,6 +45,7 @@ def get_product_price(
         if error.exceeded_request_limit:
             logger.error("Rate limit exceeded for today, stopping")
             raise
+        return float("nan")
     except Exception as error:
         logger.error(
             f"Error when trying to extract data for product {product_id}: {error.__repr__()}"
@@ -51,11 +57,29 @@ def get_product_price(
             stock_info=stock_info, market_extract=market_extract
         )
     except SuitableExamplesShortage:
-        # We try with a larger request in case of a lack of suitable examples
-        market_extract = _get_single_product_market_extract(max_results=500)
-        try:
-            return current_price_computer.get_current_price_from_market_extract(
-                stock_info=stock_info, market_extract=market_extract
-            )
-        except SuitableExamplesShortage:
-            return float("nan")
+        pass
+
+    # We fetch more articles page by page in case of a lack of suitable examples
+    try:
+        for extended_market_extract in iter_extended_market_extracts(
+            stock_info=stock_info,
+            market_extract=market_extract,
+            card_market_client=card_market_client,
+            extract_store=extract_store,
+            config=config,
+        ):
+            try:
+                return current_price_computer.get_current_price_from_market_extract(
+                    stock_info=stock_info, market_extract=extended_market_extract
+                )
+            except SuitableExamplesShortage:
+                continue
+    except CardMarketApiError as error:
+        logger.error(
+            f"Error when trying to extend data for product {product_id}: {error.__repr__()}"
+        )
+        if error.exceeded_request_limit:
+            logger.error("Rate limit exceeded for today, stopping")
+            raise
+
+    return float("nan")
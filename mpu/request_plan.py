@@ -0,0 +1,136 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from mpu.card_market_client import get_conditions, get_language_id
+
+CARD_LANGUAGE = "CARD"
+# The languages of all the rows of a product, set by the fetch plan
+CARD_LANGUAGES_KEY = "CardLanguages"
+FOIL_MAX_RESULTS = 50
+
+
+class ArticlesQuery(NamedTuple):
+    language_id: Optional[int]
+    min_condition: str
+    foil: Optional[bool]
+    # None for the API maximum
+    max_results: Optional[int]
+
+
+def _get_largest_max_results(
+    max_results: Optional[int], other_max_results: Optional[int]
+) -> Optional[int]:
+    if max_results is None or other_max_results is None:
+        return None
+
+    return max(max_results, other_max_results)
+
+
+def get_articles_queries(
+    config: dict,
+    card_language_ids: Iterable[int] = (),
+    foil: Optional[bool] = None,
+) -> List[ArticlesQuery]:
+    """The calls to get the articles of a product, expanded from the request options
+
+    Each language of the config (`CARD` standing for the languages of the product
+    rows in `card_language_ids`) is requested with its own `max_results`, for the min
+    condition or each condition with `one_request_per_condition`. The queries of the
+    same language, condition and foil are merged into the one with the most results,
+    which gets all of theirs, e.g. `CARD` and `English` for an English card. Queries
+    of different conditions or foil are all kept, a limited result set of one not
+    being a subset of the other's.
+    """
+    if config.get("one_request_per_condition", False):
+        conditions = list(get_conditions(config["min_condition"]))
+    else:
+        conditions = [config["min_condition"]]
+
+    languages_names = config.get("languages")
+    default_max_results = config.get("default_max_results")
+    if languages_names is None:
+        languages: List[Tuple[Optional[int], Optional[int]]] = [
+            (None, default_max_results)
+        ]
+    else:
+        max_results_per_language = config.get("max_results") or {}
+        languages = []
+        for language_name in languages_names:
+            max_results = max_results_per_language.get(
+                language_name, default_max_results
+            )
+            if language_name == CARD_LANGUAGE:
+                languages.extend(
+                    (language_id, max_results) for language_id in card_language_ids
+                )
+            else:
+                languages.append((get_language_id(language_name), max_results))
+
+    queries: Dict[tuple, ArticlesQuery] = {}
+    for condition in conditions:
+        for language_id, max_results in languages:
+            key = (language_id, condition, foil)
+            if key in queries:
+                max_results = _get_largest_max_results(
+                    max_results, queries[key].max_results
+                )
+            queries[key] = ArticlesQuery(
+                language_id=language_id,
+                min_condition=condition,
+                foil=foil,
+                max_results=max_results,
+            )
+
+    return list(queries.values())
+
+
+def get_foil_articles_config(config: dict, max_results: int) -> dict:
+    """The request options of the foil articles, with the same max results for all"""
+    return {
+        **config,
+        "max_results": {
+            language_name: max_results
+            for language_name in config.get("max_results") or {}
+        },
+        "default_max_results": max_results,
+    }
+
+
+def get_card_language_ids(stock_info: dict) -> List[int]:
+    card_language_ids = stock_info.get(CARD_LANGUAGES_KEY)
+    if card_language_ids is None:
+        card_language_ids = [stock_info.get("Language")]
+
+    return [
+        language_id
+        for language_id in card_language_ids
+        if language_id not in ("", None)
+    ]
+
+
+def get_foil_articles_queries(config: dict, stock_info: dict) -> List[ArticlesQuery]:
+    """The articles calls of the foil add-on of a stock row, none if it isn't foil"""
+    if stock_info["Foil?"] == "":
+        return []
+
+    return get_articles_queries(
+        config=get_foil_articles_config(config=config, max_results=FOIL_MAX_RESULTS),
+        card_language_ids=get_card_language_ids(stock_info=stock_info),
+        foil=True,
+    )
+
+
+def get_market_extract_queries(config: dict, stock_info: dict) -> List[ArticlesQuery]:
+    """All the articles calls to fetch the market extract of a stock row"""
+    queries = get_articles_queries(
+        config=config, card_language_ids=get_card_language_ids(stock_info=stock_info)
+    )
+
+    return queries + get_foil_articles_queries(config=config, stock_info=stock_info)
+
+
+def format_articles_queries(queries: Iterable[ArticlesQuery]) -> str:
+    return ", ".join(
+        f"(language={query.language_id}, min_condition={query.min_condition}, "
+        f"foil={query.foil}, max_results={query.max_results})"
+        for query in queries
+    )
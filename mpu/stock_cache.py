@@ -0,0 +1,145 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+STOCK_CACHE_FOLDER_NAME = "stock_exports"
+DEFAULT_STOCK_CACHE_MAX_AGE = timedelta(hours=1)
+# Max age of the cache used by the commands, in minutes
+DEFAULT_STOCK_CACHE_MAX_AGE_MINUTES = 60
+STOCK_CACHE_FILE_SUFFIX = ".pkl"
+START_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+def get_export_start_time(export: dict) -> Optional[datetime]:
+    """Reads the `startedAt` of an export as an aware datetime, None if it can't be"""
+    started_at = export.get("startedAt")
+    if not started_at:
+        return None
+
+    try:
+        start_time = datetime.fromisoformat(started_at.replace("Z", "+00:00"))
+    except (ValueError, TypeError):
+        return None
+
+    # Ensure start_time is timezone-aware
+    if start_time.tzinfo is None:
+        start_time = start_time.replace(tzinfo=timezone.utc)
+
+    return start_time
+
+
+class StockExportCache:
+    """Normalized stocks of the downloaded exports, reused while they are recent
+
+    Each stock is pickled in `cache_path` in a file named after the id and the start
+    time of its export, so that the commands run in the same window (e.g. getstock and
+    stats) download and normalize an export only once. A stock is reused until its
+    export is older than `max_age`, the older files being removed.
+    """
+
+    def __init__(
+        self, cache_path: Path, max_age: timedelta = DEFAULT_STOCK_CACHE_MAX_AGE
+    ) -> None:
+        self.cache_path = Path(cache_path)
+        self.max_age = max_age
+
+    def get_file_path(self, export_id: int, start_time: datetime) -> Path:
+        start_time = start_time.astimezone(timezone.utc).strftime(START_TIME_FORMAT)
+        return self.cache_path / f"{export_id}_{start_time}{STOCK_CACHE_FILE_SUFFIX}"
+
+    def _get_export_file_path(self, export: dict) -> Optional[Path]:
+        start_time = get_export_start_time(export=export)
+        if export.get("idRequest") is None or start_time is None:
+            return None
+
+        return self.get_file_path(export_id=export["idRequest"], start_time=start_time)
+
+    def _get_cached_start_times(self) -> dict:
+        """Start time of the cached exports, by file path"""
+        if not self.cache_path.is_dir():
+            return {}
+
+        start_times = {}
+        for file_path in self.cache_path.glob(f"*{STOCK_CACHE_FILE_SUFFIX}"):
+            try:
+                start_time = datetime.strptime(
+                    file_path.stem.split("_", 1)[1], START_TIME_FORMAT
+                )
+            except (IndexError, ValueError):
+                continue
+            start_times[file_path] = start_time.replace(tzinfo=timezone.utc)
+
+        return start_times
+
+    def is_recent(self, start_time: datetime) -> bool:
+        return datetime.now(timezone.utc) - start_time < self.max_age
+
+    def _load(self, file_path: Path) -> Optional[pd.DataFrame]:
+        try:
+            stock_df = pd.read_pickle(file_path)
+        except FileNotFoundError:
+            return None
+
+        logger.info(f"Stock loaded from the cached export at {file_path}.")
+        return stock_df
+
+    def get(self, export: dict) -> Optional[pd.DataFrame]:
+        """The cached stock of an export, None if it isn't cached"""
+        file_path = self._get_export_file_path(export=export)
+        if file_path is None:
+            return None
+
+        return self._load(file_path=file_path)
+
+    def get_latest(self) -> Optional[pd.DataFrame]:
+        """The stock of the most recent cached export, None if none is recent enough"""
+        start_times = self._get_cached_start_times()
+        if not start_times:
+            return None
+
+        file_path = max(start_times, key=start_times.get)
+        if not self.is_recent(start_time=start_times[file_path]):
+            return None
+
+        return self._load(file_path=file_path)
+
+    def save(self, export: dict, stock_df: pd.DataFrame) -> None:
+        file_path = self._get_export_file_path(export=export)
+        if file_path is None:
+            logger.warning(
+                f"The export {export.get('idRequest')} has no start time, "
+                "its stock isn't cached."
+            )
+            return
+
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        temp_file_path = file_path.with_suffix(".tmp")
+        stock_df.to_pickle(temp_file_path)
+        os.replace(temp_file_path, file_path)
+        logger.info(f"Stock of the export {export['idRequest']} cached at {file_path}.")
+
+        self.remove_old_files()
+
+    def remove_old_files(self) -> None:
+        for file_path, start_time in self._get_cached_start_times().items():
+            if not self.is_recent(start_time=start_time):
+                file_path.unlink(missing_ok=True)
+
+
+def get_stock_cache(
+    max_age_minutes: int, folder_path: Path
+) -> Optional[StockExportCache]:
+    """Creates the stock cache of the commands writing in a folder, None when disabled"""
+    if max_age_minutes <= 0:
+        return None
+
+    return StockExportCache(
+        cache_path=folder_path / STOCK_CACHE_FOLDER_NAME,
+        max_age=timedelta(minutes=max_age_minutes),
+    )
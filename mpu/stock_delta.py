@@ -0,0 +1,140 @@
+import io
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+
+class StockChanges(NamedTuple):
+    added: pd.Index
+    removed: pd.Index
+    changed: pd.Index
+
+    @property
+    def nb_changes(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def get_summary(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.removed)} removed, "
+            f"{len(self.changed)} changed"
+        )
+
+
+def get_stock_df_as_saved(stock_df: pd.DataFrame) -> pd.DataFrame:
+    """The stock df as it is read back from the csv stock file, to compare them"""
+    csv_buffer = io.StringIO()
+    stock_df.to_csv(csv_buffer)
+    csv_buffer.seek(0)
+
+    return pd.read_csv(csv_buffer, index_col="idArticle")
+
+
+def get_stock_changes(
+    former_stock_df: pd.DataFrame, stock_df: pd.DataFrame
+) -> StockChanges:
+    """The articles added, removed and changed between two stock dfs read from csv"""
+    common_ids = former_stock_df.index.intersection(stock_df.index)
+    former_common_df = former_stock_df.loc[common_ids].reindex(columns=stock_df.columns)
+    common_df = stock_df.loc[common_ids]
+
+    differences = (former_common_df != common_df) & ~(
+        former_common_df.isna() & common_df.isna()
+    )
+
+    return StockChanges(
+        added=stock_df.index.difference(former_stock_df.index, sort=False),
+        removed=former_stock_df.index.difference(stock_df.index, sort=False),
+        changed=common_ids[differences.any(axis="columns").to_numpy()],
+    )
+
+
+def merge_stock_dfs(
+    former_stock_df: pd.DataFrame, stock_df: pd.DataFrame
+) -> Tuple[pd.DataFrame, StockChanges]:
+    """Applies the changes of a new stock df to the former one, read from csv
+
+    The unchanged articles are kept as they are, in the same order, and the added
+    ones are appended at the end.
+    """
+    stock_df = get_stock_df_as_saved(stock_df=stock_df)
+    changes = get_stock_changes(former_stock_df=former_stock_df, stock_df=stock_df)
+
+    merged_stock_df = former_stock_df.drop(index=changes.removed)
+    merged_stock_df.loc[changes.changed] = stock_df.loc[
+        changes.changed, merged_stock_df.columns
+    ]
+    merged_stock_df = pd.concat([merged_stock_df, stock_df.loc[changes.added]])
+
+    return merged_stock_df, changes
+
+
+class StockDelta(NamedTuple):
+    changes: StockChanges
+    price_changed: pd.Index
+    amount_changed: pd.Index
+    new_products: pd.Index
+    # Products whose market extract may be outdated: new, or with added or repriced
+    # articles
+    changed_products: pd.Index
+
+    def get_summary(self) -> str:
+        return (
+            f"{len(self.new_products)} new products, "
+            f"{len(self.changes.added)} added articles, "
+            f"{len(self.changes.removed)} removed articles, "
+            f"{len(self.price_changed)} price changes, "
+            f"{len(self.amount_changed)} amount changes"
+        )
+
+
+def get_stock_delta(
+    former_stock_df: pd.DataFrame, stock_df: pd.DataFrame
+) -> StockDelta:
+    """The differences between the previous stock snapshot and a new one, read from csv"""
+    changes = get_stock_changes(former_stock_df=former_stock_df, stock_df=stock_df)
+    former_changed_df = former_stock_df.loc[changes.changed]
+    changed_df = stock_df.loc[changes.changed]
+
+    price_changed = changes.changed[
+        (former_changed_df["Price"] != changed_df["Price"]).to_numpy()
+    ]
+    amount_changed = changes.changed[
+        (former_changed_df["Amount"] != changed_df["Amount"]).to_numpy()
+    ]
+    new_products = pd.Index(stock_df["idProduct"].unique()).difference(
+        former_stock_df["idProduct"].unique()
+    )
+    changed_products = pd.Index(
+        stock_df.loc[changes.added.union(price_changed), "idProduct"].unique()
+    ).union(new_products)
+
+    return StockDelta(
+        changes=changes,
+        price_changed=price_changed,
+        amount_changed=amount_changed,
+        new_products=new_products,
+        changed_products=changed_products,
+    )
+
+
+def read_former_stock_df(file_path: Path) -> Optional[pd.DataFrame]:
+    """The previous stock snapshot, None without one"""
+    try:
+        return pd.read_csv(file_path, index_col="idArticle")
+    except FileNotFoundError:
+        return None
+
+
+def read_stock_delta(
+    stock_file_path: Path, previous_stock_file_path: Path
+) -> Optional[StockDelta]:
+    """The delta between the stock file and its previous snapshot, None without one"""
+    former_stock_df = read_former_stock_df(file_path=previous_stock_file_path)
+    if former_stock_df is None:
+        return None
+
+    return get_stock_delta(
+        former_stock_df=former_stock_df,
+        stock_df=pd.read_csv(stock_file_path, index_col="idArticle"),
+    )
@@ -1,6 +1,7 @@
 import base64
 import gzip
 import io
+import shutil
 from pathlib import Path
 
 import pandas as pd
@@ -18,6 +19,30 @@ def get_stock_file_path(folder_path: Path, csv: bool = False) -> Path:
         return folder_path / "stock.xlsx"
 
 
+def get_previous_stock_file_path(folder_path: Path) -> Path:
+    """Constructs the path of the snapshot of the stock the last complete getdata used"""
+    return folder_path / "stock.previous.csv"
+
+
+def save_previous_stock_file(folder_path: Path) -> Path:
+    """Keeps the current stock file as the snapshot the next changes are compared to"""
+    previous_stock_file_path = get_previous_stock_file_path(folder_path=folder_path)
+    shutil.copyfile(
+        get_stock_file_path(folder_path=folder_path, csv=True),
+        previous_stock_file_path,
+    )
+
+    return previous_stock_file_path
+
+
+def read_stock_file(file_path: Path) -> pd.DataFrame:
+    """Reads a stock file saved by getstock (csv) or by calculate (excel)"""
+    if file_path.suffix == ".csv":
+        return pd.read_csv(file_path, index_col="idArticle")
+
+    return pd.read_excel(io=file_path, engine=EXCEL_ENGINE, index_col="idArticle")
+
+
 def convert_base64_gzipped_string_to_dataframe(b64_zipped_string: str) -> pd.DataFrame:
     """Converts a base64 gzipped strings (or bytes) into a pandas dataframe"""
     decoded_string = base64.b64decode(b64_zipped_string)
@@ -0,0 +1,265 @@
+import atexit
+import base64
+import enum
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_PATH_ENV_VAR = "CARD_MARKET_CASSETTE_PATH"
+CASSETTE_MODE_ENV_VAR = "CARD_MARKET_CASSETTE_MODE"
+
+# The cassettes set by the env variables, shared by all the clients of the process
+_env_cassettes: Dict[Tuple[Path, "CassetteMode"], "Cassette"] = {}
+_env_cassettes_lock = threading.Lock()
+
+
+class CassetteMode(str, enum.Enum):
+    record = "record"
+    replay = "replay"
+
+
+class CassetteMissError(requests.RequestException):
+    """Error when replaying a request that is not in the cassette"""
+
+
+def get_request_key(request: requests.PreparedRequest) -> str:
+    """Identifies a request by its method, url and body, the signature is ignored"""
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+
+    return f"{request.method} {request.url} {hashlib.sha1(body).hexdigest()[:16]}"
+
+
+class Cassette:
+    """On-disk record of the calls of a run, to replay them later without network
+
+    The cassette is a gzipped file with one json line per call, written as soon as
+    the response is received by a single writer kept open for the whole session. The
+    streamed bodies are written by chunks as they are read, in lines following the
+    one of their call. When replayed, the identical requests get the recorded
+    responses in the order they were recorded, the last one being reused after that.
+    """
+
+    def __init__(self, path: Path, mode: CassetteMode) -> None:
+        self.path = Path(path)
+        self.mode = CassetteMode(mode)
+        self._interactions: Dict[str, Deque[dict]] = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._cassette_file = None
+        self._nb_streams = 0
+
+        if self.mode == CassetteMode.replay:
+            self._load()
+        elif self.path.exists():
+            logger.info(f"Appending to the existing cassette at {self.path}.")
+
+    def _load(self) -> None:
+        streamed_interactions = {}
+        with gzip.open(self.path, "rt", encoding="utf-8") as cassette_file:
+            try:
+                for line in cassette_file:
+                    self._load_line(
+                        line=line, streamed_interactions=streamed_interactions
+                    )
+            except (EOFError, ValueError):
+                # The cassette of an interrupted run lacks its end
+                logger.warning(f"Stopping at the truncated end of {self.path}.")
+
+        for interaction in streamed_interactions.values():
+            self._drop_partial_stream(interaction=interaction)
+
+        nb_interactions = sum(map(len, self._interactions.values()))
+        logger.info(f"Replaying {nb_interactions} call(s) from {self.path}.")
+
+    def _load_line(self, line: str, streamed_interactions: Dict[int, dict]) -> None:
+        interaction = json.loads(line)
+        if "chunk" in interaction:
+            streamed_interaction = streamed_interactions[interaction["stream_id"]]
+            streamed_interaction["chunks"].append(interaction["chunk"])
+        elif interaction.get("end"):
+            streamed_interaction = streamed_interactions[interaction["stream_id"]]
+            streamed_interaction["content"] = b"".join(
+                map(base64.b64decode, streamed_interaction.pop("chunks"))
+            )
+        else:
+            if "stream_id" in interaction:
+                # The stream ids start again in each recorded session
+                former_interaction = streamed_interactions.get(interaction["stream_id"])
+                if former_interaction is not None:
+                    self._drop_partial_stream(interaction=former_interaction)
+                interaction["chunks"] = []
+                streamed_interactions[interaction["stream_id"]] = interaction
+            else:
+                interaction["content"] = base64.b64decode(interaction["content"])
+            self._interactions[interaction["key"]].append(interaction)
+
+    def _drop_partial_stream(self, interaction: dict) -> None:
+        if "chunks" in interaction:
+            logger.warning(f"Skipping the partial stream of {interaction['key']}.")
+            self._interactions[interaction["key"]].remove(interaction)
+
+    def _write(self, entry: dict) -> None:
+        """Appends a line to the cassette, flushed so that it is kept on a crash"""
+        if self._cassette_file is None:
+            self._cassette_file = gzip.open(self.path, "ab")
+            atexit.register(self.close)
+        self._cassette_file.write((json.dumps(entry) + "\n").encode("utf-8"))
+        self._cassette_file.flush(zlib.Z_SYNC_FLUSH)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._cassette_file is not None:
+                self._cassette_file.close()
+                self._cassette_file = None
+
+    def _get_interaction(
+        self, request: requests.PreparedRequest, response: requests.Response
+    ) -> dict:
+        return {
+            "key": get_request_key(request=request),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": dict(response.headers),
+        }
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response):
+        interaction = self._get_interaction(request=request, response=response)
+        interaction["content"] = base64.b64encode(response.content).decode("ascii")
+
+        with self._lock:
+            self._write(interaction)
+
+    def record_stream(
+        self, request: requests.PreparedRequest, response: requests.Response
+    ) -> None:
+        """Records the body of a streamed response by chunks, as they are read"""
+        interaction = self._get_interaction(request=request, response=response)
+        with self._lock:
+            self._nb_streams += 1
+            stream_id = interaction["stream_id"] = self._nb_streams
+            self._write(interaction)
+
+        def record_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+            for chunk in chunks:
+                with self._lock:
+                    self._write(
+                        {
+                            "stream_id": stream_id,
+                            "chunk": base64.b64encode(chunk).decode("ascii"),
+                        }
+                    )
+                yield chunk
+
+            with self._lock:
+                self._write({"stream_id": stream_id, "end": True})
+
+        response.raw = RecordingStream(raw=response.raw, record_chunks=record_chunks)
+
+    def replay(self, request: requests.PreparedRequest) -> requests.Response:
+        request_key = get_request_key(request=request)
+
+        with self._lock:
+            interactions = self._interactions.get(request_key)
+            if not interactions:
+                raise CassetteMissError(
+                    f"No recorded response for {request_key}", request=request
+                )
+            interaction = (
+                interactions.popleft() if len(interactions) > 1 else interactions[0]
+            )
+
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction["reason"]
+        response.headers = CaseInsensitiveDict(interaction["headers"])
+        # The recorded content is already decoded
+        response.headers.pop("Content-Encoding", None)
+        response._content = interaction["content"]
+        # Streamed reads are served from the content, there is no raw connection
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+
+        return response
+
+    def install(self, session: requests.Session) -> None:
+        """Makes all the calls of the session go through the cassette"""
+        for prefix, adapter in list(session.adapters.items()):
+            session.mount(prefix, CassetteAdapter(cassette=self, adapter=adapter))
+
+
+class RecordingStream:
+    """Raw response whose streamed chunks are recorded as they are read"""
+
+    def __init__(
+        self, raw, record_chunks: Callable[[Iterator[bytes]], Iterator[bytes]]
+    ) -> None:
+        self.raw = raw
+        self.record_chunks = record_chunks
+
+    def stream(self, *args, **kwargs) -> Iterator[bytes]:
+        return self.record_chunks(self.raw.stream(*args, **kwargs))
+
+    def __getattr__(self, name: str):
+        return getattr(self.raw, name)
+
+
+class CassetteAdapter(BaseAdapter):
+    """Transport adapter recording the calls sent by another one, or replaying them"""
+
+    def __init__(self, cassette: Cassette, adapter: BaseAdapter) -> None:
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if self.cassette.mode == CassetteMode.replay:
+            return self.cassette.replay(request=request)
+
+        response = self.adapter.send(request, **kwargs)
+        if kwargs.get("stream"):
+            self.cassette.record_stream(request=request, response=response)
+        else:
+            self.cassette.record(request=request, response=response)
+
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+        self.cassette.close()
+
+
+def get_cassette_from_env() -> Optional[Cassette]:
+    """The cassette set by the env variables, if any
+
+    The clients of the process share the same cassette, so that their calls are
+    recorded by a single writer or replayed in the order they were recorded.
+    """
+    cassette_path = os.environ.get(CASSETTE_PATH_ENV_VAR)
+    if not cassette_path:
+        return None
+
+    cassette_key = (
+        Path(cassette_path).resolve(),
+        CassetteMode(os.environ.get(CASSETTE_MODE_ENV_VAR, CassetteMode.replay)),
+    )
+    with _env_cassettes_lock:
+        if cassette_key not in _env_cassettes:
+            _env_cassettes[cassette_key] = Cassette(*cassette_key)
+
+        return _env_cassettes[cassette_key]
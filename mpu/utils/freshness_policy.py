@@ -0,0 +1,62 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FreshnessPolicy:
+    """Decides whether a stored market extract is too old to be used
+
+    The max age of an extract depends on the price of the article it is used for:
+    `max_age_days_per_price` gives the max age in days from a minimum price, and the
+    tier of the highest minimum price under the article price is used. The extracts
+    of the articles under all the tiers, or without any tier, never expire.
+    """
+
+    def __init__(self, max_age_days_per_price: Optional[Dict[float, float]] = None):
+        # The tiers from the highest minimum price
+        self.max_age_tiers = sorted(
+            (
+                (float(min_price), timedelta(days=max_age_days))
+                for min_price, max_age_days in (max_age_days_per_price or {}).items()
+            ),
+            reverse=True,
+        )
+
+        self.nb_expired = 0
+        self._lock = threading.Lock()
+
+    def get_max_age(self, price: float) -> Optional[timedelta]:
+        """The max age of the extract of an article, None if it never expires"""
+        for min_price, max_age in self.max_age_tiers:
+            if price >= min_price:
+                return max_age
+
+        return None
+
+    def is_expired(self, fetched_at: datetime, price: float) -> bool:
+        max_age = self.get_max_age(price=price)
+        if max_age is None or datetime.now(timezone.utc) - fetched_at < max_age:
+            return False
+
+        with self._lock:
+            self.nb_expired += 1
+
+        return True
+
+    def log_summary(self) -> None:
+        if not self.max_age_tiers:
+            return
+
+        logger.info(f"{self.nb_expired} expired market extract(s) refreshed.")
+
+
+def get_freshness_policy_from_config(config: dict) -> FreshnessPolicy:
+    """Creates the freshness policy from the `market_extract` options of the config"""
+    market_extract_options = config.get("market_extract") or {}
+
+    return FreshnessPolicy(
+        max_age_days_per_price=market_extract_options.get("max_age_days_per_price")
+    )
@@ -0,0 +1,139 @@
+import json
+from typing import Any, Iterator, List, TextIO
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+WHITESPACES = " \t\n\r"
+
+
+class _JsonStreamReader:
+    """Text buffer over a json file, only keeping the part not parsed yet"""
+
+    def __init__(self, text_file: TextIO, chunk_size: int) -> None:
+        self.text_file = text_file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def read_more(self) -> bool:
+        """Appends a chunk to the buffer, returns False at the end of the file"""
+        if self.eof:
+            return False
+
+        chunk = self.text_file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def next_char(self) -> str:
+        """Returns the next char, without consuming it"""
+        while self.position >= len(self.buffer):
+            if not self.read_more():
+                raise ValueError("Unexpected end of the json stream")
+
+        return self.buffer[self.position]
+
+    def skip(self, chars: str) -> None:
+        while self.next_char() in chars:
+            self.position += 1
+
+
+def _find_array_of_key(reader: _JsonStreamReader, key: str) -> None:
+    """Moves the reader right after the '[' of `key` in the top level object"""
+    depth = 0
+    in_string = False
+    escaped = False
+    string_chars: List[str] = []
+    last_string = None
+
+    while True:
+        char = reader.next_char()
+        reader.position += 1
+
+        if in_string:
+            if escaped:
+                escaped = False
+                string_chars.append(char)
+            elif char == "\\":
+                escaped = True
+                string_chars.append(char)
+            elif char == '"':
+                in_string = False
+                last_string = "".join(string_chars)
+            else:
+                string_chars.append(char)
+            continue
+
+        if char == '"':
+            in_string = True
+            string_chars = []
+        elif char in "{[":
+            if depth == 1 and char == "[" and last_string == key:
+                return
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                raise KeyError(key)
+        elif char not in WHITESPACES and char != ":":
+            last_string = None
+
+
+def iter_json_array_items(
+    text_file: TextIO, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Any]:
+    """Yields one by one the items of the array `key` of the top level json object
+
+    Only the item being parsed and one chunk of the file are in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    reader = _JsonStreamReader(text_file=text_file, chunk_size=chunk_size)
+    _find_array_of_key(reader=reader, key=key)
+
+    while True:
+        reader.skip(WHITESPACES)
+        if reader.next_char() == "]":
+            return
+
+        while True:
+            try:
+                item, end_position = decoder.raw_decode(reader.buffer, reader.position)
+            except json.JSONDecodeError:
+                if not reader.read_more():
+                    raise
+                continue
+            # A number could be cut at the end of the buffer
+            if end_position == len(reader.buffer) and reader.read_more():
+                continue
+            break
+
+        reader.position = end_position
+        yield item
+
+        reader.skip(WHITESPACES)
+        if reader.next_char() == ",":
+            reader.position += 1
+
+
+def iter_json_array_batches(
+    text_file: TextIO,
+    key: str,
+    batch_size: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[List[Any]]:
+    """Yields the items of the array `key` of the top level json object by batches"""
+    batch = []
+    for item in iter_json_array_items(
+        text_file=text_file, key=key, chunk_size=chunk_size
+    ):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
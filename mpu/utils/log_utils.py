@@ -1,9 +1,11 @@
 from logging import config
+from pathlib import Path
 
 DATE_FMT = "%Y-%m-%dT%H-%M-%S"
+DEFAULT_LOG_FILE_PATH = Path("mpu.log")
 
 
-def set_log_conf() -> None:
+def set_log_conf(log_file_path: Path = DEFAULT_LOG_FILE_PATH) -> None:
     config.dictConfig(
         config={
             "version": 1,
@@ -12,8 +14,10 @@ def set_log_conf() -> None:
                     "class": "logging.handlers.RotatingFileHandler",
                     "level": "INFO",
                     "formatter": "default",
-                    "filename": "mpu.log",
+                    "filename": str(log_file_path),
                     "mode": "a",
+                    # Only created once something is logged
+                    "delay": True,
                     "maxBytes": 1048576,
                     "backupCount": 10,
                 },
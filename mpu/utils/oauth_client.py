@@ -1,15 +1,27 @@
 import logging
 import os
+import threading
+import time
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
 from pathlib import Path
-from typing import Optional
+from typing import Dict, NamedTuple, Optional
 
 import requests
 from authlib.integrations.requests_client import OAuth1Auth
 from dicttoxml import dicttoxml
 from furl import furl
+from requests.adapters import HTTPAdapter
+
+from mpu.utils.rate_limiter import RequestRateLimiter
+from mpu.utils.retry_policy import RetryPolicy
+from mpu.utils.timeout_policy import HedgingPolicy, TimeoutPolicy
+from mpu.utils.url_utils import get_url_endpoint
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_POOL_SIZE = 10
+
 
 def dict_to_request_xml(my_dict: dict, item_name: str) -> str:
     """Converts a dict to the xml for a request"""
@@ -22,26 +34,210 @@ def dict_to_request_xml(my_dict: dict, item_name: str) -> str:
     return xml.decode("utf-8")
 
 
-class OAuthAuthenticatedClient:
-    """Generic client to handle OAuth auth with fixed credentials from the env"""
+def create_pooled_session(
+    pool_size: int = DEFAULT_POOL_SIZE,
+    keep_alive: bool = True,
+    adapters: Optional[Dict[str, HTTPAdapter]] = None,
+) -> requests.Session:
+    """Creates a session reusing its connections, with pools of `pool_size` connections per host"""
+    session = requests.Session()
 
-    def __init__(self) -> None:
-        logger.info(f"Setting up an OAuth client...")
-        self.auth = OAuth1Auth(
+    default_adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+    for prefix, adapter in (adapters or {}).items():
+        session.mount(prefix, adapter)
+
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+
+    return session
+
+
+def _close_response(future: Future) -> None:
+    if future.exception() is None:
+        future.result().close()
+
+
+class OAuthCredentials(NamedTuple):
+    client_id: str
+    client_secret: str
+    token: str
+    token_secret: str
+
+    @classmethod
+    def from_env(cls) -> "OAuthCredentials":
+        return cls(
             client_id=os.environ["CLIENT_KEY"],
             client_secret=os.environ["CLIENT_SECRET"],
             token=os.environ["ACCESS_TOKEN"],
             token_secret=os.environ["ACCESS_SECRET"],
         )
+
+
+class OAuthAuthenticatedClient:
+    """Generic client to handle OAuth auth with fixed credentials from the env
+
+    All the calls go through a single pooled session, so the connections to the API
+    are kept alive and reused instead of being opened for each request.
+    They are also paced by the rate limiter, which is kept up to date with the
+    request limit headers of every response, and the transient failures are retried
+    according to the retry policy. Each call has the connect and read timeouts of its
+    endpoint, and the slow idempotent calls can be hedged by a second copy.
+
+    The client is thread-safe: each request is signed by its own OAuth auth, with
+    the realm of its url, so one instance can be shared by any number of threads.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        keep_alive: bool = True,
+        adapters: Optional[Dict[str, HTTPAdapter]] = None,
+        rate_limiter: Optional[RequestRateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        timeout_policy: Optional[TimeoutPolicy] = None,
+        hedging_policy: Optional[HedgingPolicy] = None,
+    ) -> None:
+        logger.info(f"Setting up an OAuth client...")
+        self.session = create_pooled_session(
+            pool_size=pool_size, keep_alive=keep_alive, adapters=adapters
+        )
+        self.rate_limiter = (
+            rate_limiter if rate_limiter is not None else RequestRateLimiter()
+        )
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.timeout_policy = (
+            timeout_policy if timeout_policy is not None else TimeoutPolicy()
+        )
+        self.hedging_policy = (
+            hedging_policy if hedging_policy is not None else HedgingPolicy()
+        )
+        self._hedging_executor = (
+            ThreadPoolExecutor(
+                max_workers=2 * pool_size, thread_name_prefix="mpu-hedging"
+            )
+            if self.hedging_policy.enabled
+            else None
+        )
+        self.credentials = OAuthCredentials.from_env()
+        # The calls sent by each thread, e.g. by the worker fetching a product
+        self._thread_calls = threading.local()
         logger.info(f"Client initialized.")
 
+    @property
+    def nb_thread_calls(self) -> int:
+        """The number of calls sent so far by the current thread, hedges included"""
+        return getattr(self._thread_calls, "nb_calls", 0)
+
+    def _count_thread_call(self) -> None:
+        self._thread_calls.nb_calls = self.nb_thread_calls + 1
+
+    def get_request_auth(self, url: furl) -> OAuth1Auth:
+        """Creates the auth signing a single request to `url`"""
+        url_to_modify = url.copy()
+
+        return OAuth1Auth(
+            client_id=self.credentials.client_id,
+            client_secret=self.credentials.client_secret,
+            token=self.credentials.token,
+            token_secret=self.credentials.token_secret,
+            realm=str(url_to_modify.remove(args=True, fragment=True)),
+        )
+
+    def _send(self, method: str, url: furl, **kwargs) -> requests.Response:
+        auth = self.get_request_auth(url=url)
+
+        attempt = 1
+        while True:
+            self.rate_limiter.acquire()
+            self._count_thread_call()
+            try:
+                response = self._request(method=method, url=url, auth=auth, **kwargs)
+            except requests.RequestException as error:
+                retry_delay = self.retry_policy.get_retry_delay(
+                    method=method, url=url, attempt=attempt, error=error
+                )
+                if retry_delay is None:
+                    raise
+                logger.warning(f"{method} request to {url} failed: {error.__repr__()}")
+            else:
+                self.rate_limiter.update_from_headers(headers=response.headers)
+                retry_delay = self.retry_policy.get_retry_delay(
+                    method=method, url=url, attempt=attempt, response=response
+                )
+                if retry_delay is None:
+                    return response
+                logger.warning(
+                    f"{response.status_code}: {method} request to {url} failed."
+                )
+
+            logger.warning(f"Retrying (attempt {attempt + 1}) in {retry_delay:.1f}s...")
+            time.sleep(retry_delay)
+            attempt += 1
+
+    def _timed_request(
+        self, method: str, url: furl, endpoint: str, **kwargs
+    ) -> requests.Response:
+        start_time = time.monotonic()
+        response = self.session.request(
+            method=method,
+            url=url,
+            timeout=self.timeout_policy.get_timeout(endpoint=endpoint),
+            **kwargs,
+        )
+        self.hedging_policy.record_latency(
+            endpoint=endpoint, latency=time.monotonic() - start_time
+        )
+
+        return response
+
+    def _request(self, method: str, url: furl, **kwargs) -> requests.Response:
+        endpoint = get_url_endpoint(url=url)
+        hedge_delay = self.hedging_policy.get_hedge_delay(
+            method=method, endpoint=endpoint
+        )
+        if hedge_delay is None:
+            return self._timed_request(
+                method=method, url=url, endpoint=endpoint, **kwargs
+            )
+
+        def _submit() -> Future:
+            return self._hedging_executor.submit(
+                self._timed_request, method=method, url=url, endpoint=endpoint, **kwargs
+            )
+
+        primary_future = _submit()
+        try:
+            return primary_future.result(timeout=hedge_delay)
+        except TimeoutError:
+            pass
+
+        # The copy is only sent if the rate budget allows it right now
+        if not self.rate_limiter.try_acquire():
+            return primary_future.result()
+
+        logger.info(f"Hedging the {method} request to {url} after {hedge_delay:.2f}s")
+        self._count_thread_call()
+        self.hedging_policy.record_hedge(endpoint=endpoint)
+        pending_futures = {primary_future, _submit()}
+        while True:
+            done_futures, pending_futures = wait(
+                pending_futures, return_when=FIRST_COMPLETED
+            )
+            for future in done_futures:
+                if future.exception() is None:
+                    for pending_future in pending_futures:
+                        pending_future.add_done_callback(_close_response)
+                    return future.result()
+
+            if not pending_futures:
+                return done_futures.pop().result()
+
     def get_api_call(
         self, url: furl, params: Optional[dict] = None
     ) -> requests.Response:
-        url_to_modify = url.copy()
-        self.auth.realm = url_to_modify.remove(args=True, fragment=True)
-
-        response = requests.get(url=url, params=params, auth=self.auth)
+        response = self._send(method="GET", url=url, params=params)
         try:
             response.raise_for_status()
         except requests.HTTPError as error:
@@ -53,12 +249,10 @@ class OAuthAuthenticatedClient:
         return response
 
     def post_api_call(self, url: furl, data: Optional[dict] = None) -> requests.Response:
-        url_to_modify = url.copy()
-        self.auth.realm = url_to_modify.remove(args=True, fragment=True)
         logger.info(f"Post request to {url}")
 
         # For POST requests, we don't need to send data as XML unless specified
-        response = requests.post(url=url, json=data if data else {}, auth=self.auth)
+        response = self._send(method="POST", url=url, json=data if data else {})
         try:
             response.raise_for_status()
         except requests.HTTPError as error:
@@ -70,14 +264,12 @@ class OAuthAuthenticatedClient:
         return response
 
     def put_api_call(self, data: dict, url: furl) -> requests.Response:
-        url_to_modify = url.copy()
-        self.auth.realm = url_to_modify.remove(args=True, fragment=True)
         logger.info(f"Put request to {url}")
 
-        response = requests.put(
+        response = self._send(
+            method="PUT",
             url=url,
             data=dict_to_request_xml(my_dict=data, item_name="article"),
-            auth=self.auth,
         )
         try:
             response.raise_for_status()
@@ -0,0 +1,247 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Mapping, Optional
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LIMIT_COUNT_HEADER = "x-request-limit-count"
+REQUEST_LIMIT_MAX_HEADER = "x-request-limit-max"
+# The Card Market daily request counter is reset at midnight, Berlin time
+LIMIT_RESET_TIMEZONE = ZoneInfo("Europe/Berlin")
+DEFAULT_LEDGER_FILE_NAME = "request_ledger.json"
+DEFAULT_BURST = 20
+DEFAULT_LEDGER_SAVE_EVERY = 50
+
+
+def get_limit_day() -> str:
+    """Returns the day of the current request limit window"""
+    return datetime.now(LIMIT_RESET_TIMEZONE).date().isoformat()
+
+
+def get_seconds_until_limit_reset() -> float:
+    """Returns the number of seconds until the daily request limit is reset"""
+    now = datetime.now(LIMIT_RESET_TIMEZONE)
+    next_reset = datetime.combine(
+        now.date() + timedelta(days=1), datetime.min.time(), tzinfo=LIMIT_RESET_TIMEZONE
+    )
+    return (next_reset - now).total_seconds()
+
+
+class RequestRateLimiter:
+    """Token bucket pacing the API calls according to the daily request budget
+
+    The budget is read from the `x-request-limit-*` headers of every response. The
+    refill rate is `max_requests_per_second` and, with `spread_budget_until_reset`,
+    at most the remaining requests spread until the daily reset. The daily usage is
+    persisted in a ledger file every `ledger_save_every` responses and on `flush`,
+    which is also how the workers of different processes share their view of the
+    budget: each one divides the pace by `share` and reloads the ledger when it
+    changes. The tokens, the request count and the ledger are updated under a lock,
+    so the threads sending the calls of a run share a single pace.
+    """
+
+    def __init__(
+        self,
+        ledger_path: Optional[Path] = None,
+        max_requests_per_second: Optional[float] = None,
+        spread_budget_until_reset: bool = False,
+        burst: int = DEFAULT_BURST,
+        share: int = 1,
+        ledger_save_every: int = DEFAULT_LEDGER_SAVE_EVERY,
+    ) -> None:
+        self.ledger_path = Path(ledger_path) if ledger_path is not None else None
+        self.max_requests_per_second = max_requests_per_second
+        self.spread_budget_until_reset = spread_budget_until_reset
+        self.burst = burst
+        self.share = max(share, 1)
+        self.ledger_save_every = max(ledger_save_every, 1)
+
+        self.day = get_limit_day()
+        self.limit_count = 0
+        self.limit_max: Optional[int] = None
+
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._ledger_mtime: Optional[float] = None
+        # The responses recorded since the ledger was last saved
+        self._nb_unsaved = 0
+        self._lock = threading.Lock()
+
+        with self._lock:
+            self._load_ledger()
+
+        if self.limit_max is not None:
+            logger.info(
+                f"Request budget for {self.day}: {self.limit_count}/{self.limit_max} used."
+            )
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> Optional[int]:
+        if self.limit_max is None:
+            return None
+
+        return max(self.limit_max - self.limit_count, 0)
+
+    def get_rate(self) -> Optional[float]:
+        """Returns the number of requests per second allowed, None meaning no limit"""
+        rates = []
+        if self.max_requests_per_second is not None:
+            rates.append(self.max_requests_per_second)
+
+        remaining = self.remaining
+        # With no budget left, the call goes through and the API refuses it
+        if self.spread_budget_until_reset and remaining:
+            rates.append(remaining / get_seconds_until_limit_reset())
+
+        if not rates:
+            return None
+
+        return min(rates) / self.share
+
+    def acquire(self) -> None:
+        """Blocks until a request can be sent"""
+        while True:
+            wait_time = self._take_token()
+            if wait_time is None:
+                return
+
+            time.sleep(wait_time)
+
+    def try_acquire(self) -> bool:
+        """Takes the right to send a request only if it is available right now"""
+        return self._take_token() is None
+
+    def _take_token(self) -> Optional[float]:
+        """Takes a token if there is one, otherwise returns the time to wait for it"""
+        with self._lock:
+            self._reset_if_new_day()
+            self._load_ledger()
+
+            rate = self.get_rate()
+            now = time.monotonic()
+            if rate is None:
+                self._last_refill = now
+                return None
+
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last_refill) * rate
+            )
+            self._last_refill = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+
+            return (1 - self._tokens) / rate
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Records a response, using the limit headers when the API sent them"""
+        limit_count = headers.get(REQUEST_LIMIT_COUNT_HEADER)
+        limit_max = headers.get(REQUEST_LIMIT_MAX_HEADER)
+
+        with self._lock:
+            self._reset_if_new_day()
+
+            if limit_count is not None:
+                self.limit_count = max(self.limit_count, int(limit_count))
+            else:
+                self.limit_count += 1
+            if limit_max is not None:
+                self.limit_max = int(limit_max)
+
+            self._nb_unsaved += 1
+            if self._nb_unsaved >= self.ledger_save_every:
+                self._save_ledger()
+
+    def flush(self) -> None:
+        """Saves the responses recorded since the last save of the ledger"""
+        with self._lock:
+            if self._nb_unsaved:
+                self._save_ledger()
+
+    def _reset_if_new_day(self) -> None:
+        day = get_limit_day()
+        if day != self.day:
+            logger.info(f"New request limit day {day}, resetting the request count.")
+            self.day = day
+            self.limit_count = 0
+
+    def _load_ledger(self) -> None:
+        if self.ledger_path is None:
+            return
+
+        try:
+            ledger_mtime = self.ledger_path.stat().st_mtime
+        except FileNotFoundError:
+            return
+
+        if ledger_mtime == self._ledger_mtime:
+            return
+
+        try:
+            ledger = json.loads(self.ledger_path.read_text())
+        except ValueError:
+            logger.warning(f"Could not read the request ledger at {self.ledger_path}.")
+            return
+
+        self._ledger_mtime = ledger_mtime
+        if ledger.get("day") != self.day:
+            return
+
+        self.limit_count = max(self.limit_count, ledger.get("count", 0))
+        if self.limit_max is None:
+            self.limit_max = ledger.get("max")
+
+    def _save_ledger(self) -> None:
+        if self.ledger_path is None:
+            return
+
+        tmp_ledger_path = self.ledger_path.with_name(
+            f"{self.ledger_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        tmp_ledger_path.write_text(
+            json.dumps(
+                {"day": self.day, "count": self.limit_count, "max": self.limit_max}
+            )
+        )
+        os.replace(tmp_ledger_path, self.ledger_path)
+        self._ledger_mtime = self.ledger_path.stat().st_mtime
+        self._nb_unsaved = 0
+
+
+def get_rate_limiter_from_config(
+    config: dict, folder_path: Path, share: int = 1
+) -> RequestRateLimiter:
+    """Creates the rate limiter from the `rate_limit` options of the config, a
+    relative `ledger_path` being in `folder_path`
+    """
+    rate_limit_options = config.get("rate_limit") or {}
+
+    return RequestRateLimiter(
+        ledger_path=folder_path
+        / rate_limit_options.get("ledger_path", DEFAULT_LEDGER_FILE_NAME),
+        max_requests_per_second=rate_limit_options.get("max_requests_per_second"),
+        spread_budget_until_reset=rate_limit_options.get(
+            "spread_budget_until_reset", False
+        ),
+        burst=rate_limit_options.get("burst", DEFAULT_BURST),
+        share=share,
+        ledger_save_every=rate_limit_options.get(
+            "ledger_save_every", DEFAULT_LEDGER_SAVE_EVERY
+        ),
+    )
@@ -0,0 +1,164 @@
+import logging
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, Optional
+
+import requests
+
+from mpu.utils.rate_limiter import (REQUEST_LIMIT_COUNT_HEADER,
+                                    REQUEST_LIMIT_MAX_HEADER)
+from mpu.utils.url_utils import get_url_endpoint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF_FACTOR = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Creating an export is not idempotent, so POST calls are not retried by default
+RETRY_METHODS = ("GET", "PUT")
+
+
+def is_request_limit_exceeded(response: requests.Response) -> bool:
+    """Whether the response refuses the call because the daily limit is reached"""
+    limit_count = response.headers.get(REQUEST_LIMIT_COUNT_HEADER)
+    limit_max = response.headers.get(REQUEST_LIMIT_MAX_HEADER)
+    if limit_count is None or limit_max is None:
+        return False
+
+    return response.status_code == 429 and int(limit_count) >= int(limit_max)
+
+
+def get_retry_after(response: requests.Response) -> Optional[float]:
+    """Reads the Retry-After header, given either in seconds or as a date"""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+    return max((retry_date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+    """Decides if and when a failed call is retried
+
+    The transient failures (connection errors, timeouts, 429 and 5xx responses) are
+    retried with an exponential backoff and full jitter, or after the Retry-After
+    delay when the API sends one. A call refused because the daily request limit is
+    reached is never retried. The retries are counted per endpoint, which is the
+    first key of `max_attempts_per_endpoint` found in the url path or else the one
+    given by `get_url_endpoint`.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        max_attempts_per_endpoint: Optional[Dict[str, int]] = None,
+        retry_statuses: Iterable[int] = RETRY_STATUSES,
+        retry_methods: Iterable[str] = RETRY_METHODS,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_attempts_per_endpoint = max_attempts_per_endpoint or {}
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_methods = frozenset(method.upper() for method in retry_methods)
+
+        self.retries_per_endpoint = Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def total_retries(self) -> int:
+        return sum(self.retries_per_endpoint.values())
+
+    def get_endpoint(self, url: str) -> str:
+        path = requests.utils.urlparse(str(url)).path
+        for endpoint in self.max_attempts_per_endpoint:
+            if f"/{endpoint.strip('/')}" in path:
+                return endpoint
+
+        return get_url_endpoint(url=url)
+
+    def get_max_attempts(self, endpoint: str) -> int:
+        return self.max_attempts_per_endpoint.get(endpoint, self.max_attempts)
+
+    def get_backoff(self, attempt: int) -> float:
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff_factor * 2 ** (attempt - 1))
+        )
+
+    def get_retry_delay(
+        self,
+        method: str,
+        url: str,
+        attempt: int,
+        response: Optional[requests.Response] = None,
+        error: Optional[requests.RequestException] = None,
+    ) -> Optional[float]:
+        """Returns how long to wait before retrying the call, None if it shouldn't be"""
+        if method.upper() not in self.retry_methods:
+            return None
+
+        if response is not None:
+            if response.status_code not in self.retry_statuses:
+                return None
+            if is_request_limit_exceeded(response=response):
+                return None
+        elif not isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return None
+
+        endpoint = self.get_endpoint(url=url)
+        if attempt >= self.get_max_attempts(endpoint=endpoint):
+            return None
+
+        retry_after = get_retry_after(response) if response is not None else None
+        delay = retry_after if retry_after is not None else self.get_backoff(attempt)
+
+        with self._lock:
+            self.retries_per_endpoint[endpoint] += 1
+
+        return delay
+
+    def log_summary(self) -> None:
+        if not self.total_retries:
+            logger.info("No call was retried.")
+            return
+
+        logger.info(
+            f"{self.total_retries} call(s) retried: {dict(self.retries_per_endpoint)}"
+        )
+
+
+def get_retry_policy_from_config(config: dict) -> RetryPolicy:
+    """Creates the retry policy from the `retry` options of the config"""
+    retry_options = config.get("retry") or {}
+
+    return RetryPolicy(
+        max_attempts=retry_options.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+        backoff_factor=retry_options.get("backoff_factor", DEFAULT_BACKOFF_FACTOR),
+        max_backoff=retry_options.get("max_backoff", DEFAULT_MAX_BACKOFF),
+        max_attempts_per_endpoint=retry_options.get("max_attempts_per_endpoint"),
+    )
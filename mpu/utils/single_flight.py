@@ -0,0 +1,42 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator, Set
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Only lets one call at a time per key, the concurrent calls of a key waiting
+
+    It also remembers the keys whose call already succeeded during the run, so that
+    the waiting calls can reuse its result instead of doing the same work again.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self.done_keys: Set[Hashable] = set()
+        self.nb_waits = 0
+
+    @contextmanager
+    def acquire(self, key: Hashable) -> Iterator[bool]:
+        """Holds the lock of `key`, yields whether a call of `key` already succeeded"""
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        if not key_lock.acquire(blocking=False):
+            with self._lock:
+                self.nb_waits += 1
+            key_lock.acquire()
+
+        try:
+            yield key in self.done_keys
+            with self._lock:
+                self.done_keys.add(key)
+        finally:
+            key_lock.release()
+
+    def log_summary(self) -> None:
+        if self.nb_waits:
+            logger.info(f"{self.nb_waits} call(s) waited for the same product.")
@@ -0,0 +1,120 @@
+import logging
+import math
+import threading
+from collections import Counter, deque
+from typing import Deque, Dict, Iterable, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_HEDGING_QUANTILE = 0.95
+DEFAULT_HEDGING_MIN_SAMPLES = 20
+LATENCY_WINDOW = 500
+
+
+class RequestTimeout(NamedTuple):
+    connect: float
+    read: float
+
+
+class TimeoutPolicy:
+    """Connect and read timeouts of the calls, with overrides per endpoint"""
+
+    def __init__(
+        self,
+        connect: float = DEFAULT_CONNECT_TIMEOUT,
+        read: float = DEFAULT_READ_TIMEOUT,
+        timeouts_per_endpoint: Optional[Dict[str, dict]] = None,
+    ) -> None:
+        self.default_timeout = RequestTimeout(connect=connect, read=read)
+        self.timeouts_per_endpoint = {
+            endpoint: self.default_timeout._replace(**endpoint_timeouts)
+            for endpoint, endpoint_timeouts in (timeouts_per_endpoint or {}).items()
+        }
+
+    def get_timeout(self, endpoint: str) -> RequestTimeout:
+        return self.timeouts_per_endpoint.get(endpoint, self.default_timeout)
+
+
+class HedgingPolicy:
+    """Decides when a second copy of a slow idempotent call is sent
+
+    The latencies of the recent calls are kept per endpoint, and a call to one of
+    the hedged `endpoints` still running after the `quantile` of those latencies gets
+    a second copy, the first answer being used. No call is hedged before
+    `min_samples` latencies are known for its endpoint.
+    """
+
+    def __init__(
+        self,
+        endpoints: Iterable[str] = (),
+        quantile: float = DEFAULT_HEDGING_QUANTILE,
+        min_samples: int = DEFAULT_HEDGING_MIN_SAMPLES,
+    ) -> None:
+        self.endpoints = frozenset(endpoints)
+        self.quantile = quantile
+        self.min_samples = min_samples
+
+        self.hedges_per_endpoint = Counter()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.endpoints)
+
+    def record_latency(self, endpoint: str, latency: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(
+                endpoint, deque(maxlen=LATENCY_WINDOW)
+            ).append(latency)
+
+    def record_hedge(self, endpoint: str) -> None:
+        with self._lock:
+            self.hedges_per_endpoint[endpoint] += 1
+
+    def get_hedge_delay(self, method: str, endpoint: str) -> Optional[float]:
+        """Returns after how long the call should be hedged, None if it shouldn't be"""
+        if method.upper() != "GET" or endpoint not in self.endpoints:
+            return None
+
+        with self._lock:
+            latencies = sorted(self._latencies.get(endpoint, ()))
+
+        if len(latencies) < self.min_samples:
+            return None
+
+        quantile_index = math.ceil(self.quantile * len(latencies)) - 1
+        return latencies[min(max(quantile_index, 0), len(latencies) - 1)]
+
+    def log_summary(self) -> None:
+        if not self.enabled:
+            return
+
+        logger.info(
+            f"{sum(self.hedges_per_endpoint.values())} call(s) hedged: "
+            f"{dict(self.hedges_per_endpoint)}"
+        )
+
+
+def get_timeout_policy_from_config(config: dict) -> TimeoutPolicy:
+    """Creates the timeout policy from the `timeouts` options of the config"""
+    timeouts_options = config.get("timeouts") or {}
+
+    return TimeoutPolicy(
+        connect=timeouts_options.get("connect", DEFAULT_CONNECT_TIMEOUT),
+        read=timeouts_options.get("read", DEFAULT_READ_TIMEOUT),
+        timeouts_per_endpoint=timeouts_options.get("per_endpoint"),
+    )
+
+
+def get_hedging_policy_from_config(config: dict) -> HedgingPolicy:
+    """Creates the hedging policy from the `hedging` options of the config"""
+    hedging_options = config.get("hedging") or {}
+
+    return HedgingPolicy(
+        endpoints=hedging_options.get("endpoints", ()),
+        quantile=hedging_options.get("quantile", DEFAULT_HEDGING_QUANTILE),
+        min_samples=hedging_options.get("min_samples", DEFAULT_HEDGING_MIN_SAMPLES),
+    )
@@ -0,0 +1,16 @@
+import requests
+
+
+def get_url_endpoint(url) -> str:
+    """Returns the API endpoint of an url, e.g. "articles" for .../output.json/articles/123
+
+    The endpoint is made of the path segments after the output format, without the ids.
+    """
+    path = requests.utils.urlparse(str(url)).path
+    segments = [segment for segment in path.split("/") if segment]
+
+    format_indexes = [i for i, segment in enumerate(segments) if "." in segment]
+    if format_indexes:
+        segments = segments[format_indexes[-1] + 1 :]
+
+    return "/".join(segment for segment in segments if not segment.isdigit())
@@ -3,6 +3,34 @@ import os
 import pandas as pd
 import pytest
 
+from mpu.fake_api_server import INSECURE_TRANSPORT_ENV_VAR
+from mpu.utils.log_utils import set_log_conf
+
+
+@pytest.fixture(autouse=True)
+def mock_settings_env_vars(mocker):
+    mocker.patch.dict(
+        os.environ,
+        {
+            "CLIENT_KEY": "my-client-key",
+            "CLIENT_SECRET": "my-client-secret",
+            "ACCESS_TOKEN": "my-access-token",
+            "ACCESS_SECRET": "my-access-secret",
+        },
+    )
+
+
+@pytest.fixture
+def insecure_transport(monkeypatch):
+    # The calls to the local fake API are signed over http
+    monkeypatch.setenv(INSECURE_TRANSPORT_ENV_VAR, "1")
+
+
+@pytest.fixture(autouse=True, scope="session")
+def log_to_tmp_path(tmp_path_factory):
+    # The logs of the tests are not written in the checkout
+    set_log_conf(log_file_path=tmp_path_factory.mktemp("logs") / "mpu.log")
+
 
 @pytest.fixture
 def test_stock_df():
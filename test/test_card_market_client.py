@@ -0,0 +1,46 @@
+import pandas as pd
+
+from mpu.card_market_client import STOCK_FILE_COLUMNS, CardMarketClient
+
+
+def test_normalize_article_data(test_folder_cdir_path):
+    client = CardMarketClient()
+    articles = [
+        {
+            "idArticle": 1,
+            "idProduct": 10,
+            "product": {"enName": "Opt", "locName": "Choc", "abbreviation": "DOM"},
+            "price": 1.5,
+            "language": {"idLanguage": 2},
+            "condition": "NM",
+            "isFoil": True,
+            "isSigned": False,
+            "comments": "",
+            "count": 2,
+            "onSale": True,
+        },
+        # Articles with missing or flat values are normalized one key at a time
+        {"idArticle": 2, "idProduct": 11, "language": 1, "isFoil": "False"},
+    ]
+
+    stock_df = client._normalize_article_data(articles)
+
+    assert stock_df.index.tolist() == [1, 2]
+    assert stock_df.columns.tolist() == STOCK_FILE_COLUMNS[1:]
+    assert stock_df["English Name"].tolist() == ["Opt", ""]
+    assert stock_df["Exp."].tolist() == ["DOM", ""]
+    assert stock_df["Language"].tolist() == [2, 1]
+    assert stock_df["Foil?"].tolist() == ["X", ""]
+    assert stock_df["Signed?"].tolist() == ["", ""]
+    assert stock_df["Amount"].tolist() == [2, ""]
+
+    # The usual articles get typed columns
+    typed_stock_df = client._normalize_article_data(articles[:1])
+    pd.testing.assert_frame_equal(typed_stock_df, stock_df.iloc[:1], check_dtype=False)
+    assert typed_stock_df.index.dtype == "int64"
+    assert typed_stock_df.dtypes[["Price", "Language", "onSale"]].tolist() == [
+        "float64",
+        "int64",
+        "bool",
+    ]
+    assert client._normalize_article_data([]).empty
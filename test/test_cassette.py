@@ -0,0 +1,115 @@
+import gzip
+import json
+import os
+import zlib
+
+import pytest
+import requests
+
+from mpu.card_market_client import CardMarketClient
+from mpu.fake_api_server import FakeApiConfig, start_fake_api_server
+from mpu.utils.cassette import (CASSETTE_MODE_ENV_VAR, CASSETTE_PATH_ENV_VAR,
+                                Cassette, CassetteMissError, CassetteMode,
+                                get_cassette_from_env, get_request_key)
+
+
+def get_client_calls(client: CardMarketClient) -> list:
+    stock_df = client.get_stock_df()
+    product_id = int(stock_df["idProduct"].iloc[0])
+
+    return [
+        stock_df,
+        client.get_product_articles(product_id=product_id, min_condition="EX"),
+        client.get_product_info(product_id=product_id),
+    ]
+
+
+def test_cassette_record_and_replay(test_folder_cdir_path, insecure_transport):
+    cassette_path = test_folder_cdir_path / "run.cassette.gz"
+
+    server = start_fake_api_server(config=FakeApiConfig(stock_size=20, export_delay=0))
+    cassette = Cassette(path=cassette_path, mode=CassetteMode.record)
+    try:
+        recorded = get_client_calls(
+            client=CardMarketClient(api_url=server.api_url, cassette=cassette)
+        )
+    finally:
+        cassette.close()
+        server.shutdown()
+        server.server_close()
+
+    # A single gzip member, the streamed stock file following its call by chunks
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    lines = decompressor.decompress(cassette_path.read_bytes()).splitlines()
+    assert not decompressor.unused_data
+    entries = [json.loads(line) for line in lines]
+    stream_entries = [entry for entry in entries if "stream_id" in entry]
+    assert "key" in stream_entries[0]
+    assert "chunk" in stream_entries[1]
+    assert stream_entries[-1] == {"stream_id": 1, "end": True}
+
+    replay_client = CardMarketClient(
+        api_url=server.api_url,
+        cassette=Cassette(path=cassette_path, mode=CassetteMode.replay),
+    )
+    replayed = get_client_calls(client=replay_client)
+
+    assert replayed[0].equals(recorded[0])
+    assert replayed[1:] == recorded[1:]
+    assert replay_client.rate_limiter.ledger_path is None
+
+    with pytest.raises(CassetteMissError):
+        replay_client.get_product_info(product_id=1)
+
+
+def test_cassette_replay_of_an_interrupted_record(test_folder_cdir_path):
+    cassette_path = test_folder_cdir_path / "run.cassette.gz"
+    request_a, request_b = (
+        requests.Request("GET", f"http://localhost/{name}").prepare()
+        for name in ("a", "b")
+    )
+    response = {"status": 200, "reason": "OK", "headers": {}}
+    lines = [
+        {"key": get_request_key(request_a), **response, "content": "YQ=="},
+        {"key": get_request_key(request_b), **response, "stream_id": 1},
+        {"stream_id": 1, "chunk": "YQ=="},
+    ]
+    with gzip.open(cassette_path, "wt") as cassette_file:
+        cassette_file.writelines(json.dumps(line) + "\n" for line in lines)
+    # Without the end of the gzip stream
+    cassette_path.write_bytes(cassette_path.read_bytes()[:-8])
+
+    cassette = Cassette(path=cassette_path, mode=CassetteMode.replay)
+
+    assert cassette.replay(request=request_a).content == b"a"
+    # The partial stream is not replayed
+    with pytest.raises(CassetteMissError):
+        cassette.replay(request=request_b)
+
+
+def test_cassette_shared_by_the_clients(test_folder_cdir_path, insecure_transport):
+    os.environ[CASSETTE_PATH_ENV_VAR] = str(test_folder_cdir_path / "run.cassette.gz")
+    os.environ[CASSETTE_MODE_ENV_VAR] = CassetteMode.record.value
+
+    def get_calls(api_url: str) -> list:
+        # As getstock then getdata, each with its own client
+        stock_df = CardMarketClient(api_url=api_url).get_stock_df()
+        product_id = int(stock_df["idProduct"].iloc[0])
+        return [
+            stock_df,
+            CardMarketClient(api_url=api_url).get_product_info(product_id=product_id),
+        ]
+
+    server = start_fake_api_server(config=FakeApiConfig(stock_size=20, export_delay=0))
+    try:
+        recorded = get_calls(api_url=server.api_url)
+    finally:
+        get_cassette_from_env().close()
+        server.shutdown()
+        server.server_close()
+
+    os.environ[CASSETTE_MODE_ENV_VAR] = CassetteMode.replay.value
+    replayed = get_calls(api_url=server.api_url)
+
+    assert replayed[0].equals(recorded[0])
+    assert replayed[1] == recorded[1]
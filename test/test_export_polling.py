@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from mpu.card_market_client import CardMarketClient
+from mpu.export_polling import (FAST_POLL_INTERVAL, POLL_INTERVAL,
+                                ExportHistory, get_poll_delay)
+from mpu.fake_api_server import FakeApiConfig, start_fake_api_server
+
+
+def test_export_history(test_folder_cdir_path):
+    history_path = test_folder_cdir_path / "export_history.json"
+    export_history = ExportHistory(history_path=history_path, max_entries=3)
+    assert export_history.get_expected_duration() is None
+
+    for export_id, (stock_size, duration) in enumerate(
+        [(1000, 900), (1000, 100), (2000, 200), (3000, 300)]
+    ):
+        export_history.record(
+            export_id=export_id, stock_size=stock_size, duration=duration
+        )
+
+    export_history = ExportHistory(history_path=history_path, max_entries=3)
+    assert len(export_history.entries) == 3
+    assert export_history.get_expected_duration() == pytest.approx(300)
+
+
+def test_get_poll_delay():
+    assert get_poll_delay(elapsed=10, expected_duration=None) == POLL_INTERVAL
+    assert get_poll_delay(elapsed=0, expected_duration=600) == pytest.approx(540)
+    assert get_poll_delay(elapsed=540, expected_duration=600) == pytest.approx(54)
+    assert get_poll_delay(elapsed=598, expected_duration=600) == FAST_POLL_INTERVAL
+    assert get_poll_delay(elapsed=640, expected_duration=600) == pytest.approx(10)
+    assert get_poll_delay(elapsed=6000, expected_duration=600) == POLL_INTERVAL
+
+
+def test_client_waits_for_the_expected_export_duration(
+    test_folder_cdir_path, insecure_transport, mocker
+):
+    export_history = ExportHistory(history_path=test_folder_cdir_path / "history.json")
+    export_history.record(export_id=0, stock_size=20, duration=0.5)
+
+    sleep = time.sleep
+    poll_delays = []
+
+    def record_poll_delay(delay):
+        poll_delays.append(delay)
+        sleep(0.3)
+
+    server = start_fake_api_server(
+        config=FakeApiConfig(stock_size=20, export_delay=0.5)
+    )
+    try:
+        client = CardMarketClient(api_url=server.api_url, export_history=export_history)
+        mocker.patch("mpu.card_market_client.time.sleep", side_effect=record_poll_delay)
+        stock_df = client.get_stock_df()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(stock_df) == 20
+    assert poll_delays and poll_delays[0] <= FAST_POLL_INTERVAL
+    assert len(export_history.entries) == 2
+    assert export_history.entries[-1]["stock_size"] == 20
@@ -0,0 +1,344 @@
+import json
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+import pytest
+
+from mpu.extract_codec import (decode_market_extract, encode_market_extract,
+                               prune_market_extract)
+from mpu.extract_store import (DirectoryExtractStore, PreloadedExtractStore,
+                               SqliteExtractStore, StoredExtract,
+                               get_config_fingerprint,
+                               get_extract_store_from_config)
+from mpu.market_extract import (NEXT_STARTS_KEY,
+                                get_single_product_market_extract,
+                                iter_extended_market_extracts)
+from mpu.utils.freshness_policy import (FreshnessPolicy,
+                                        get_freshness_policy_from_config)
+from mpu.utils.single_flight import SingleFlight
+
+MARKET_EXTRACT = {
+    "articles": [{"idArticle": 1, "price": 1.5, "language": {"idLanguage": 1}}],
+    "info": {"idProduct": 16416},
+}
+
+
+@pytest.fixture(params=["directory", "sqlite"])
+def extract_store(request, tmp_path):
+    if request.param == "directory":
+        store = DirectoryExtractStore(market_extract_path=tmp_path)
+    else:
+        store = SqliteExtractStore(
+            db_path=tmp_path / "market_extract.sqlite", config_fingerprint="abc"
+        )
+    yield store
+    store.close()
+
+
+def test_extract_store(extract_store):
+    assert extract_store.get(product_id=16416) is None
+
+    saved_at = datetime.now(timezone.utc)
+    extract_store.save(product_id=16416, market_extract=MARKET_EXTRACT)
+    extract_store.save(product_id=16196, market_extract={"articles": [], "info": {}})
+
+    stored_extract = extract_store.get(product_id=16416)
+    assert stored_extract.market_extract == MARKET_EXTRACT
+    assert abs(stored_extract.fetched_at - saved_at) < timedelta(seconds=5)
+    stored_extracts = extract_store.get_many(product_ids=[16416, 16194, 16196])
+    assert {
+        product_id: stored_extract.market_extract
+        for product_id, stored_extract in stored_extracts.items()
+    } == {16416: MARKET_EXTRACT, 16196: {"articles": [], "info": {}}}
+    fetched_at_per_product = extract_store.get_fetched_at_many(
+        product_ids=[16416, 16194, 16196]
+    )
+    assert fetched_at_per_product.keys() == {16416, 16196}
+    assert abs(fetched_at_per_product[16416] - saved_at) < timedelta(seconds=5)
+
+
+def test_sqlite_extract_store_config_fingerprint(tmp_path):
+    db_path = tmp_path / "market_extract.sqlite"
+    extract_store = SqliteExtractStore(db_path=db_path, config_fingerprint="abc")
+    extract_store.save(product_id=16416, market_extract=MARKET_EXTRACT)
+    extract_store.close()
+
+    # Extracts fetched with other request options are fetched again
+    extract_store = SqliteExtractStore(db_path=db_path, config_fingerprint="def")
+    assert extract_store.get(product_id=16416) is None
+    assert extract_store.get_many(product_ids=[16416]) == {}
+    extract_store.close()
+
+    assert get_config_fingerprint({"min_condition": "EX", "languages": ["CARD"]}) == (
+        get_config_fingerprint({"languages": ["CARD"], "min_condition": "EX"})
+    )
+
+
+def test_get_extract_store_from_config(tmp_path):
+    extract_store = get_extract_store_from_config(
+        config={}, market_extract_parent_path=tmp_path
+    )
+    assert isinstance(extract_store, DirectoryExtractStore)
+    assert (tmp_path / "market_extract").is_dir()
+
+    extract_store = get_extract_store_from_config(
+        config={"market_extract": {"backend": "sqlite"}, "request_options": {}},
+        market_extract_parent_path=tmp_path,
+    )
+    assert isinstance(extract_store, SqliteExtractStore)
+    assert extract_store.db_path == tmp_path / "market_extract.sqlite"
+    extract_store.close()
+
+    with pytest.raises(ValueError):
+        get_extract_store_from_config(
+            config={"market_extract": {"backend": "s3"}},
+            market_extract_parent_path=tmp_path,
+        )
+
+
+def test_get_single_product_market_extract(extract_store, mocker):
+    client = mocker.Mock()
+    client.get_product_articles.return_value = MARKET_EXTRACT["articles"]
+    client.get_product_info.return_value = MARKET_EXTRACT["info"]
+    config = {"min_condition": "EX", "default_max_results": 100}
+    stock_info = {"idProduct": 16416, "Foil?": ""}
+    extract_store = PreloadedExtractStore(
+        extract_store=extract_store, product_ids=[16416]
+    )
+
+    for _ in range(2):
+        market_extract = get_single_product_market_extract(
+            stock_info=stock_info,
+            extract_store=extract_store,
+            card_market_client=client,
+            config=config,
+        )
+        assert market_extract == MARKET_EXTRACT
+
+    # The second extract comes from the store
+    assert client.get_product_info.call_count == 1
+    assert (
+        extract_store.extract_store.get(product_id=16416).market_extract
+        == MARKET_EXTRACT
+    )
+
+
+def test_foil_articles_keep_the_extract_age(extract_store, mocker):
+    client = mocker.Mock()
+    client.get_product_articles.return_value = [{"idArticle": 2, "price": 3.0}]
+    fetched_at = datetime.now(timezone.utc) - timedelta(days=10)
+    extract_store.save(
+        product_id=16416, market_extract=MARKET_EXTRACT, fetched_at=fetched_at
+    )
+
+    market_extract = get_single_product_market_extract(
+        stock_info={"idProduct": 16416, "Foil?": "X", "Price": 1.0},
+        extract_store=extract_store,
+        card_market_client=client,
+        config={"min_condition": "EX", "default_max_results": 100},
+    )
+
+    # The foil articles are added without resetting the age of the others
+    assert market_extract["articles_foil"] == [{"idArticle": 2, "price": 3.0}]
+    stored_extract = extract_store.get(product_id=16416)
+    assert stored_extract.market_extract == market_extract
+    assert abs(stored_extract.fetched_at - fetched_at) < timedelta(seconds=1)
+    assert FreshnessPolicy(max_age_days_per_price={0: 7}).is_expired(
+        fetched_at=stored_extract.fetched_at, price=1.0
+    )
+
+
+def test_freshness_policy():
+    freshness_policy = get_freshness_policy_from_config(
+        config={"market_extract": {"max_age_days_per_price": {20: 1, 0.3: 7, 0: 14}}}
+    )
+    assert freshness_policy.get_max_age(price=25) == timedelta(days=1)
+    assert freshness_policy.get_max_age(price=20) == timedelta(days=1)
+    assert freshness_policy.get_max_age(price=5) == timedelta(days=7)
+    assert freshness_policy.get_max_age(price=0.2) == timedelta(days=14)
+
+    fetched_at = datetime.now(timezone.utc) - timedelta(days=3)
+    assert freshness_policy.is_expired(fetched_at=fetched_at, price=25)
+    assert not freshness_policy.is_expired(fetched_at=fetched_at, price=0.2)
+    assert freshness_policy.nb_expired == 1
+
+    freshness_policy = FreshnessPolicy(max_age_days_per_price={1: 1})
+    assert freshness_policy.get_max_age(price=0.5) is None
+    assert not FreshnessPolicy().is_expired(fetched_at=fetched_at, price=25)
+
+
+def test_get_single_product_market_extract_expired(mocker):
+    client = mocker.Mock()
+    client.get_product_articles.return_value = []
+    client.get_product_info.return_value = MARKET_EXTRACT["info"]
+    extract_store = mocker.Mock()
+    extract_store.get.return_value = StoredExtract(
+        market_extract=MARKET_EXTRACT,
+        fetched_at=datetime.now(timezone.utc) - timedelta(days=3),
+    )
+    freshness_policy = FreshnessPolicy(max_age_days_per_price={20: 1, 0: 14})
+
+    def get_market_extract(price: float) -> dict:
+        return get_single_product_market_extract(
+            stock_info={"idProduct": 16416, "Foil?": "", "Price": price},
+            extract_store=extract_store,
+            card_market_client=client,
+            config={"min_condition": "EX", "default_max_results": 100},
+            freshness_policy=freshness_policy,
+        )
+
+    assert get_market_extract(price=1.0) == MARKET_EXTRACT
+    assert client.get_product_info.call_count == 0
+
+    assert get_market_extract(price=25.0) == {**MARKET_EXTRACT, "articles": []}
+    assert client.get_product_info.call_count == 1
+    extract_store.save.assert_called_once()
+
+
+def test_extract_codec():
+    article = {
+        "idArticle": 1,
+        "price": 1.5,
+        "count": 2,
+        "comments": "Nice card",
+        "language": {"idLanguage": 2, "languageName": "French"},
+        "seller": {"idUser": 3, "username": "seller", "country": "FR", "reputation": 1},
+        "condition": "NM",
+        "isFoil": False,
+    }
+    market_extract = {"articles": [article], "info": {"idProduct": 16416}}
+
+    pruned_market_extract = decode_market_extract(
+        data=encode_market_extract(market_extract=market_extract)
+    )
+    assert pruned_market_extract == {
+        "articles": [
+            {
+                "idArticle": 1,
+                "price": 1.5,
+                "count": 2,
+                "language": {"idLanguage": 2, "languageName": "French"},
+                "seller": {"country": "FR", "reputation": 1},
+                "condition": "NM",
+                "isFoil": False,
+            }
+        ],
+        "info": {"idProduct": 16416},
+    }
+    assert prune_market_extract(market_extract=market_extract) == pruned_market_extract
+
+    # The extracts saved by the former versions are still read
+    assert decode_market_extract(data=json.dumps(market_extract).encode()) == (
+        market_extract
+    )
+    assert (
+        decode_market_extract(data=zlib.compress(json.dumps(market_extract).encode()))
+        == market_extract
+    )
+
+
+def test_directory_extract_store_legacy_files(tmp_path):
+    extract_store = DirectoryExtractStore(market_extract_path=tmp_path)
+    (tmp_path / "16416.json").write_text(json.dumps(MARKET_EXTRACT))
+
+    assert extract_store.get(product_id=16416).market_extract == MARKET_EXTRACT
+
+    extract_store.save(product_id=16416, market_extract=MARKET_EXTRACT)
+    assert not (tmp_path / "16416.json").exists()
+    assert (tmp_path / "16416.json.gz").exists()
+    assert extract_store.get(product_id=16416).market_extract == MARKET_EXTRACT
+
+
+def test_get_single_product_market_extract_single_flight(tmp_path, mocker):
+    def get_product_info(product_id: int) -> dict:
+        time.sleep(0.1)
+        return MARKET_EXTRACT["info"]
+
+    client = mocker.Mock()
+    client.get_product_articles.return_value = MARKET_EXTRACT["articles"]
+    client.get_product_info.side_effect = get_product_info
+    extract_store = DirectoryExtractStore(market_extract_path=tmp_path)
+    get_market_extract = partial(
+        get_single_product_market_extract,
+        stock_info={"idProduct": 16416, "Foil?": ""},
+        extract_store=extract_store,
+        card_market_client=client,
+        config={"min_condition": "EX", "default_max_results": 100},
+        force_update=True,
+        single_flight=SingleFlight(),
+    )
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        market_extracts = list(executor.map(lambda _: get_market_extract(), range(4)))
+
+    # The product is fetched once, even with force_update
+    assert market_extracts == [MARKET_EXTRACT] * 4
+    assert client.get_product_info.call_count == 1
+    assert [file_path.name for file_path in tmp_path.iterdir()] == ["16416.json.gz"]
+
+
+def test_directory_extract_store_corrupted_file(tmp_path):
+    extract_store = DirectoryExtractStore(market_extract_path=tmp_path)
+    extract_store.save(product_id=16416, market_extract=MARKET_EXTRACT)
+    file_path = tmp_path / "16416.json.gz"
+    file_path.write_bytes(file_path.read_bytes()[:20])
+    (tmp_path / "16196.json").write_text('{"articles": [{"idArt')
+
+    assert extract_store.get(product_id=16416) is None
+    assert extract_store.get(product_id=16196) is None
+
+
+def test_iter_extended_market_extracts(extract_store, mocker):
+    pages = [
+        [{"idArticle": 1, "price": 1.5}, {"idArticle": 2, "price": 2.0}],
+        [{"idArticle": 3, "price": 2.5}],
+    ]
+    client = mocker.Mock()
+    client.iter_product_articles.side_effect = lambda **kwargs: iter(pages)
+    config = {"min_condition": "EX", "default_max_results": 100}
+    stock_info = {"idProduct": 16416, "Foil?": ""}
+    extract_store.save(product_id=16416, market_extract=MARKET_EXTRACT)
+    fetched_at = extract_store.get(product_id=16416).fetched_at
+
+    extended_market_extracts = iter_extended_market_extracts(
+        stock_info=stock_info,
+        market_extract=MARKET_EXTRACT,
+        card_market_client=client,
+        extract_store=extract_store,
+        config=config,
+    )
+    market_extract = next(extended_market_extracts)
+
+    # The articles already in the extract are not added again
+    assert [article["idArticle"] for article in market_extract["articles"]] == [1, 2]
+    assert market_extract[NEXT_STARTS_KEY] == {"None|EX|None": 102}
+    client.iter_product_articles.assert_called_once_with(
+        product_id=16416,
+        min_condition="EX",
+        language_id=None,
+        foil=None,
+        start=100,
+        max_results=400,
+    )
+    assert extract_store.get(product_id=16416).market_extract == market_extract
+
+    assert len(list(extended_market_extracts)) == 1
+    # The extension pages keep the fetch time of the stored extract
+    assert extract_store.get(product_id=16416).fetched_at == fetched_at
+    market_extract = extract_store.get(product_id=16416).market_extract
+    assert [article["idArticle"] for article in market_extract["articles"]] == [1, 2, 3]
+    # The exhausted query is not extended anymore
+    assert market_extract[NEXT_STARTS_KEY] == {"None|EX|None": None}
+    assert not list(
+        iter_extended_market_extracts(
+            stock_info=stock_info,
+            market_extract=market_extract,
+            card_market_client=client,
+            extract_store=extract_store,
+            config=config,
+        )
+    )
+    assert client.iter_product_articles.call_count == 1
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from mpu.card_market_client import CardMarketApiError, CardMarketClient
+from mpu.fake_api_server import FakeApiConfig, start_fake_api_server
+from mpu.fetch_pipeline import FetchReport, FetchStatus, fetch_products
+from mpu.market_extract import ProductMarketExtract
+
+
+@pytest.fixture
+def fake_api_server(insecure_transport):
+    def _fake_api_server(**config):
+        server = start_fake_api_server(config=FakeApiConfig(**config))
+        servers.append(server)
+        os.environ["CARD_MARKET_API_URL"] = server.api_url
+
+        return server
+
+    servers = []
+    yield _fake_api_server
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_client_against_fake_api(test_folder_cdir_path, fake_api_server):
+    server = fake_api_server(stock_size=30, export_delay=0)
+    client = CardMarketClient()
+
+    stock_df = client.get_stock_df()
+    assert len(stock_df) == 30
+
+    product_id = int(stock_df["idProduct"].iloc[0])
+    articles = client.get_product_articles(
+        product_id=product_id, min_condition="EX", max_results=20, language_id=1
+    )
+    assert 0 < len(articles) <= 20
+    assert all(article["language"]["idLanguage"] == 1 for article in articles)
+    assert all(article["condition"] in ("MT", "NM", "EX") for article in articles)
+
+    client.update_articles_prices(
+        articles_data=[{"idArticle": 1, "comments": "", "count": 1, "price": 2.5}]
+    )
+    assert server.api.updated_articles == [
+        {"idArticle": "1", "comments": None, "count": "1", "price": "2.5"}
+    ]
+    assert client.rate_limiter.limit_max == 5000
+
+
+def test_fake_api_request_limit(test_folder_cdir_path, fake_api_server):
+    fake_api_server(request_limit_max=2)
+    client = CardMarketClient()
+
+    client.get_product_info(product_id=1)
+    client.get_product_info(product_id=2)
+    with pytest.raises(CardMarketApiError) as error_info:
+        client.get_product_articles(product_id=1)
+
+    assert error_info.value.exceeded_request_limit
+
+
+def test_fake_api_request_limit_on_product_info(test_folder_cdir_path, fake_api_server):
+    fake_api_server(request_limit_max=1)
+    client = CardMarketClient()
+    fetch_report = FetchReport()
+
+    fetch_products(
+        stock_infos=[{"idProduct": product_id} for product_id in (1, 2, 3)],
+        get_market_extract=lambda stock_info: ProductMarketExtract(
+            market_extract={
+                "info": client.get_product_info(product_id=stock_info["idProduct"])
+            },
+            fetched=True,
+        ),
+        fetch_report=fetch_report,
+    )
+
+    # The limit error of the info call cancels the run like the articles one
+    assert [outcome[:2] for outcome in fetch_report.outcomes] == [
+        (1, FetchStatus.fetched),
+        (2, FetchStatus.failed),
+        (3, FetchStatus.skipped),
+    ]
+    assert fetch_report.cancel_error.exceeded_request_limit
+
+
+def test_iter_product_articles(test_folder_cdir_path, fake_api_server):
+    server = fake_api_server(articles_per_product=250)
+    client = CardMarketClient()
+
+    pages = client.iter_product_articles(product_id=1, start=20, page_size=100)
+    assert len(next(pages)) == 100
+    # The next page is only requested once the first one is consumed
+    assert server.api.request_count == 1
+    assert [len(articles) for articles in pages] == [100, 30]
+
+    pages = client.iter_product_articles(product_id=1, page_size=100, max_results=150)
+    assert [len(articles) for articles in pages] == [100, 50]
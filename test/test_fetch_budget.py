@@ -0,0 +1,78 @@
+import os
+import time
+
+import pandas as pd
+import requests_mock
+import yaml
+
+from mpu.commands.getdata import main as main_getdata
+from mpu.extract_store import DirectoryExtractStore
+from mpu.fetch_budget import estimate_fetch_budget
+from mpu.utils.freshness_policy import FreshnessPolicy
+
+CONFIG = {"languages": ["CARD", "English"], "min_condition": "EX"}
+
+
+def test_estimate_fetch_budget(tmp_path):
+    extract_store = DirectoryExtractStore(market_extract_path=tmp_path)
+    extract_store.save(
+        product_id=1, market_extract={"articles": [], "articles_foil": []}
+    )
+    for product_id in (2, 4, 5):
+        extract_store.save(product_id=product_id, market_extract={"articles": []})
+    ten_days_ago = time.time() - 10 * 86400
+    os.utime(extract_store.get_file_path(product_id=5), (ten_days_ago,) * 2)
+    stock_infos = [
+        {"idProduct": product_id, "Price": 1.0, "Language": 2, "Foil?": "X"}
+        for product_id in range(1, 6)
+    ]
+
+    fetch_budget = estimate_fetch_budget(
+        stock_infos=stock_infos,
+        extract_store=extract_store,
+        config=CONFIG,
+        forced_product_ids={4},
+        freshness_policy=FreshnessPolicy(max_age_days_per_price={0: 7}),
+    )
+
+    assert [
+        (estimate.product_id, estimate.cached, estimate.nb_calls_per_endpoint)
+        for estimate in fetch_budget.estimates
+    ] == [
+        (1, True, {}),
+        # The foil add-on of a stored extract without the foil articles
+        (2, True, {"articles": 2}),
+        # Missing, forced and expired
+        (3, False, {"products": 1, "articles": 4}),
+        (4, False, {"products": 1, "articles": 4}),
+        (5, False, {"products": 1, "articles": 4}),
+    ]
+    assert fetch_budget.nb_calls_per_endpoint == {"products": 3, "articles": 14}
+    assert fetch_budget.nb_calls == 17
+
+
+def test_getdata_dry_run(test_folder_cdir_path, test_stock_df):
+    test_stock_df.to_csv(test_folder_cdir_path / "stock.csv", index=False)
+    config_path = test_folder_cdir_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump({"request_options": CONFIG}))
+
+    # Without any registered call, a call would fail
+    with requests_mock.Mocker() as r_mock:
+        main_getdata(
+            input_path=test_folder_cdir_path,
+            config_path=config_path,
+            market_extract_path=test_folder_cdir_path,
+            minimum_price=0,
+            force_update=False,
+            parallel_execution=True,
+            dry_run=True,
+        )
+
+    assert not r_mock.called
+    dry_run_df = pd.read_csv(test_folder_cdir_path / "getdata_dry_run.csv")
+    assert dry_run_df.to_dict(orient="list") == {
+        "idProduct": [16416, 16196],
+        "cached": [False, False],
+        "products_calls": [1, 1],
+        "articles_calls": [4, 4],
+    }
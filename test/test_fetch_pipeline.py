@@ -0,0 +1,121 @@
+import json
+
+import pandas as pd
+
+from mpu.card_market_client import CardMarketApiError
+from mpu.fetch_journal import FetchJournal
+from mpu.fetch_pipeline import (FetchReport, FetchStatus, ProductFetchOutcome,
+                                fetch_products, fetch_products_in_threads)
+from mpu.market_extract import ProductMarketExtract
+
+STOCK_INFOS = [{"idProduct": product_id} for product_id in range(1, 7)]
+
+
+def get_market_extract(stock_info: dict) -> ProductMarketExtract:
+    product_id = stock_info["idProduct"]
+    if product_id == 2:
+        raise ValueError("Broken extract")
+    if product_id == 4:
+        raise CardMarketApiError(
+            message="Too many requests", code=429, limit_count=5000, limit_max=5000
+        )
+
+    return ProductMarketExtract(market_extract={}, fetched=product_id % 2 == 1)
+
+
+def test_fetch_products(test_folder_cdir_path):
+    fetch_report = FetchReport()
+    fetch_products(
+        stock_infos=STOCK_INFOS,
+        get_market_extract=get_market_extract,
+        fetch_report=fetch_report,
+    )
+
+    assert [outcome[:2] for outcome in fetch_report.outcomes] == [
+        (1, FetchStatus.fetched),
+        (2, FetchStatus.failed),
+        (3, FetchStatus.fetched),
+        (4, FetchStatus.failed),
+        # The run is cancelled once the request limit is exceeded
+        (5, FetchStatus.skipped),
+        (6, FetchStatus.skipped),
+    ]
+    assert fetch_report.is_cancelled
+
+    failures_file_path = test_folder_cdir_path / "getdata_failures.csv"
+    fetch_report.save_failures(file_path=failures_file_path)
+    failures_df = pd.read_csv(failures_file_path)
+    assert failures_df["idProduct"].tolist() == [2, 4, 5, 6]
+    assert failures_df["status"].tolist() == ["failed", "failed", "skipped", "skipped"]
+    assert failures_df["error"].iloc[0] == "ValueError('Broken extract')"
+
+    # A run without failures removes the former file
+    FetchReport().save_failures(file_path=failures_file_path)
+    assert not failures_file_path.exists()
+
+
+def test_fetch_products_in_threads():
+    fetch_report = FetchReport()
+    stock_infos = [{"idProduct": product_id} for product_id in (1, 2, 3, 5, 6)] * 10
+
+    fetch_products_in_threads(
+        stock_infos=stock_infos,
+        get_market_extract=get_market_extract,
+        fetch_report=fetch_report,
+        nb_workers=4,
+    )
+
+    # Each product gets an outcome, the errors not stopping the others
+    assert sorted(fetch_report.outcomes) == sorted(
+        [
+            ProductFetchOutcome(1, FetchStatus.fetched),
+            ProductFetchOutcome(2, FetchStatus.failed, "ValueError('Broken extract')"),
+            ProductFetchOutcome(3, FetchStatus.fetched),
+            ProductFetchOutcome(5, FetchStatus.fetched),
+            ProductFetchOutcome(6, FetchStatus.cached),
+        ]
+        * 10
+    )
+    assert not fetch_report.is_cancelled
+
+
+def test_fetch_journal(test_folder_cdir_path, mocker):
+    journal_path = test_folder_cdir_path / "getdata_journal.jsonl"
+    fetch_journal = FetchJournal(journal_path=journal_path)
+    client = mocker.Mock(nb_thread_calls=10)
+
+    def get_counted_market_extract(stock_info: dict) -> ProductMarketExtract:
+        client.nb_thread_calls += 2
+        return get_market_extract(stock_info=stock_info)
+
+    fetch_journal.open(resume=False)
+    fetch_products(
+        stock_infos=STOCK_INFOS,
+        get_market_extract=get_counted_market_extract,
+        fetch_report=FetchReport(journal=fetch_journal),
+        card_market_client=client,
+    )
+    fetch_journal.close()
+
+    entries = [json.loads(line) for line in journal_path.read_text().splitlines()]
+    # The skipped products are not journaled
+    assert [(entry["idProduct"], entry["status"]) for entry in entries] == [
+        (1, "fetched"),
+        (2, "failed"),
+        (3, "fetched"),
+        (4, "failed"),
+    ]
+    assert all(entry["nb_calls"] == 2 for entry in entries)
+    assert fetch_journal.get_done_product_ids() == {1, 3}
+
+    # A resumed run appends to the journal, even after a partial line
+    with journal_path.open("a") as journal_file:
+        journal_file.write('{"idProduct": 5, "sta')
+    fetch_journal.open(resume=True)
+    fetch_journal.record(product_id=2, status="cached", nb_calls=0)
+    fetch_journal.close()
+    assert fetch_journal.get_done_product_ids() == {1, 2, 3}
+
+    fetch_journal.open(resume=False)
+    fetch_journal.close()
+    assert fetch_journal.get_done_product_ids() == set()
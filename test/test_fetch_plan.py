@@ -0,0 +1,88 @@
+import pandas as pd
+
+from mpu.fetch_plan import get_nb_calls_per_extract, plan_product_fetches
+from mpu.request_plan import (ArticlesQuery, get_articles_queries,
+                              get_market_extract_queries)
+
+CONFIG = {"languages": ["CARD"], "min_condition": "EX", "default_max_results": 100}
+
+
+def test_get_articles_queries():
+    config = {
+        "languages": ["CARD", "English", "French"],
+        "min_condition": "EX",
+        "max_results": {"English": 100, "French": 20},
+        "default_max_results": 50,
+    }
+
+    # The CARD query of an English card is merged in the English one
+    assert get_articles_queries(config=config, card_language_ids=[1]) == [
+        ArticlesQuery(language_id=1, min_condition="EX", foil=None, max_results=100),
+        ArticlesQuery(language_id=2, min_condition="EX", foil=None, max_results=20),
+    ]
+    assert get_articles_queries(config=config, card_language_ids=[3, 2]) == [
+        ArticlesQuery(language_id=3, min_condition="EX", foil=None, max_results=50),
+        ArticlesQuery(language_id=2, min_condition="EX", foil=None, max_results=50),
+        ArticlesQuery(language_id=1, min_condition="EX", foil=None, max_results=100),
+    ]
+
+    config = {"min_condition": "EX", "one_request_per_condition": True}
+    assert get_articles_queries(config=config, foil=True) == [
+        ArticlesQuery(
+            language_id=None, min_condition="MT", foil=True, max_results=None
+        ),
+        ArticlesQuery(
+            language_id=None, min_condition="NM", foil=True, max_results=None
+        ),
+    ]
+
+
+def test_get_market_extract_queries():
+    stock_info = {"idProduct": 16416, "Language": 1, "Foil?": "X"}
+    config = {**CONFIG, "max_results": {"CARD": 300}}
+
+    assert get_market_extract_queries(config=config, stock_info=stock_info) == [
+        ArticlesQuery(language_id=1, min_condition="EX", foil=None, max_results=300),
+        ArticlesQuery(language_id=1, min_condition="EX", foil=True, max_results=50),
+    ]
+    assert get_nb_calls_per_extract(config=config, stock_info=stock_info) == 3
+
+
+def test_plan_product_fetches():
+    stock_df = pd.DataFrame(
+        {
+            "idProduct": [16416, 16416, 16196, 16416, 16194],
+            "Price": [1.0, 3.0, 0.5, 2.0, 0.2],
+            "Language": [1, 1, 2, 3, 1],
+            "Foil?": ["", "", "", "X", "X"],
+        }
+    )
+
+    fetch_plan = plan_product_fetches(stock_df=stock_df, config=CONFIG)
+
+    assert fetch_plan.stock_infos == [
+        {
+            "idProduct": 16416,
+            "Price": 3.0,
+            "Language": 1,
+            "Foil?": "X",
+            "CardLanguages": [1, 3],
+        },
+        {
+            "idProduct": 16196,
+            "Price": 0.5,
+            "Language": 2,
+            "Foil?": "",
+            "CardLanguages": [2],
+        },
+        {
+            "idProduct": 16194,
+            "Price": 0.2,
+            "Language": 1,
+            "Foil?": "X",
+            "CardLanguages": [1],
+        },
+    ]
+    assert fetch_plan.nb_rows == 5
+    # 3 rows x 2 calls + 2 foil rows x 3 calls, against 5 + 2 + 3 calls
+    assert fetch_plan.nb_calls_saved == 2
@@ -0,0 +1,84 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from mpu.extract_store import DirectoryExtractStore
+from mpu.fetch_priority import (FetchPriority, get_fetch_priority_from_config,
+                                get_price_changes)
+
+STOCK_DF = pd.DataFrame(
+    {
+        "idArticle": [1, 2, 3, 4],
+        "idProduct": [16416, 16196, 16416, 16194],
+        "Price": [1.0, 40.0, 3.0, 0.05],
+        "Amount": [1, 1, 2, 4],
+    }
+)
+FORMER_STOCK_DF = pd.DataFrame(
+    {"Price": [1.0, 40.0, 2.0, 0.1], "idProduct": [16416, 16196, 16416, 16194]},
+    index=pd.Index([1, 2, 3, 4], name="idArticle"),
+)
+STOCK_INFOS = [{"idProduct": product_id} for product_id in (16416, 16196, 16194)]
+
+
+def test_get_price_changes():
+    price_changes = get_price_changes(
+        stock_df=STOCK_DF, former_stock_df=FORMER_STOCK_DF
+    )
+
+    assert price_changes.to_dict() == {16194: 0.5, 16196: 0.0, 16416: 0.5}
+    assert get_price_changes(stock_df=STOCK_DF, former_stock_df=None).empty
+
+
+def test_fetch_priority(tmp_path):
+    extract_store = DirectoryExtractStore(market_extract_path=tmp_path)
+    for product_id in (16416, 16196):
+        extract_store.save(product_id=product_id, market_extract={"articles": []})
+    ten_days_ago = time.time() - 10 * 86400
+    os.utime(extract_store.get_file_path(product_id=16196), (ten_days_ago,) * 2)
+
+    def get_order(fetch_priority: FetchPriority) -> list:
+        return [
+            stock_info["idProduct"]
+            for stock_info in fetch_priority.order(
+                stock_infos=STOCK_INFOS,
+                stock_df=STOCK_DF,
+                extract_store=extract_store,
+                former_stock_df=FORMER_STOCK_DF,
+            )
+        ]
+
+    # By stock value: 40€, then 1€ + 2 x 3€, then 4 x 0.05€
+    assert get_order(FetchPriority()) == [16196, 16416, 16194]
+
+    # The missing extract is as stale as the max, the fresh one is not stale
+    fetch_priority = FetchPriority(
+        value_weight=0, staleness_weight=1, max_staleness_days=30
+    )
+    assert fetch_priority.get_scores(
+        stock_df=STOCK_DF, extract_store=extract_store
+    ).to_dict() == pytest.approx({16416: 0, 16196: 10, 16194: 30}, abs=0.01)
+    assert get_order(fetch_priority) == [16194, 16196, 16416]
+
+    # The same volatility keeps the stock order
+    assert get_order(FetchPriority(value_weight=0, volatility_weight=1)) == [
+        16416,
+        16194,
+        16196,
+    ]
+    # Without any weight, the stock order is kept
+    assert get_order(FetchPriority(value_weight=0)) == [16416, 16196, 16194]
+
+
+def test_get_fetch_priority_from_config():
+    fetch_priority = get_fetch_priority_from_config(config={})
+    assert fetch_priority.value_weight == 1
+    assert not fetch_priority.staleness_weight
+
+    fetch_priority = get_fetch_priority_from_config(
+        config={"fetch_priority": {"staleness_weight": 2, "max_staleness_days": 7}}
+    )
+    assert fetch_priority.staleness_weight == 2
+    assert fetch_priority.max_staleness_days == 7
@@ -1,5 +1,3 @@
-import os
-
 import pandas as pd
 import pytest
 import requests_mock
@@ -25,19 +23,6 @@ def test_stock_output_df(test_stock_df):
 runner = CliRunner()
 
 
-@pytest.fixture(autouse=True)
-def mock_settings_env_vars(mocker):
-    mocker.patch.dict(
-        os.environ,
-        {
-            "CLIENT_KEY": "my-client-key",
-            "CLIENT_SECRET": "my-client-secret",
-            "ACCESS_TOKEN": "my-access-token",
-            "ACCESS_SECRET": "my-access-secret",
-        },
-    )
-
-
 def test_integration_gestock(
     test_folder_cdir_path, test_stock_df, test_stock_output_df, mocker
 ):
@@ -86,8 +71,8 @@ def test_integration_gestock(
 
     assert result.exit_code == 0
     assert (test_folder_cdir_path / "market_extract").exists()
-    assert (test_folder_cdir_path / "market_extract" / "16416.json").exists()
-    assert (test_folder_cdir_path / "market_extract" / "16196.json").exists()
+    assert (test_folder_cdir_path / "market_extract" / "16416.json.gz").exists()
+    assert (test_folder_cdir_path / "market_extract" / "16196.json.gz").exists()
     # Is valid because we changed the current directory before
     test_stock_output_df.to_excel("test.xlsx", index=False, engine=EXCEL_ENGINE)
     pd.testing.assert_frame_equal(
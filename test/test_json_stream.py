@@ -0,0 +1,47 @@
+import io
+import json
+
+import pytest
+
+from mpu.utils.json_stream import (iter_json_array_batches,
+                                   iter_json_array_items)
+
+
+@pytest.fixture
+def stock_json():
+    return json.dumps(
+        {
+            "meta": {"article": [-1, -2], "comment": 'not an "article" key'},
+            "article": [
+                {"idArticle": index, "price": index * 1.5, "comments": 'a "]"\\ ['}
+                for index in range(200)
+            ]
+            + [3, 12345678, "article"],
+            "count": 203,
+        }
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_iter_json_array_items(stock_json, chunk_size):
+    items = list(
+        iter_json_array_items(
+            text_file=io.StringIO(stock_json), key="article", chunk_size=chunk_size
+        )
+    )
+
+    assert items == json.loads(stock_json)["article"]
+
+
+def test_iter_json_array_batches(stock_json):
+    batches = list(
+        iter_json_array_batches(
+            text_file=io.StringIO(stock_json), key="article", batch_size=50
+        )
+    )
+
+    assert [len(batch) for batch in batches] == [50, 50, 50, 50, 3]
+    assert list(iter_json_array_batches(io.StringIO('{"article": []}'), "article", 5)) == []
+
+    with pytest.raises(KeyError):
+        list(iter_json_array_items(text_file=io.StringIO('{"a": [1]}'), key="article"))
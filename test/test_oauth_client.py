@@ -0,0 +1,113 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests_mock
+from furl import furl
+
+from mpu.utils.oauth_client import OAuthAuthenticatedClient
+from mpu.utils.timeout_policy import HedgingPolicy, TimeoutPolicy
+
+API_URL = furl("https://api.cardmarket.com/ws/v2.0/output.json")
+
+
+def test_client_session_pool_size():
+    client = OAuthAuthenticatedClient(pool_size=4)
+
+    adapter = client.session.get_adapter("https://api.cardmarket.com")
+    assert adapter._pool_connections == 4
+    assert adapter._pool_maxsize == 4
+    assert client.session.headers["Connection"] == "keep-alive"
+
+
+def test_client_session_without_keep_alive():
+    client = OAuthAuthenticatedClient(keep_alive=False)
+
+    assert client.session.headers["Connection"] == "close"
+
+
+def test_client_calls_reuse_the_session(test_folder_cdir_path, mocker):
+    client = OAuthAuthenticatedClient()
+
+    with requests_mock.Mocker() as r_mock:
+        send_spy = mocker.spy(client.session, "send")
+        r_mock.get(str(API_URL / "products/1"), json={})
+        r_mock.post(str(API_URL / "exports/stock"), json={})
+
+        client.get_api_call(url=API_URL / "products/1")
+        client.post_api_call(url=API_URL / "exports/stock")
+
+    assert send_spy.call_count == 2
+    assert r_mock.request_history[0].headers["Authorization"].startswith("OAuth")
+    # The calls are counted per thread
+    assert client.nb_thread_calls == 2
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(lambda: client.nb_thread_calls).result() == 0
+
+
+def test_client_signs_each_request_with_its_realm(test_folder_cdir_path):
+    client = OAuthAuthenticatedClient()
+    product_ids = list(range(50))
+
+    with requests_mock.Mocker() as r_mock:
+        for product_id in product_ids:
+            r_mock.get(str(API_URL / f"products/{product_id}"), json={})
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(
+                executor.map(
+                    lambda product_id: client.get_api_call(
+                        url=(API_URL / f"products/{product_id}").add(
+                            args={"start": 0}
+                        )
+                    ),
+                    product_ids,
+                )
+            )
+
+    assert len(r_mock.request_history) == len(product_ids)
+    for request in r_mock.request_history:
+        realm = str(furl(request.url).remove(args=True))
+        assert f'realm="{realm}"' in request.headers["Authorization"]
+
+
+def test_client_uses_endpoint_timeouts(test_folder_cdir_path, mocker):
+    client = OAuthAuthenticatedClient(
+        timeout_policy=TimeoutPolicy(
+            connect=3, read=30, timeouts_per_endpoint={"articles": {"read": 90}}
+        )
+    )
+
+    with requests_mock.Mocker() as r_mock:
+        request_spy = mocker.spy(client.session, "request")
+        r_mock.get(str(API_URL / "articles/1"), json={})
+        r_mock.get(str(API_URL / "products/1"), json={})
+
+        client.get_api_call(url=API_URL / "articles/1")
+        client.get_api_call(url=API_URL / "products/1")
+
+    assert request_spy.call_args_list[0].kwargs["timeout"] == (3, 90)
+    assert request_spy.call_args_list[1].kwargs["timeout"] == (3, 30)
+
+
+def test_client_hedges_slow_calls(test_folder_cdir_path, mocker):
+    hedging_policy = HedgingPolicy(endpoints=["products"], min_samples=5)
+    for _ in range(5):
+        hedging_policy.record_latency(endpoint="products", latency=0.01)
+    client = OAuthAuthenticatedClient(hedging_policy=hedging_policy)
+
+    calls = []
+
+    # requests_mock serializes the calls, so the transport is replaced directly
+    def timed_request(method, url, endpoint, **kwargs):
+        calls.append(endpoint)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return mocker.Mock(json=lambda: {"call": "first"})
+        return mocker.Mock(json=lambda: {"call": "hedge"})
+
+    mocker.patch.object(client, "_timed_request", side_effect=timed_request)
+    response = client._request(method="GET", url=API_URL / "products/1")
+
+    assert response.json() == {"call": "hedge"}
+    assert calls == ["products", "products"]
+    assert hedging_policy.hedges_per_endpoint == {"products": 1}
@@ -0,0 +1,86 @@
+import json
+
+from mpu.utils.rate_limiter import (RequestRateLimiter, get_limit_day,
+                                    get_rate_limiter_from_config)
+
+
+def test_rate_limiter_ledger_is_shared_between_runs(tmp_path):
+    ledger_path = tmp_path / "request_ledger.json"
+
+    rate_limiter = RequestRateLimiter(ledger_path=ledger_path, ledger_save_every=2)
+    rate_limiter.update_from_headers(
+        headers={"x-request-limit-count": "1200", "x-request-limit-max": "5000"}
+    )
+    # The ledger is saved by batches of responses
+    assert not ledger_path.exists()
+    rate_limiter.update_from_headers(headers={})
+    rate_limiter.update_from_headers(headers={})
+    assert json.loads(ledger_path.read_text())["count"] == 1201
+    rate_limiter.flush()
+
+    assert json.loads(ledger_path.read_text()) == {
+        "day": get_limit_day(),
+        "count": 1202,
+        "max": 5000,
+    }
+
+    next_rate_limiter = RequestRateLimiter(ledger_path=ledger_path)
+    assert next_rate_limiter.remaining == 3798
+
+
+def test_rate_limiter_ignores_ledger_of_another_day(tmp_path):
+    ledger_path = tmp_path / "request_ledger.json"
+    ledger_path.write_text(json.dumps({"day": "2000-01-01", "count": 10, "max": 50}))
+
+    rate_limiter = RequestRateLimiter(ledger_path=ledger_path)
+
+    assert rate_limiter.remaining is None
+    assert rate_limiter.get_rate() is None
+
+
+def test_rate_limiter_paces_after_burst(mocker):
+    sleep_mock = mocker.patch("mpu.utils.rate_limiter.time.sleep")
+    mocker.patch(
+        "mpu.utils.rate_limiter.time.monotonic", side_effect=[0, 0, 0, 0, 0, 1]
+    )
+    rate_limiter = RequestRateLimiter(
+        ledger_path=None, max_requests_per_second=2, burst=3, share=2
+    )
+
+    for _ in range(4):
+        rate_limiter.acquire()
+
+    # One request per second for each of the two workers sharing the budget
+    sleep_mock.assert_called_once_with(1.0)
+
+
+def test_rate_limiter_spreads_remaining_budget(mocker):
+    mocker.patch(
+        "mpu.utils.rate_limiter.get_seconds_until_limit_reset", return_value=1000
+    )
+    rate_limiter = RequestRateLimiter(
+        ledger_path=None, max_requests_per_second=10, spread_budget_until_reset=True
+    )
+    rate_limiter.update_from_headers(
+        headers={"x-request-limit-count": "4500", "x-request-limit-max": "5000"}
+    )
+
+    assert rate_limiter.get_rate() == 0.5
+
+
+def test_get_rate_limiter_from_config(tmp_path):
+    rate_limiter = get_rate_limiter_from_config(config={}, folder_path=tmp_path)
+    # The budget is not spread by default, the calls are not paced
+    rate_limiter.update_from_headers(
+        headers={"x-request-limit-count": "4500", "x-request-limit-max": "5000"}
+    )
+    assert rate_limiter.get_rate() is None
+    assert rate_limiter.ledger_path == tmp_path / "request_ledger.json"
+
+    rate_limiter = get_rate_limiter_from_config(
+        config={
+            "rate_limit": {"ledger_path": str(tmp_path / "ledgers" / "ledger.json")}
+        },
+        folder_path=tmp_path / "config",
+    )
+    assert rate_limiter.ledger_path == tmp_path / "ledgers" / "ledger.json"
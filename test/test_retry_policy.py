@@ -0,0 +1,82 @@
+
+import pytest
+import requests
+import requests_mock
+from furl import furl
+
+from mpu.utils.oauth_client import OAuthAuthenticatedClient
+from mpu.utils.rate_limiter import RequestRateLimiter
+from mpu.utils.retry_policy import RetryPolicy
+
+API_URL = furl("https://api.cardmarket.com/ws/v2.0/output.json")
+
+
+@pytest.fixture
+def sleep_mock(mocker):
+    return mocker.patch("mpu.utils.oauth_client.time.sleep")
+
+
+def get_client(retry_policy: RetryPolicy) -> OAuthAuthenticatedClient:
+    return OAuthAuthenticatedClient(
+        rate_limiter=RequestRateLimiter(ledger_path=None), retry_policy=retry_policy
+    )
+
+
+def test_retry_policy_endpoints():
+    retry_policy = RetryPolicy(max_attempts_per_endpoint={"exports/stock": 2})
+
+    assert retry_policy.get_endpoint(url=API_URL / "articles/16416") == "articles"
+    assert retry_policy.get_endpoint(url=API_URL / "stock/article/1") == "stock/article"
+    assert retry_policy.get_endpoint(url=API_URL / "exports/stock") == "exports/stock"
+    assert retry_policy.get_max_attempts(endpoint="exports/stock") == 2
+
+
+def test_client_retries_transient_errors(sleep_mock):
+    retry_policy = RetryPolicy(max_attempts=3)
+    client = get_client(retry_policy=retry_policy)
+
+    with requests_mock.Mocker() as r_mock:
+        r_mock.get(
+            str(API_URL / "products/1"),
+            [
+                {"exc": requests.ConnectionError},
+                {"status_code": 503, "headers": {"Retry-After": "7"}},
+                {"status_code": 200, "json": {"product": {}}},
+            ],
+        )
+        response = client.get_api_call(url=API_URL / "products/1")
+
+    assert response.json() == {"product": {}}
+    assert retry_policy.retries_per_endpoint == {"products": 2}
+    assert sleep_mock.call_args_list[-1].args == (7.0,)
+
+
+def test_client_stops_retrying_after_max_attempts(sleep_mock):
+    retry_policy = RetryPolicy(max_attempts=5, max_attempts_per_endpoint={"articles": 2})
+    client = get_client(retry_policy=retry_policy)
+
+    with requests_mock.Mocker() as r_mock:
+        r_mock.get(str(API_URL / "articles/1"), status_code=500)
+        with pytest.raises(requests.HTTPError):
+            client.get_api_call(url=API_URL / "articles/1")
+
+    assert r_mock.call_count == 2
+    assert retry_policy.total_retries == 1
+
+
+def test_client_never_retries_exceeded_request_limit(sleep_mock):
+    retry_policy = RetryPolicy()
+    client = get_client(retry_policy=retry_policy)
+
+    with requests_mock.Mocker() as r_mock:
+        r_mock.get(
+            str(API_URL / "articles/1"),
+            status_code=429,
+            headers={"x-request-limit-count": "5000", "x-request-limit-max": "5000"},
+        )
+        with pytest.raises(requests.HTTPError):
+            client.get_api_call(url=API_URL / "articles/1")
+
+    assert r_mock.call_count == 1
+    assert retry_policy.total_retries == 0
+    sleep_mock.assert_not_called()
@@ -0,0 +1,78 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from mpu.card_market_client import CardMarketClient
+from mpu.commands.getstock import main as main_getstock
+from mpu.fake_api_server import FakeApiConfig, start_fake_api_server
+from mpu.stock_cache import StockExportCache
+
+
+def get_export(export_id: int, age: timedelta) -> dict:
+    started_at = datetime.now(timezone.utc) - age
+    return {"idRequest": export_id, "startedAt": started_at.isoformat()}
+
+
+def test_stock_export_cache(test_folder_cdir_path, test_stock_df):
+    stock_cache = StockExportCache(
+        cache_path=test_folder_cdir_path / "cache", max_age=timedelta(hours=1)
+    )
+    old_export = get_export(export_id=1, age=timedelta(hours=2))
+    export = get_export(export_id=2, age=timedelta(minutes=5))
+
+    assert stock_cache.get_latest() is None
+    assert stock_cache.get(export=export) is None
+
+    stock_cache.save(export=old_export, stock_df=test_stock_df)
+    # The stock of an old export is not reused, and removed
+    assert stock_cache.get_latest() is None
+    assert not list(stock_cache.cache_path.iterdir())
+
+    stock_cache.save(export=export, stock_df=test_stock_df)
+    pd.testing.assert_frame_equal(stock_cache.get_latest(), test_stock_df)
+    pd.testing.assert_frame_equal(stock_cache.get(export=export), test_stock_df)
+
+    stock_cache.save(export={"idRequest": 3}, stock_df=test_stock_df)
+    assert len(list(stock_cache.cache_path.iterdir())) == 1
+
+
+def test_client_reuses_the_cached_export(test_folder_cdir_path, insecure_transport):
+    server = start_fake_api_server(config=FakeApiConfig(stock_size=20, export_delay=0))
+    try:
+        stock_cache = StockExportCache(cache_path=test_folder_cdir_path / "cache")
+        stock_df = CardMarketClient(
+            api_url=server.api_url, stock_cache=stock_cache
+        ).get_stock_df()
+        request_count = server.api.request_count
+
+        cached_stock_df = CardMarketClient(
+            api_url=server.api_url, stock_cache=stock_cache
+        ).get_stock_df()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    pd.testing.assert_frame_equal(cached_stock_df, stock_df)
+    assert server.api.request_count == request_count
+
+
+def test_getstock_caches_in_the_output_folder(
+    tmp_path, test_folder_cdir_path, insecure_transport
+):
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    server = start_fake_api_server(config=FakeApiConfig(stock_size=20, export_delay=0))
+    os.environ["CARD_MARKET_API_URL"] = server.api_url
+    try:
+        main_getstock(output_path=output_path, stock_cache_max_age=60)
+        request_count = server.api.request_count
+        main_getstock(output_path=output_path, stock_cache_max_age=60)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Not in the current directory
+    assert len(list((output_path / "stock_exports").iterdir())) == 1
+    assert not list(test_folder_cdir_path.iterdir())
+    assert server.api.request_count == request_count
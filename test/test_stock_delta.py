@@ -0,0 +1,172 @@
+import os
+
+import pandas as pd
+import pytest
+import requests_mock
+import yaml
+
+from mpu.commands.getdata import main as main_getdata
+from mpu.commands.getstock import GetStockMode
+from mpu.commands.getstock import main as main_getstock
+from mpu.extract_store import DirectoryExtractStore, get_market_extract_path
+from mpu.fake_api_server import FakeApiConfig, start_fake_api_server
+from mpu.stock_delta import (get_stock_delta, get_stock_df_as_saved,
+                             merge_stock_dfs, read_stock_delta)
+
+
+@pytest.fixture
+def stock_df():
+    return pd.DataFrame(
+        {
+            "idArticle": [1, 2, 3],
+            "Price": [1.5, 2.0, 0.2],
+            "Comments": ["", "<M>", ""],
+            "Amount": [1, 1, 4],
+        }
+    ).set_index("idArticle")
+
+
+def test_merge_stock_dfs(stock_df):
+    former_stock_df = get_stock_df_as_saved(stock_df=stock_df)
+    new_stock_df = stock_df.drop(index=[1])
+    new_stock_df.loc[3, "Price"] = 0.25
+    new_stock_df.loc[4] = [3.0, "", 2]
+
+    merged_stock_df, changes = merge_stock_dfs(
+        former_stock_df=former_stock_df, stock_df=new_stock_df
+    )
+
+    assert changes.added.tolist() == [4]
+    assert changes.removed.tolist() == [1]
+    assert changes.changed.tolist() == [3]
+    assert changes.get_summary() == "1 added, 1 removed, 1 changed"
+    assert merged_stock_df.index.tolist() == [2, 3, 4]
+    assert merged_stock_df["Price"].tolist() == [2.0, 0.25, 3.0]
+
+    _, changes = merge_stock_dfs(former_stock_df=former_stock_df, stock_df=stock_df)
+    assert changes.nb_changes == 0
+
+
+def test_get_stock_delta(stock_df):
+    stock_df["idProduct"] = [10, 20, 30]
+    former_stock_df = get_stock_df_as_saved(stock_df=stock_df)
+    new_stock_df = stock_df.drop(index=[1])
+    new_stock_df.loc[2, "Amount"] = 2
+    new_stock_df.loc[3, "Price"] = 0.25
+    new_stock_df.loc[4] = [3.0, "", 1, 40]
+    new_stock_df.loc[5] = [1.0, "", 1, 20]
+
+    stock_delta = get_stock_delta(
+        former_stock_df=former_stock_df,
+        stock_df=get_stock_df_as_saved(stock_df=new_stock_df),
+    )
+
+    assert stock_delta.price_changed.tolist() == [3]
+    assert stock_delta.amount_changed.tolist() == [2]
+    assert stock_delta.new_products.tolist() == [40]
+    # The product 10 only lost an article and the product 20 got a new one
+    assert stock_delta.changed_products.tolist() == [20, 30, 40]
+
+
+def test_getstock_incremental(test_folder_cdir_path, insecure_transport):
+    server = start_fake_api_server(config=FakeApiConfig(stock_size=250, export_delay=0))
+    os.environ["CARD_MARKET_API_URL"] = server.api_url
+    stock_file_path = test_folder_cdir_path / "stock.csv"
+    try:
+        main_getstock(output_path=test_folder_cdir_path)
+        exported_stock_df = pd.read_csv(stock_file_path, index_col="idArticle")
+
+        main_getstock(output_path=test_folder_cdir_path, mode=GetStockMode.incremental)
+        pd.testing.assert_frame_equal(
+            pd.read_csv(stock_file_path, index_col="idArticle"), exported_stock_df
+        )
+
+        articles = server.api.get_stock_file()["article"]
+        removed_article = articles.pop(0)
+        articles[0]["price"] += 1
+        main_getstock(
+            output_path=test_folder_cdir_path,
+            mode=GetStockMode.incremental,
+            nb_workers=2,
+        )
+        # Without getdata in between, the previous stock is not replaced
+        main_getstock(output_path=test_folder_cdir_path, mode=GetStockMode.incremental)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    stock_df = pd.read_csv(stock_file_path, index_col="idArticle")
+    assert len(stock_df) == 249
+    stock_delta = read_stock_delta(
+        stock_file_path=stock_file_path,
+        previous_stock_file_path=test_folder_cdir_path / "stock.previous.csv",
+    )
+    assert stock_delta.changes.removed.tolist() == [removed_article["idArticle"]]
+    assert stock_delta.price_changed.tolist() == [articles[0]["idArticle"]]
+    assert removed_article["idArticle"] not in stock_df.index
+    assert stock_df.loc[articles[0]["idArticle"], "Price"] == articles[0]["price"]
+
+
+def run_getdata(folder_path, minimum_price: float = 0) -> None:
+    config_path = folder_path / "config.yaml"
+    config_path.write_text(
+        yaml.safe_dump(
+            {"request_options": {"languages": ["CARD"], "min_condition": "EX"}}
+        )
+    )
+    # Without any registered call, the products without market extract fail
+    with requests_mock.Mocker():
+        main_getdata(
+            input_path=folder_path,
+            config_path=config_path,
+            market_extract_path=folder_path,
+            minimum_price=minimum_price,
+            force_update=False,
+            parallel_execution=False,
+        )
+
+
+def save_empty_market_extracts(folder_path, product_ids) -> None:
+    extract_store = DirectoryExtractStore(
+        market_extract_path=get_market_extract_path(
+            market_extract_parent_path=folder_path
+        )
+    )
+    for product_id in product_ids:
+        extract_store.save(
+            product_id=product_id,
+            market_extract={"articles": [], "articles_foil": [], "info": {}},
+        )
+
+
+def test_getdata_keeps_the_stock_it_used(test_folder_cdir_path, test_stock_df):
+    test_stock_df.to_csv(test_folder_cdir_path / "stock.csv", index=False)
+    previous_stock_file_path = test_folder_cdir_path / "stock.previous.csv"
+    previous_stock_file_path.write_text("idArticle,idProduct,Price\n")
+
+    # A product fails without its market extract, the previous stock is kept
+    save_empty_market_extracts(folder_path=test_folder_cdir_path, product_ids=[16416])
+    run_getdata(folder_path=test_folder_cdir_path)
+    assert previous_stock_file_path.read_text() == "idArticle,idProduct,Price\n"
+
+    save_empty_market_extracts(folder_path=test_folder_cdir_path, product_ids=[16196])
+    run_getdata(folder_path=test_folder_cdir_path)
+    assert (
+        previous_stock_file_path.read_text()
+        == (test_folder_cdir_path / "stock.csv").read_text()
+    )
+
+
+def test_getdata_keeps_the_stock_under_the_minimum_price(
+    test_folder_cdir_path, test_stock_df
+):
+    test_stock_df.to_csv(test_folder_cdir_path / "stock.csv", index=False)
+    previous_stock_file_path = test_folder_cdir_path / "stock.previous.csv"
+    previous_stock_file_path.write_text("idArticle,idProduct,Price\n")
+    save_empty_market_extracts(
+        folder_path=test_folder_cdir_path, product_ids=[16416, 16196]
+    )
+
+    # The 5.5€ row is not handled, its changes are kept for the next run
+    run_getdata(folder_path=test_folder_cdir_path, minimum_price=10)
+    assert previous_stock_file_path.read_text() == "idArticle,idProduct,Price\n"
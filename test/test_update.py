@@ -12,19 +12,6 @@ from mpu.utils.pyopenxl_utils import EXCEL_ENGINE, format_excel_df
 runner = CliRunner()
 
 
-@pytest.fixture(autouse=True)
-def mock_settings_env_vars(mocker):
-    mocker.patch.dict(
-        os.environ,
-        {
-            "CLIENT_KEY": "my-client-key",
-            "CLIENT_SECRET": "my-client-secret",
-            "ACCESS_TOKEN": "my-access-token",
-            "ACCESS_SECRET": "my-access-secret",
-        },
-    )
-
-
 @pytest.fixture
 def save_stock_file(test_folder_cdir_path):
     def _save_stock_file(stock_df):